@@ -2,14 +2,14 @@
 import struct
 
 
-TESTFR_CON = '\x83\x00\x00\x00'
-TESTFR_ACT = '\x43\x00\x00\x00'
+TESTFR_CON = b'\x83\x00\x00\x00'
+TESTFR_ACT = b'\x43\x00\x00\x00'
 
-STOPDT_CON = '\x23\x00\x00\x00'
-STOPDT_ACT = '\x13\x00\x00\x00'
+STOPDT_CON = b'\x23\x00\x00\x00'
+STOPDT_ACT = b'\x13\x00\x00\x00'
 
-STARTDT_CON = '\x0b\x00\x00\x00'
-STARTDT_ACT = '\x07\x00\x00\x00'
+STARTDT_CON = b'\x0b\x00\x00\x00'
+STARTDT_ACT = b'\x07\x00\x00\x00'
 
 
 def i_frame(ssn, rsn):
@@ -33,3 +33,52 @@ def parse_i_frame(data):
 def parse_s_frame(data):
     rsn = struct.unpack_from('<2H', data)[1]
     return rsn >> 1
+
+
+APDU_MAX_LENGTH = 253
+
+I_HEADER = struct.Struct('<2B2H')
+S_HEADER = struct.Struct('<H')
+
+
+class FrameBuilder(object):
+    """
+    Builds APDUs (start byte, length, APCI and ASDU) in preallocated templates. Only the sequence numbers and the length are patched in, the
+    returned memoryview is valid until the next call for the same frame type.
+    Sequence numbers are not checked, they have to be in 0..32767.
+    """
+
+    def __init__(self):
+        self.i = bytearray(2 + APDU_MAX_LENGTH)
+        self.i_view = memoryview(self.i)
+        self.header = bytearray(6)
+        self.header_view = memoryview(self.header)
+        self.s = bytearray(b'\x68\x04' + s_frame2(0))
+        self.s_view = memoryview(self.s)
+        # U-frames never change
+        self.u = dict((u, memoryview(b'\x68\x04' + u)) for u in (
+            TESTFR_CON, TESTFR_ACT, STOPDT_CON, STOPDT_ACT, STARTDT_CON, STARTDT_ACT))
+
+    def i_header(self, ssn, rsn, length):
+        """
+        Start byte, length and APCI of an I-frame for an ASDU of length bytes, to be
+        written together with the ASDU (scatter-gather) without copying it.
+        """
+        I_HEADER.pack_into(self.header, 0, 0x68, 4 + length, ssn << 1, rsn << 1)
+        return self.header_view
+
+    def i_frame(self, ssn, rsn, asdu=b''):
+        length = len(asdu)
+        I_HEADER.pack_into(self.i, 0, 0x68, 4 + length, ssn << 1, rsn << 1)
+        self.i[6:6 + length] = asdu
+        return self.i_view[:6 + length]
+
+    def s_frame(self, rsn):
+        S_HEADER.pack_into(self.s, 4, rsn << 1)
+        return self.s_view
+
+    def u_frame(self, function):
+        """
+        :param function: One of the U-frame APCI constants, e.g. TESTFR_ACT.
+        """
+        return self.u[function]
@@ -0,0 +1,392 @@
+# -*- coding: utf-8 -*-
+"""
+asyncio client for IEC 60870-5-104 (Python 3).
+
+Run with: python -m iec104.aioclient [host] [port] [--connections N] [--uvloop] [--metrics-port PORT]
+"""
+import argparse
+import asyncio
+import collections
+import logging
+import struct
+import time
+
+from . import acpi
+from . import asdu
+from . import framer
+from . import metrics
+from . import tracing
+from . import typetable
+from . import window
+
+LOG = logging.getLogger()
+
+# Standard timeouts in seconds
+T1 = 15
+T2 = window.T2
+T3 = 20
+
+# Sinks do not tell when they have room again, they are polled
+SINK_RETRY = 0.01
+
+# Type ids of received I-frames the metrics are folded in at once
+TYPES_PENDING = 4096
+
+# Send and receive sequence numbers (shifted left by one) and type id of an I-frame
+I_FRAME = struct.Struct('<2HB')
+
+
+class IEC104Protocol(asyncio.Protocol):
+    """
+    Controlling station side of one IEC 104 connection.
+
+    Frames are cut out of data_received chunks by the framer, I-frames are decoded
+    with asdu.ASDU.from_buffer and acknowledged by the k/w window: one S-frame per
+    w I-frames or t2 seconds. Decoded ASDUs are consumed with
+    "async for o_asdu in protocol", or go to the sinks of pipeline (see
+    sinks.Pipeline) instead. Holds no task of its own, so thousands of
+    connections only cost a protocol object and a timer each.
+    :param registry: metrics.Registry the metrics of the connection are kept in,
+    keyed by the local address.
+    :param trace_every: Keeps 1 in trace_every frames in a tracing.FrameTrace of
+    trace_size frames, dumped on protocol errors. 0 traces nothing.
+    """
+
+    def __init__(self, t1=T1, t2=T2, t3=T3, k=window.K, w=window.W, maxsize=0, pipeline=None, registry=None,
+                 trace_every=0, trace_size=1024):
+        self.window = window.SlidingWindow(k, w, t2)
+        # ASDUs waiting for the k window to open
+        self.pending = collections.deque()
+        self.t1 = t1
+        self.t3 = t3
+        self.received = 0
+        self.framer = framer.APDUFramer()
+        self.frames = acpi.FrameBuilder()
+        # Reading is paused while maxsize decoded ASDUs are waiting (0: never)
+        self.maxsize = maxsize
+        self.queue = asyncio.Queue()
+        # Reading is paused as well while the sinks are full
+        self.pipeline = pipeline
+        self.retry = None
+        self.registry = registry
+        self.trace = tracing.FrameTrace(trace_size, trace_every) if trace_every else None
+        self.metrics = None
+        # types_in of the metrics, None without
+        self.asdu_types = None
+        self.address = None
+        self.transport = None
+        self.loop = None
+        self.timer = None
+        self.t2_timer = None
+        self.test_sent = None
+        self.paused = False
+        self.started = None
+        self.closed = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.loop = asyncio.get_running_loop()
+        if self.registry is not None:
+            peer = transport.get_extra_info('peername')
+            self.address = transport.get_extra_info('sockname')[:2]
+            self.metrics = self.registry.session(self.address, peer and peer[:2])
+            self.window.latency = self.metrics.ack_rtt
+            self.asdu_types = self.metrics.types_in
+        self.started = self.loop.create_future()
+        self.closed = self.loop.create_future()
+        self.received = self.loop.time()
+        self.timer = self.loop.call_later(self.t3, self.check_idle)
+        LOG.debug("Send STARTDT_ACT")
+        self.send(acpi.STARTDT_ACT)
+
+    def connection_lost(self, exc):
+        LOG.debug("Connection lost: %s", exc)
+        self.timer.cancel()
+        if self.t2_timer is not None:
+            self.t2_timer.cancel()
+        if self.retry is not None:
+            self.retry.cancel()
+        if self.pipeline is not None:
+            self.pipeline.flush()
+        if self.metrics is not None:
+            self.registry.remove(self.address)
+        if not self.started.done():
+            self.started.set_exception(exc or ConnectionError('Connection closed before STARTDT_CON'))
+        self.closed.set_result(exc)
+        self.queue.put_nowait(None)
+
+    def data_received(self, data):
+        self.received = self.loop.time()
+        m = self.metrics
+        window = self.window
+        if m is not None:
+            m.bytes_in += len(data)
+            received = window.frames_received
+            # S-frames sent while handling the chunk, counted afterwards
+            s_frames = window.s_frames_sent
+            start = metrics.clock()
+        handle, closing = self.handle, self.transport.is_closing
+        for apdu in self.framer.feed(data):
+            handle(apdu)
+            # Failed, the rest of the chunk is not handled
+            if closing():
+                break
+        if m is None:
+            return
+        if window.frames_received != received:
+            # Time per I-frame of the chunk, measuring every frame would cost more than decoding it
+            m.decode_in.append((metrics.clock() - start) / (window.frames_received - received))
+        if len(m.types_in) >= TYPES_PENDING:
+            m.fold()
+        s_frames = window.s_frames_sent - s_frames
+        if s_frames:
+            m.frames_out[metrics.S_FRAME] += s_frames
+            m.bytes_out += 6 * s_frames
+
+    def handle(self, data):
+        if self.trace is not None:
+            self.trace.record(tracing.IN, data, None, self.received)
+        control = data[0]
+        if control & 1 == 0:  # I-FRAME
+            if len(data) < 4 + typetable.HEADER.size:
+                self.protocol_error("I-frame of %d bytes without ASDU header", len(data))
+                return
+            ssn, rsn, type_id = I_FRAME.unpack_from(data)
+            ssn >>= 1
+            rsn >>= 1
+            if not self.window.received(ssn, self.received):
+                self.protocol_error("Sequence error: expected %s, received %s", self.window.vr, ssn)
+                return
+            if not self.acknowledged(rsn):
+                return
+            if self.window.ack_due(self.received):
+                self.send_s_frame()
+            elif self.t2_timer is None:
+                self.t2_timer = self.loop.call_at(self.window.deadline, self.check_ack)
+            if self.pipeline is not None:
+                self.pipeline.put_asdu(data, 4, time.time())
+            else:
+                self.queue.put_nowait(asdu.ASDU.from_buffer(data, 4))
+            if self.asdu_types is not None:
+                self.asdu_types.append(type_id)
+            self.throttle()
+
+        elif control & 3 == 1:  # S-FRAME
+            if self.metrics is not None:
+                self.metrics.frames_in[metrics.S_FRAME] += 1
+            self.acknowledged(acpi.parse_s_frame(data[:4]))
+
+        elif control & 3 == 3:  # U-FRAME
+            if self.metrics is not None:
+                self.metrics.frames_in[metrics.U_FRAME] += 1
+            s_acpi = data[:4].tobytes()
+            if s_acpi == acpi.STARTDT_CON:
+                LOG.debug("STARTDT_CON")
+                if not self.started.done():
+                    self.started.set_result(True)
+            elif s_acpi == acpi.TESTFR_ACT:
+                self.send(acpi.TESTFR_CON)
+            elif s_acpi == acpi.TESTFR_CON:
+                self.test_sent = None
+
+    def acknowledged(self, rsn):
+        if not self.window.acknowledged(rsn, self.received):
+            self.protocol_error("N(R) %s acknowledges unsent I-frames", rsn)
+            return False
+        self.flush()
+        return True
+
+    def protocol_error(self, message, *args):
+        """
+        Closes the connection, logs the frame trace first if there is one.
+        """
+        LOG.warning(message, *args)
+        if self.trace is not None:
+            self.trace.dump(LOG)
+        self.transport.close()
+
+    def check_ack(self):
+        """
+        t2: acknowledges received I-frames that were not acknowledged by w.
+        """
+        self.t2_timer = None
+        if self.window.ack_due(self.loop.time()):
+            self.send_s_frame()
+            if self.metrics is not None:
+                self.metrics.frames_out[metrics.S_FRAME] += 1
+                self.metrics.bytes_out += 6
+        elif self.window.deadline is not None:
+            self.t2_timer = self.loop.call_at(self.window.deadline, self.check_ack)
+
+    def throttle(self):
+        """
+        Pauses reading while maxsize decoded ASDUs are waiting or the sinks are
+        full, resumes when there is room again.
+        """
+        full = ((self.maxsize and self.queue.qsize() >= self.maxsize) or
+                (self.pipeline is not None and self.pipeline.full()))
+        if full != self.paused:
+            self.paused = full
+            if full:
+                self.transport.pause_reading()
+            else:
+                self.transport.resume_reading()
+        if full and self.pipeline is not None and self.retry is None:
+            self.retry = self.loop.call_later(SINK_RETRY, self.recheck)
+
+    def recheck(self):
+        self.retry = None
+        self.throttle()
+
+    def check_idle(self):
+        """
+        t3: sends TESTFR_ACT after t3 seconds without traffic, t1: closes the connection
+        if it or the oldest I-frame sent stays unconfirmed. The timer is re-armed instead
+        of being reset on every frame.
+        """
+        now = self.loop.time()
+        if self.test_sent is not None and now - self.test_sent >= self.t1:
+            LOG.warning("TESTFR_ACT not confirmed, closing connection")
+            self.transport.close()
+            return
+        oldest = self.window.oldest_sent
+        if oldest is not None and now - oldest >= self.t1:
+            LOG.warning("I-frames not acknowledged, closing connection")
+            self.transport.close()
+            return
+        idle = now - self.received
+        if idle >= self.t3 and self.test_sent is None:
+            self.test_sent = now
+            self.send(acpi.TESTFR_ACT)
+            delay = self.t1
+        elif self.test_sent is not None:
+            delay = self.t1 - (now - self.test_sent)
+        else:
+            delay = self.t3 - idle
+        if oldest is not None:
+            delay = min(delay, self.t1 - (now - oldest))
+        self.timer = self.loop.call_later(delay, self.check_idle)
+
+    def send(self, data):
+        if self.metrics is not None:
+            self.metrics.sent(data)
+        if self.trace is not None:
+            self.trace.record(tracing.OUT, data)
+        self.transport.write(b'\x68' + struct.pack('B', len(data)) + data)
+
+    def send_s_frame(self):
+        frame = self.frames.s_frame(self.window.acknowledge()).tobytes()
+        self.transport.write(frame)
+        if self.trace is not None:
+            self.trace.record(tracing.OUT, frame[2:])
+
+    def send_asdu(self, data):
+        """
+        Sends an ASDU as I-frame, or queues it while k I-frames are not acknowledged.
+        """
+        self.pending.append(data)
+        self.flush()
+
+    def flush(self):
+        now = self.loop.time()
+        m = self.metrics
+        sent = False
+        while self.pending and self.window.can_send():
+            ssn, rsn = self.window.send(now)
+            data = self.pending.popleft()
+            # The transport may keep the buffers it cannot send at once, the
+            # header template is overwritten by the next frame
+            header = self.frames.i_header(ssn, rsn, len(data)).tobytes()
+            self.transport.writelines((header, data))
+            if self.trace is not None:
+                self.trace.record(tracing.OUT, header[2:], data)
+            if m is not None:
+                m.asdus_out[data[0]] += 1
+                m.bytes_out += 6 + len(data)
+            sent = True
+        if sent and m is not None:
+            m.window.record(self.window.outstanding)
+        # t1 of the oldest I-frame may end before the t3 timer fires
+        oldest = self.window.oldest_sent
+        if oldest is not None and self.timer is not None and self.timer.when() > oldest + self.t1:
+            self.timer.cancel()
+            self.timer = self.loop.call_at(oldest + self.t1, self.check_idle)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        o_asdu = await self.queue.get()
+        if o_asdu is None:
+            self.queue.put_nowait(None)
+            raise StopAsyncIteration
+        if self.paused:
+            self.throttle()
+        return o_asdu
+
+
+async def connect(host, port=2404, **kwargs):
+    """
+    Opens a connection and waits for STARTDT_CON.
+    :return: The connected IEC104Protocol.
+    """
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_connection(lambda: IEC104Protocol(**kwargs), host, port)
+    await protocol.started
+    return protocol
+
+
+async def consume(protocol):
+    async for o_asdu in protocol:
+        for o in o_asdu.objs:
+            LOG.debug("Type: %s, IOA: %s, %s", o_asdu.type_id, o.ioa, vars(o))
+
+
+async def serve_metrics(registry, host='', port=9104):
+    """
+    Serves the metrics of registry in the Prometheus text format at
+    http://host:port/metrics from the running event loop.
+    :return: The asyncio server.
+    """
+    async def handle(reader, writer):
+        request = await reader.readline()
+        # Headers are not needed
+        while (await reader.readline()).strip():
+            pass
+        if request.split()[1:2] == [b'/metrics']:
+            status, body = '200 OK', registry.prometheus().encode()
+        else:
+            status, body = '404 Not Found', b''
+        writer.write('HTTP/1.1 {}\r\nContent-Type: {}\r\nContent-Length: {}\r\nConnection: close\r\n\r\n'.format(
+            status, metrics.CONTENT_TYPE, len(body)).encode() + body)
+        await writer.drain()
+        writer.close()
+
+    return await asyncio.start_server(handle, host or None, port)
+
+
+async def main(host, port, connections, metrics_port=None):
+    registry = None
+    if metrics_port is not None:
+        registry = metrics.Registry()
+        await serve_metrics(registry, port=metrics_port)
+    protocols = await asyncio.gather(*[connect(host, port, registry=registry) for i in range(connections)])
+    await asyncio.gather(*[consume(protocol) for protocol in protocols])
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('host', nargs='?', default='127.0.0.1')
+    parser.add_argument('port', nargs='?', type=int, default=2404)
+    parser.add_argument('--connections', type=int, default=1)
+    parser.add_argument('--uvloop', action='store_true')
+    parser.add_argument('--metrics-port', type=int, help='Serves the metrics at http://host:PORT/metrics')
+    args = parser.parse_args()
+    if args.uvloop:
+        import uvloop
+        uvloop.install()
+    try:
+        asyncio.run(main(args.host, args.port, args.connections, args.metrics_port))
+    except KeyboardInterrupt:
+        pass
@@ -1,24 +1,29 @@
 # -*- coding: utf-8 -*-
 import logging
-import binascii
 
 import struct
 
+try:
+    from . import tracing, typetable
+except (ImportError, ValueError):
+    import tracing
+    import typetable
+
 LOG = logging.getLogger()
 
-def casdu2(asdu):
+def casdu1(asdu):
     return asdu & 0xFF
     
-def casdu1(asdu):
+def casdu2(asdu):
     return (asdu >> 8) & 0xFF
 
-def ioa3(ioa):
+def ioa1(ioa):
     return ioa & 0xFF
     
 def ioa2(ioa):
     return (ioa >> 8) & 0xFF    
 
-def ioa1(ioa):
+def ioa3(ioa):
     return (ioa >> 16) & 0xFF
     
 class cASDU():
@@ -88,7 +93,7 @@ class cCP56Time2a():
     year = 0
     
     def bytes(self):
-        return struct.pack('HBBBBB', self.milis, int((self.iv & 0b1) << 7 | (self.minute & 0b11111)), int((self.su & 0b1) << 7 | (self.minute & 0b111111)), int((self.dow & 0b111) << 5 | (self.dom & 0x11111)), int(self.month & 0x1111), int(self.year & 0x1111111))
+        return struct.pack('<HBBBBB', self.milis, int((self.iv & 0b1) << 7 | (self.minute & 0b111111)), int((self.su & 0b1) << 7 | (self.hour & 0b11111)), int((self.dow & 0b111) << 5 | (self.dom & 0b11111)), int(self.month & 0b1111), int(self.year & 0b1111111))
                
 class cMSpTb1(cSIQ):
 
@@ -108,32 +113,78 @@ class cMMeTf1(cInfoObj):
     description = 'Measured value, short floating point number with time tag CP56Time2a'
     
     value = 0
+    qds = 0
     CP56Time2a = cCP56Time2a()
     
     def bytes(self):
-        return cInfoObj.bytes(self) + struct.pack('f', self.value) + self.CP56Time2a.bytes()
+        return cInfoObj.bytes(self) + struct.pack('<fB', self.value, self.qds) + self.CP56Time2a.bytes()
          
 
+# Data unit identifier, common address and IOA are little-endian
+HEADER = typetable.HEADER
+
+
 class ASDU(object):
     def __init__(self, data):
-        print "hex: ", binascii.hexlify(data.bytes)
+        debug = tracing.enabled(LOG)
+        if debug:
+            LOG.debug("hex: %s", tracing.Hex(data.bytes))
         self.type_id = data.read('uint:8')
         sq = data.read('bool')  # Single or Sequence
         sq_count = data.read('uint:7')
         self.cot = data.read('uint:8')
         data.read('uint:8')
-        self.asdu = data.read('uint:16')
+        self.asdu = data.read('uintle:16')
         #LOG.debug("Type: {}, COT: {}, ASDU: {}".format(self.type_id, self.cot, self.asdu))
-        LOG.debug("Type: {}, COT: {}, CASDU: {}, CASDU1: {}, CASDU2: {}".format(self.type_id, self.cot, self.asdu, casdu1(self.asdu), casdu2(self.asdu)))
+        if debug:
+            LOG.debug("Type: %s, COT: %s, CASDU: %s, CASDU1: %s, CASDU2: %s",
+                      self.type_id, self.cot, self.asdu, casdu1(self.asdu), casdu2(self.asdu))
 
         self.objs = []
         if not sq:
-            for i in xrange(sq_count):
+            for i in range(sq_count):
                 try:
                     obj = InfoObjMeta.types[self.type_id](data)
                     self.objs.append(obj)
                 except:
-                    LOG.debug("Unknown Type: {}".format(i))
+                    LOG.debug("Unknown Type: %s", i)
+
+    @classmethod
+    def from_buffer(cls, buf, offset=0):
+        """
+        Decodes an ASDU with the precompiled struct layouts of InfoObjMeta.types.
+        Produces the same attributes as ASDU(ConstBitStream) without reading bit by bit.
+        :param buf: Buffer holding the ASDU (bytes, bytearray or memoryview).
+        :param offset: Offset of the ASDU within buf.
+        """
+        self = cls.__new__(cls)
+        self.type_id, vsq, self.cot, _, self.asdu = HEADER.unpack_from(buf, offset)
+        offset += HEADER.size
+        sq_count = vsq & 0x7F
+
+        self.objs = []
+        info = InfoObjMeta.table[self.type_id]
+        if info is None:
+            LOG.debug("Unknown Type: %s", self.type_id)
+            return self
+        try:
+            if not vsq & 0x80:
+                size = info.struct.size
+                for i in range(sq_count):
+                    self.objs.append(info.unpack_from(buf, offset))
+                    offset += size
+            elif sq_count:
+                # SQ=1: one IOA, followed by consecutive elements
+                obj = info.unpack_from(buf, offset)
+                self.objs.append(obj)
+                offset += info.struct.size
+                size = info.element.size
+                for i in range(1, sq_count):
+                    self.objs.append(info.unpack_element_from(buf, offset, obj.ioa + i))
+                    offset += size
+        except struct.error:
+            LOG.debug("Truncated ASDU, Type: %s", self.type_id)
+        return self
 
 
 class QDS(object):
@@ -148,23 +199,52 @@ class QDS(object):
 
 class InfoObjMeta(type):
     types = {}
+    # Indexed by type id
+    table = [None] * 256
 
     def __new__(mcs, name, bases, dct):
         re = type.__new__(mcs, name, bases, dct)
         if 'type_id' in dct:
-            InfoObjMeta.types[dct['type_id']] = re
+            InfoObjMeta.types[dct['type_id']] = InfoObjMeta.table[dct['type_id']] = re
+            # Types without decoder of their own keep the raw fields of the type table in values
+            if not re.layout:
+                re.layout = typetable.TYPES[dct['type_id']].layout
+        # Compile the fixed-size layout once: IOA (3 bytes) + element, and the bare element for SQ=1
+        if hasattr(re, 'layout'):
+            re.struct = struct.Struct('<3B' + re.layout)
+            re.element = struct.Struct('<' + re.layout)
         return re
 
 
-class InfoObj(object):
-    __metaclass__ = InfoObjMeta
+# Python 2 and 3 compatible way of applying the metaclass
+class InfoObj(InfoObjMeta('InfoObjBase', (object,), {})):
+
+    # struct format of the information element following the IOA
+    layout = ''
+
+    @classmethod
+    def unpack_from(cls, buf, offset):
+        values = cls.struct.unpack_from(buf, offset)
+        obj = cls.__new__(cls)
+        obj.ioa = values[0] | values[1] << 8 | values[2] << 16
+        obj.unpack(*values[3:])
+        return obj
+
+    @classmethod
+    def unpack_element_from(cls, buf, offset, ioa):
+        obj = cls.__new__(cls)
+        obj.ioa = ioa
+        obj.unpack(*cls.element.unpack_from(buf, offset))
+        return obj
+
+    def unpack(self, *values):
+        self.values = values
 
-    
-    
     def __init__(self, data):
-        self.ioa = data.read("uint:24")
+        self.ioa = data.read("uintle:24")
         #print "IOA: ", self.ioa
-        LOG.debug("IOA: {}, IAO1: {}, IAO2: {}, IOA:3 {}".format(self.ioa, ioa1(self.ioa), ioa2(self.ioa), ioa3(self.ioa)))
+        if tracing.enabled(LOG):
+            LOG.debug("IOA: %s, IAO1: %s, IAO2: %s, IOA:3 %s", self.ioa, ioa1(self.ioa), ioa2(self.ioa), ioa3(self.ioa))
         #data.read("uint:16")
         #d = data.read("int:16")
         #while d:
@@ -172,6 +252,8 @@ class InfoObj(object):
         #    d = data.read("int:16")
 
 class SIQ(InfoObj):
+    layout = 'B'
+
     def __init__(self, data):
         super(SIQ, self).__init__(data)
         self.iv = data.read('bool')
@@ -181,8 +263,17 @@ class SIQ(InfoObj):
         data.read('int:3')  # reserve
         self.spi = data.read('bool')
 
+    def unpack(self, siq):
+        self.iv = bool(siq & 0x80)
+        self.nt = bool(siq & 0x40)
+        self.sb = bool(siq & 0x20)
+        self.bl = bool(siq & 0x10)
+        self.spi = bool(siq & 0x01)
+
 
 class DIQ(InfoObj):
+    layout = 'B'
+
     def __init__(self, data):
         super(DIQ, self).__init__(data)
         self.iv = data.read('bool')
@@ -192,6 +283,13 @@ class DIQ(InfoObj):
         data.read('int:2')  # reserve
         self.dpi = data.read('uint:2')
 
+    def unpack(self, diq):
+        self.iv = bool(diq & 0x80)
+        self.nt = bool(diq & 0x40)
+        self.sb = bool(diq & 0x20)
+        self.bl = bool(diq & 0x10)
+        self.dpi = diq & 0x03
+
 
 class MSpNa1(SIQ):
     type_id = 1
@@ -200,7 +298,7 @@ class MSpNa1(SIQ):
 
     def __init__(self, data):
         super(MSpNa1, self).__init__(data)
-        LOG.debug('Obj: M_SP_NA_1, Value: {}'.format(self.spi))
+        LOG.debug('Obj: M_SP_NA_1, Value: %s', self.spi)
 
 
 class MSpTa1(InfoObj):
@@ -219,7 +317,7 @@ class MDpNa1(DIQ):
 
     def __init__(self, data):
         super(MDpNa1, self).__init__(data)
-        LOG.debug('Obj: M_DP_NA_1, Value: {}'.format(self.dpi))
+        LOG.debug('Obj: M_DP_NA_1, Value: %s', self.dpi)
 
 
 class MDpTa1(InfoObj):
@@ -256,12 +354,16 @@ class MMeNa1(InfoObj):
     type_id = 9
     name = 'M_ME_NA_1'
     description = 'Measured value, normalized value'
+    layout = 'hx'
 
     def __init__(self, data):
         super(MMeNa1, self).__init__(data)
-        self.nva = data.read('int:8')
-        self.nva = data.read('int:16')
-        LOG.debug('Obj: M_ME_NA_1, Value: {}'.format(self.nva))
+        self.nva = data.read('intle:16')
+        data.read('uint:8')  # QDS
+        LOG.debug('Obj: M_ME_NA_1, Value: %s', self.nva)
+
+    def unpack(self, nva):
+        self.nva = nva
 
 
 class MMeTa1(InfoObj):
@@ -287,21 +389,26 @@ class MMeNc1(InfoObj):
     name = 'M_ME_NC_1'
     description = 'Measured value, short floating point number'
     length = 5
+    layout = 'fx'
 
     def __init__(self, data):
         super(MMeNc1, self).__init__(data)
-        print binascii.hexlify(data.bytes)
+        if tracing.enabled(LOG):
+            LOG.debug("%s", tracing.Hex(data.bytes))
 
 
-        val = data.read("floatle:32")
+        self.val = data.read("floatle:32")
 
 
         #qds = QDS(struct.unpack_from('B', data[7:])[0])
         #LOG.debug("Value: {}".format(val))
-        LOG.debug('Obj: M_ME_NC_1, Value: {}'.format(self.val))
+        LOG.debug('Obj: M_ME_NC_1, Value: %s', self.val)
         
         #print "val", val
 
+    def unpack(self, val):
+        self.val = val
+
 
 class MMeTc1(InfoObj):
     type_id = 14
@@ -357,10 +464,11 @@ class MSpTb1(SIQ):
     type_id = 30
     name = 'M_SP_TB_1'
     description = 'Single-point information with time tag CP56Time2a'
+    layout = 'B7x'
     
     def __init__(self, data):
         super(MSpTb1, self).__init__(data)
-        LOG.debug('Obj: M_SP_TB_1, Value: {}'.format(self.spi))
+        LOG.debug('Obj: M_SP_TB_1, Value: %s', self.spi)
         #print "spi", self.spi
     '''
     def __init__(self, data):
@@ -405,6 +513,7 @@ class MMeTf1(InfoObj):
     type_id = 36
     name = 'M_ME_TF_1'
     description = 'Measured value, short floating point number with time tag CP56Time2a'
+    layout = 'fx7x'
     
     def __init__(self, data):
         super(MMeTf1, self).__init__(data)
@@ -412,7 +521,10 @@ class MMeTf1(InfoObj):
         self.val = data.read("floatle:32")
         #qds = QDS(struct.unpack_from('B', data[7:])[0])
         #print "val", self.val
-        LOG.debug('Obj: M_ME_TF_1, Value: {}'.format(self.val))
+        LOG.debug('Obj: M_ME_TF_1, Value: %s', self.val)
+
+    def unpack(self, val):
+        self.val = val
 
 
 class MItTb1(InfoObj):
@@ -0,0 +1,581 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the encode/decode hot paths.
+
+Every case is timed with timeit, best of repeat runs, over the payloads it
+applies to: a single point, a sequence of 127 elements and time-tagged floats.
+Results are written as JSON; --compare reports the change against an earlier
+result file, so regressions between commits show up.
+
+Cases that need what the running interpreter lacks are left out: bitstring,
+the wrapper and unwrapper of python3/ and aioclient (Python 3), the server
+(Python 2). The cases of the connections run with and without metrics
+(+metrics), timed in alternating loops; the overhead of the metrics is
+reported against OVERHEAD_LIMIT. server.broadcast sends
+the payloads to 500 sessions, server.send_asdu does the same one ASDU and
+session at a time. server.saturation keeps the window of a session full with
+an interrogation and cyclic data while events are queued, urgent or behind
+the bulk data (fifo); how long the events waited is reported.
+
+Run with: python -m iec104.benchmark [--output results.json] [--compare old.json] [-k NAME]
+"""
+import argparse
+import datetime
+import importlib
+import json
+import os
+import platform
+import struct
+import subprocess
+import sys
+import time
+import timeit
+
+try:
+    from . import (acpi, asdu, framer, metrics, packer, pointdb, priority, sinks, subscriptions, timetag, typetable,
+                   types, valuestore, window)
+except (ImportError, ValueError):
+    import acpi
+    import asdu
+    import framer
+    import metrics
+    import packer
+    import pointdb
+    import priority
+    import sinks
+    import subscriptions
+    import timetag
+    import typetable
+    import types
+    import valuestore
+    import window
+
+try:
+    from bitstring import ConstBitStream
+except ImportError:
+    ConstBitStream = None
+
+PYTHON3 = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python3')
+
+# 2016-08-04 03:10:12.345
+CP56TIME2A = timetag.pack_cp56time2a(2016, 8, 4, 3, 10, 12345, 4)
+
+# Relative cost of the metrics the +metrics cases must stay below
+OVERHEAD_LIMIT = 0.02
+
+
+def build_payloads():
+    """
+    :return: name -> (ASDU, number of information objects)
+    """
+    header = typetable.HEADER
+    m_sp_na_1 = typetable.BY_NAME['M_SP_NA_1']
+    m_me_tf_1 = typetable.BY_NAME['M_ME_TF_1']
+    single = [(1000, 0x01)]
+    sequence = [(2000 + i, i & 1) for i in range(127)]
+    # As many as fit into one APDU
+    floats = [(3000 + i, i * 0.25, 0, CP56TIME2A) for i in range(16)]
+    return {
+        'single': (header.pack(1, 1, 3, 0, 1) + typetable.pack_objects(m_sp_na_1, single, 0), 1),
+        'sequence': (header.pack(1, 0x80 | 127, 3, 0, 1) + typetable.pack_objects(m_sp_na_1, sequence, 1), 127),
+        'time_tagged': (header.pack(36, 16, 3, 0, 1) + typetable.pack_objects(m_me_tf_1, floats, 0), 16),
+    }
+
+
+PAYLOADS = build_payloads()
+
+# Element messages of IEC104Wrapper.create_apdu: type name, SQ, elements
+MESSAGES = {
+    'single': ('M_SP_NA_1', 0, [0x01]),
+    'sequence': ('M_SP_NA_1', 1, [i & 1 for i in range(127)]),
+    'time_tagged': ('M_ME_TF_1', 0, [(i * 0.25, 0, CP56TIME2A) for i in range(16)]),
+}
+
+
+def python3_module(name):
+    """
+    Imports wrapper or unwrapper of python3/, None on Python 2.
+    """
+    if sys.version_info[0] < 3:
+        return None
+    if PYTHON3 not in sys.path:
+        sys.path.insert(0, PYTHON3)
+    return importlib.import_module(name)
+
+
+def import_aioclient():
+    """
+    :return: The aioclient module, None on Python 2.
+    """
+    if sys.version_info[0] < 3:
+        return None
+    from . import aioclient
+    return aioclient
+
+
+def import_server():
+    """
+    :return: The server module, None where it does not run (Python 3).
+    """
+    try:
+        from . import server
+    except (ImportError, SyntaxError, ValueError):
+        try:
+            import server
+        except (ImportError, SyntaxError):
+            return None
+    return server
+
+
+class Stream(object):
+    """
+    Counts what a session writes instead of an IOStream.
+    """
+
+    def __init__(self):
+        self.written = 0
+
+    def write(self, data):
+        self.written += len(data)
+
+    def closed(self):
+        return False
+
+
+class Recorder(Stream):
+    """
+    Keeps what a session writes.
+    """
+
+    def __init__(self):
+        super(Recorder, self).__init__()
+        self.data = bytearray()
+
+    def write(self, data):
+        super(Recorder, self).write(data)
+        self.data += data
+
+
+class Transport(object):
+    """
+    Discards what a protocol writes instead of a socket transport.
+    """
+
+    def get_extra_info(self, name, default=None):
+        return ('127.0.0.1', 2404) if name in ('peername', 'sockname') else default
+
+    def write(self, data):
+        pass
+
+    def writelines(self, data):
+        pass
+
+    def is_closing(self):
+        return False
+
+    def pause_reading(self):
+        pass
+
+    def resume_reading(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def interrogate(server, points, instrumented=False):
+    """
+    Runs a station interrogation through a session, the peer acknowledges every
+    w frames.
+    :return: Number of I-frames and bytes written.
+    """
+    srv = server.IEC104Server(points=points, instrumented=instrumented)
+    srv.ticker.stop()
+    address = ('127.0.0.1', 2404)
+    m = None if srv.registry is None else srv.registry.session(address)
+    c = server.Session(address, Stream(), window.SlidingWindow(srv.k, srv.w, srv.t2), srv, metrics=m)
+    c.interrogate(1, server.QOI_STATION, server.ACTIVATION)
+    while c.interrogation is not None:
+        c.acknowledged((c.window.ack + min(c.window.w, c.window.outstanding)) % window.MODULO)
+    c.output.flush()
+    return c.output.frames_flushed, c.stream.written
+
+
+def fan_out(server, count, asdus, broadcast=True):
+    """
+    :return: Function sending asdus to count sessions with broadcast(), or with
+    one send_asdu() per session and ASDU, then acknowledging them as the peers.
+    """
+    srv = server.IEC104Server(instrumented=False)
+    srv.ticker.stop()
+    for port in range(count):
+        address = ('127.0.0.1', port)
+        srv.sessions[address] = server.Session(address, Stream(), window.SlidingWindow(srv.k, srv.w, srv.t2), srv)
+    sessions = list(srv.sessions.values())
+
+    def send():
+        if broadcast:
+            srv.broadcast(asdus)
+        else:
+            for c in sessions:
+                for data in asdus:
+                    c.send_asdu(data)
+        for c in sessions:
+            c.acknowledged((c.window.ack + c.window.outstanding) % window.MODULO)
+            c.output.flush()
+    return send
+
+
+def saturate(server, points, level=None, events=50, cyclic=500):
+    """
+    Keeps the k window of a session full with a station interrogation of points
+    and cyclic ASDUs (COT 1). The peer acknowledges w I-frames at a time, an
+    event (COT 3) is queued before every acknowledgement.
+    :param level: Priority of the events, priority.BULK queues them behind the
+    cyclic data and the interrogation like one FIFO queue.
+    :return: I-frames sent between queueing and sending every event, metrics of the session.
+    """
+    srv = server.IEC104Server(points=points)
+    srv.ticker.stop()
+    address = ('127.0.0.1', 2404)
+    c = server.Session(address, Recorder(), window.SlidingWindow(srv.k, srv.w, srv.t2), srv,
+                       metrics=srv.registry.session(address))
+    c.interrogate(1, server.QOI_STATION, server.ACTIVATION)
+    data = PAYLOADS['time_tagged'][0]
+    c.send_asdus([data[:2] + b'\x01' + data[3:]] * cyclic)
+    event = PAYLOADS['single'][0]
+    queued = []
+    while c.interrogation is not None or any(c.queues):
+        if len(queued) < events:
+            queued.append(c.window.frames_sent)
+            c.send_asdu(event, level)
+        c.acknowledged((c.window.ack + min(c.window.w, c.window.outstanding)) % window.MODULO)
+    c.output.flush()
+    # Only I-frames are written
+    sent = [position for position, frame in enumerate(framer.APDUFramer().feed(bytes(c.stream.data)))
+            if frame[4:].tobytes() == event]
+    return [position - before for position, before in zip(sent, queued)], c.metrics
+
+
+def saturation_points(count=10000):
+    points = pointdb.PointDatabase()
+    for ioa in range(count):
+        points.add(1, ioa, 13, float(ioa), timestamp=0.0)
+    return points
+
+
+def client_receive(aioclient, data, count):
+    """
+    :return: Functions passing count I-frames of the ASDU data in one chunk to
+    an IEC104Protocol, without and with metrics. The points go to a pipeline
+    without sinks. Every call replays the frames from N(S) 0. Both functions
+    use the same protocol and only switch its metrics, so that where the
+    objects lie in memory does not add to the overhead.
+    """
+    import asyncio
+    loop = asyncio.new_event_loop()
+    protocol = aioclient.IEC104Protocol(pipeline=sinks.Pipeline(), registry=metrics.Registry())
+    loop.call_soon(protocol.connection_made, Transport())
+    loop.run_until_complete(asyncio.sleep(0))
+    chunk = b''.join(acpi.FrameBuilder().i_frame(ssn, 0, data).tobytes() for ssn in range(count))
+    instrumented = protocol.metrics, protocol.asdu_types, protocol.window.latency
+
+    def receive():
+        protocol.metrics = protocol.asdu_types = protocol.window.latency = None
+        protocol.window.vr = 0
+        protocol.data_received(chunk)
+
+    def receive_metrics():
+        protocol.metrics, protocol.asdu_types, protocol.window.latency = instrumented
+        protocol.window.vr = 0
+        protocol.data_received(chunk)
+    return receive, receive_metrics
+
+
+def cases(pattern=None):
+    """
+    Yields name, number of information objects per call and the function to time.
+    :param pattern: Skips the setup of the interrogation cases that do not match.
+    """
+    builder = acpi.FrameBuilder()
+    yield 'acpi.i_frame2', 0, lambda: acpi.i_frame2(100, 200)
+    yield 'acpi.s_frame2', 0, lambda: acpi.s_frame2(200)
+    yield 'acpi.FrameBuilder.s_frame', 0, lambda: builder.s_frame(200)
+    for payload, (data, objects) in sorted(PAYLOADS.items()):
+        yield 'acpi.FrameBuilder.i_frame/' + payload, objects, lambda data=data: builder.i_frame(100, 200, data)
+        # The same APDU with struct.pack and concatenation
+        yield 'acpi.apdu/' + payload, objects, lambda data=data: b'\x68' + struct.pack(
+            'B', 4 + len(data)) + acpi.i_frame2(100, 200) + data
+    yield 'acpi.FrameBuilder.i_header', 0, lambda: builder.i_header(100, 200, 21)
+
+    for payload, (data, objects) in sorted(PAYLOADS.items()):
+        view = memoryview(data)
+        yield 'asdu.from_buffer/' + payload, objects, lambda view=view: asdu.ASDU.from_buffer(view)
+        # The bitstring decoder skips SQ=1 ASDUs, its time would not be comparable
+        if ConstBitStream is not None and payload != 'sequence':
+            yield 'asdu.bitstring/' + payload, objects, lambda data=data: asdu.ASDU(ConstBitStream(bytes=data))
+
+    wrapper = python3_module('wrapper')
+    unwrapper = python3_module('unwrapper')
+    if wrapper is not None:
+        w = wrapper.IEC104Wrapper()
+        for payload, (name, sequence, message) in sorted(MESSAGES.items()):
+            def create(name=name, sequence=sequence, message=message):
+                w.set_information_object_address(1000)
+                return w.create_apdu('i-frame', name, sequence, ('spontaneous', 0, 0), 1, message, 100, 200)
+            yield 'wrapper.create_apdu/' + payload, PAYLOADS[payload][1], create
+    if unwrapper is not None:
+        u = unwrapper.IEC104Unwrapper()
+        for payload, (data, objects) in sorted(PAYLOADS.items()):
+            apdu = acpi.i_frame2(100, 200) + data
+            yield 'unwrapper.unwrap_apdu/' + payload, objects, lambda apdu=apdu: u.unwrap_apdu(apdu, len(apdu))
+
+    epoch_ms = timetag.cp56time2a_to_epoch_ms(CP56TIME2A)
+    moment = types.cp56time2a_to_time(CP56TIME2A)
+    yield 'timetag.cp56time2a_to_epoch_ms', 1, lambda: timetag.cp56time2a_to_epoch_ms(CP56TIME2A)
+    yield 'timetag.epoch_ms_to_cp56time2a', 1, lambda: timetag.epoch_ms_to_cp56time2a(epoch_ms)
+    yield 'types.cp56time2a_to_time', 1, lambda: types.cp56time2a_to_time(CP56TIME2A)
+    yield 'types.time_to_cp56time2a', 1, lambda: types.time_to_cp56time2a(moment)
+    data, objects = PAYLOADS['time_tagged']
+    # Time tag at the end of the 15 byte objects
+    yield 'timetag.cp56time2a_to_epoch_ms_array/time_tagged', objects, lambda: timetag.cp56time2a_to_epoch_ms_array(
+        data, objects, typetable.HEADER.size + 8, 15)
+    # 10000 time tags one by one into datetime, and at once (vectorized with NumPy)
+    tags = CP56TIME2A * 10000
+    yield 'timetag.datetime/10000', 10000, lambda: [datetime.datetime(*timetag.unpack_cp56time2a(tags, i * 7)[:5])
+                                                    for i in range(10000)]
+    yield 'timetag.cp56time2a_to_epoch_ms_array/10000', 10000, lambda: timetag.cp56time2a_to_epoch_ms_array(
+        tags, 10000, 0, 7)
+
+    # The client keeping the latest of 100000 points, polled by snapshot()
+    count = 100000
+    asdus = packer.pack(13, [(ioa, float(ioa), 0) for ioa in range(count)], 3, 1)
+    store = valuestore.ValueStore()
+
+    def update():
+        for data in asdus:
+            store.update(data)
+    update()
+    yield 'valuestore.update/100000', count, update
+    yield 'valuestore.snapshot/100000', count, store.snapshot
+
+    # 500 sessions subscribed to overlapping IOA ranges
+    index = subscriptions.SubscriptionIndex()
+    for key in range(500):
+        index.subscribe(key, 1, key * 100, key * 100 + 149)
+    index.match(1, 0)
+    yield 'subscriptions.match/500', 1, lambda: index.match(1, 25025)
+
+    aioclient = import_aioclient()
+    if aioclient is not None:
+        for payload, (data, objects) in sorted(PAYLOADS.items()):
+            receive, receive_metrics = client_receive(aioclient, data, 100)
+            yield 'aioclient.data_received/' + payload, 100 * objects, receive
+            yield 'aioclient.data_received+metrics/' + payload, 100 * objects, receive_metrics
+
+    server = import_server()
+    if server is not None:
+        asdus = [data for data, objects in sorted(PAYLOADS.values())]
+        objects = 500 * sum(objects for data, objects in PAYLOADS.values())
+        yield 'server.broadcast/500', objects, fan_out(server, 500, asdus)
+        yield 'server.send_asdu/500', objects, fan_out(server, 500, asdus, False)
+        points = saturation_points()
+        for name, level in (('urgent', None), ('fifo', priority.BULK)):
+            yield 'server.saturation/' + name, 50, lambda level=level: saturate(server, points, level)
+
+    for count in (10000, 100000, 1000000):
+        names = ['server.interrogation/{}'.format(count)]
+        if count == 1000000:
+            names.append('server.interrogation+metrics/{}'.format(count))
+        if server is not None and (not pattern or any(pattern in name for name in names)):
+            points = saturation_points(count)
+            yield names[0], count, lambda points=points: interrogate(server, points)
+            if len(names) > 1:
+                yield names[1], count, lambda points=points: interrogate(server, points, True)
+
+
+def autorange(timer, duration):
+    """
+    Runs timer in loops of number calls, number doubling until a loop takes
+    duration seconds (like timeit's autorange).
+    :return: Seconds of the last loop, number.
+    """
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= duration:
+            return elapsed, number
+        number *= 2
+
+
+def measure(func, repeat=5, duration=0.2):
+    """
+    Calls func in loops of number calls, see autorange(). Loops of more than
+    ten times duration are not repeated.
+    :return: Best time of repeat loops per call in seconds, number.
+    """
+    timer = timeit.Timer(func)
+    elapsed, number = autorange(timer, duration)
+    if repeat > 1 and elapsed < 10 * duration:
+        elapsed = min([elapsed] + timer.repeat(repeat - 1, number))
+    return elapsed / number, number
+
+
+def measure_pair(plain, instrumented, repeat=25, duration=0.2):
+    """
+    Times two functions in alternating loops of the same number of calls. The
+    ratio of every two neighbouring loops is taken, so that the machine getting
+    faster or slower meanwhile affects both alike, and their median, which
+    outliers do not move. Loops of more than ten times duration are not
+    repeated.
+    :return: Best time per call of plain and of instrumented in seconds,
+    median ratio instrumented/plain, number.
+    """
+    timers = (timeit.Timer(plain), timeit.Timer(instrumented))
+    elapsed, number = autorange(timers[0], duration)
+    loops = [(elapsed, timers[1].timeit(number))]
+    if elapsed < 10 * duration:
+        for i in range(repeat - 1):
+            # Every other round the instrumented one goes first
+            if i % 2:
+                loops.append((timers[0].timeit(number), timers[1].timeit(number)))
+            else:
+                seconds = timers[1].timeit(number)
+                loops.append((timers[0].timeit(number), seconds))
+    ratios = sorted(seconds / elapsed for elapsed, seconds in loops)
+    return (min(elapsed for elapsed, seconds in loops) / number, min(seconds for elapsed, seconds in loops) / number,
+            ratios[len(ratios) // 2], number)
+
+
+def commit():
+    """
+    :return: Current git commit of the tree, None outside a git checkout.
+    """
+    try:
+        with open(os.devnull, 'w') as devnull:
+            output = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=devnull,
+                                             cwd=os.path.dirname(os.path.abspath(__file__)))
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode().strip()
+
+
+def run(pattern=None, repeat=5, duration=0.2, report=None):
+    """
+    :param pattern: Only runs the cases whose name contains pattern.
+    :param report: Called with name and result of every case as it finishes.
+    :return: Results as stored in the JSON file.
+    """
+    selected = [(name, objects, func) for name, objects, func in cases(pattern) if not pattern or pattern in name]
+    funcs = dict((name, func) for name, objects, func in selected)
+    results = {}
+
+    def result(name, objects, seconds, number, repeat, **extra):
+        results[name] = dict(extra, **{
+            'seconds': seconds,
+            'per_second': 1 / seconds,
+            'objects_per_second': objects / seconds,
+            'number': number,
+            'repeat': repeat,
+        })
+        if report is not None:
+            report(name, results[name])
+
+    for name, objects, func in selected:
+        if name in results:
+            continue
+        instrumented = name.replace('/', '+metrics/', 1) if '/' in name else name + '+metrics'
+        if instrumented in funcs:
+            # With and without metrics timed interleaved, for a stable overhead
+            seconds, seconds_instrumented, ratio, number = measure_pair(
+                func, funcs[instrumented], 50 * repeat, duration / 10)
+            result(name, objects, seconds, number, 50 * repeat)
+            result(instrumented, objects, seconds_instrumented, number, 50 * repeat, overhead=ratio - 1)
+        else:
+            seconds, number = measure(func, repeat, duration)
+            result(name, objects, seconds, number, repeat)
+    return {
+        'commit': commit(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+
+
+def compare(old, new, threshold=0.1):
+    """
+    :return: List of name, ratio of the time per call new/old, True if slower
+    than threshold, for the cases in both results.
+    """
+    changes = []
+    for name in sorted(set(old['results']) & set(new['results'])):
+        ratio = new['results'][name]['seconds'] / old['results'][name]['seconds']
+        changes.append((name, ratio, ratio > 1 + threshold))
+    return changes
+
+
+def overheads(results, limit=OVERHEAD_LIMIT):
+    """
+    :return: List of name, relative overhead of the cases with metrics
+    (+metrics) compared with the same case without, True if below limit. The
+    overhead measured by measure_pair() is taken where there is one.
+    """
+    changes = []
+    for name in sorted(results['results']):
+        if '+metrics' in name:
+            plain = results['results'].get(name.replace('+metrics', ''))
+            if plain is not None:
+                overhead = results['results'][name].get('overhead')
+                if overhead is None:
+                    overhead = results['results'][name]['seconds'] / plain['seconds'] - 1
+                changes.append((name, overhead, overhead < limit))
+    return changes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--output', help='JSON file for the results')
+    parser.add_argument('--compare', help='JSON results of an earlier run')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Slowdown reported as regression, 0.1 is 10%%')
+    parser.add_argument('-k', dest='pattern', help='Only cases whose name contains NAME')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--duration', type=float, default=0.2, help='Seconds per timing loop')
+    args = parser.parse_args(argv)
+
+    def report(name, result):
+        objects = result['objects_per_second']
+        print('{:<50} {:>14.1f}/s{}'.format(name, result['per_second'],
+                                           ' {:>16.0f} objects/s'.format(objects) if objects else ''))
+
+    results = run(args.pattern, args.repeat, args.duration, report)
+    for name, overhead, below in overheads(results):
+        print('{:<50} {:>+7.1%} overhead  {}'.format(name, overhead, 'OK' if below else 'ABOVE {:.0%}'.format(
+            OVERHEAD_LIMIT)))
+    server = import_server()
+    if server is not None and (not args.pattern or args.pattern in 'server.saturation/'):
+        points = saturation_points()
+        for name, level in (('urgent', None), ('fifo', priority.BULK)):
+            ahead, m = saturate(server, points, level)
+            queued = m.queued[priority.BULK if level else priority.URGENT].snapshot()
+            print('{:<50} {:>6} frames ahead at most, waited p99 {:.6f} s'.format(
+                'server.saturation/' + name, max(ahead), queued['p99']))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        regressions = 0
+        print('Compared with {} ({}):'.format(old.get('commit'), old.get('python')))
+        for name, ratio, slower in compare(old, results, args.threshold):
+            print('{:<50} {:>+7.1%}{}'.format(name, ratio - 1, '  REGRESSION' if slower else ''))
+            regressions += slower
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,376 @@
+# -*- coding: utf-8 -*-
+"""
+Offline decoding and replay of captured IEC 104 traffic.
+
+Reads pcap and pcapng files without libpcap, reassembles the TCP streams of
+port 2404 and runs the framer and ASDU decoder over them without sockets.
+
+Run with: python -m iec104.capture file.pcap [--port 2404] [--replay SPEED]
+(--replay needs the Python 2 server: python capture.py file.pcap --replay SPEED)
+"""
+import argparse
+import collections
+import struct
+import sys
+import time
+
+try:
+    from . import asdu, framer, typetable
+except (ImportError, ValueError):
+    import asdu
+    import framer
+    import typetable
+
+PORT = 2404
+
+# I-frames shorter than this have no complete ASDU header
+I_FRAME_MIN_LENGTH = framer.APCI_LENGTH + typetable.HEADER.size
+
+PCAP_MAGIC = 0xA1B2C3D4
+PCAP_MAGIC_NS = 0xA1B23C4D
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_IDB = 1
+PCAPNG_SPB = 3
+PCAPNG_EPB = 6
+PCAPNG_BYTE_ORDER = 0x1A2B3C4D
+PCAPNG_IF_TSRESOL = 9
+
+# Link types
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPE_VLAN = (0x8100, 0x88A8)
+IPPROTO_TCP = 6
+
+TCP_SYN = 0x02
+
+
+def read_packets(f):
+    """
+    Reads a pcap or pcapng file.
+    :return: Generator of (timestamp in seconds, link type, packet data).
+    """
+    head = f.read(4)
+    if len(head) < 4:
+        return iter(())
+    if struct.unpack('<I', head)[0] == PCAPNG_SHB:
+        return read_pcapng(f, head)
+    return read_pcap(f, head)
+
+
+def read_pcap(f, head):
+    for order in '<>':
+        magic, = struct.unpack(order + 'I', head)
+        if magic in (PCAP_MAGIC, PCAP_MAGIC_NS):
+            break
+    else:
+        raise ValueError('Not a pcap file')
+    scale = 1e-9 if magic == PCAP_MAGIC_NS else 1e-6
+    major, minor, zone, sigfigs, snaplen, linktype = struct.unpack(order + 'HHiIII', f.read(20))
+    record = struct.Struct(order + 'IIII')
+    while True:
+        data = f.read(record.size)
+        if len(data) < record.size:
+            return
+        seconds, fraction, length, original = record.unpack(data)
+        yield seconds + fraction * scale, linktype, f.read(length)
+
+
+def read_pcapng(f, head):
+    order = '<'
+    interfaces = []  # (link type, seconds per timestamp unit)
+    while True:
+        if head is None:
+            head = f.read(4)
+        if len(head) < 4:
+            return
+        data = f.read(4)
+        if len(data) < 4:
+            return
+        if struct.unpack('<I', head)[0] == PCAPNG_SHB:
+            # Byte order of the section follows the block length
+            magic = f.read(4)
+            order = '<' if struct.unpack('<I', magic)[0] == PCAPNG_BYTE_ORDER else '>'
+            length, = struct.unpack(order + 'I', data)
+            body = magic + f.read(length - 12)
+            interfaces = []
+        else:
+            length, = struct.unpack(order + 'I', data)
+            body = f.read(length - 8)
+        block_type, = struct.unpack(order + 'I', head)
+        head = None
+        body = body[:-4]  # trailing block length
+        if block_type == PCAPNG_IDB:
+            linktype, = struct.unpack_from(order + 'H', body)
+            interfaces.append((linktype, option_tsresol(body[8:], order)))
+        elif block_type == PCAPNG_EPB:
+            interface, high, low, captured = struct.unpack_from(order + 'IIII', body)
+            linktype, scale = interfaces[interface]
+            yield (high << 32 | low) * scale, linktype, body[20:20 + captured]
+        elif block_type == PCAPNG_SPB:
+            linktype, scale = interfaces[0]
+            # No timestamp, no captured length: everything up to the padding
+            original, = struct.unpack_from(order + 'I', body)
+            yield 0.0, linktype, body[4:4 + original]
+
+
+def option_tsresol(options, order):
+    offset = 0
+    while offset + 4 <= len(options):
+        code, length = struct.unpack_from(order + 'HH', options, offset)
+        if code == 0:
+            break
+        if code == PCAPNG_IF_TSRESOL:
+            value = bytearray(options[offset + 4:offset + 5])[0]
+            return 2.0 ** -(value & 0x7F) if value & 0x80 else 10.0 ** -value
+        offset += 4 + (length + 3) // 4 * 4
+    return 1e-6
+
+
+def ip_packet(linktype, data):
+    """
+    :return: IP packet of a link layer frame, None if it carries no IP.
+    """
+    if linktype == LINKTYPE_ETHERNET:
+        offset = 12
+        ethertype, = struct.unpack_from('>H', data, offset)
+        while ethertype in ETHERTYPE_VLAN:
+            offset += 4
+            ethertype, = struct.unpack_from('>H', data, offset)
+        offset += 2
+    elif linktype == LINKTYPE_LINUX_SLL:
+        ethertype, = struct.unpack_from('>H', data, 14)
+        offset = 16
+    elif linktype == LINKTYPE_NULL:
+        # Address family in host byte order: 2 is IPv4, IPv6 varies by OS
+        family = struct.unpack_from('<I', data)[0] or struct.unpack_from('>I', data)[0]
+        ethertype = ETHERTYPE_IPV4 if family == 2 else ETHERTYPE_IPV6
+        offset = 4
+    elif linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6):
+        return data
+    else:
+        return None
+    if ethertype not in (ETHERTYPE_IPV4, ETHERTYPE_IPV6):
+        return None
+    return data[offset:]
+
+
+def tcp_segment(packet):
+    """
+    :return: (source, destination, sequence number, flags, payload) of a TCP
+    segment, source and destination as (address, port), None for other packets.
+    """
+    if len(packet) < 20:
+        return None
+    version = bytearray(packet[:1])[0] >> 4
+    if version == 4:
+        header = (bytearray(packet[:1])[0] & 0x0F) * 4
+        total, = struct.unpack_from('>H', packet, 2)
+        if bytearray(packet[9:10])[0] != IPPROTO_TCP:
+            return None
+        source, destination = packet[12:16], packet[16:20]
+        end = total or len(packet)
+    elif version == 6:
+        if bytearray(packet[6:7])[0] != IPPROTO_TCP:
+            return None
+        header = 40
+        end = header + struct.unpack_from('>H', packet, 4)[0]
+        source, destination = packet[8:24], packet[24:40]
+    else:
+        return None
+    sport, dport, sequence, ack, offset_flags = struct.unpack_from('>HHIIH', packet, header)
+    payload = packet[header + (offset_flags >> 12) * 4:end]
+    return (source, sport), (destination, dport), sequence, offset_flags & 0x3F, payload
+
+
+class Stream(object):
+    """
+    One direction of a TCP connection, segments are put back into order.
+    Retransmitted bytes are dropped, segments after a gap wait until it is
+    filled. A capture that starts without the SYN is joined at the first segment.
+    """
+
+    def __init__(self):
+        self.next = None
+        self.pending = {}  # sequence number -> payload
+        self.framer = framer.APDUFramer()
+
+    def add(self, sequence, flags, payload):
+        """
+        :return: Payload bytes in order that became available.
+        """
+        if flags & TCP_SYN:
+            self.next = (sequence + 1) & 0xFFFFFFFF
+            return b''
+        if self.next is None:
+            self.next = sequence
+        if not payload:
+            return b''
+        offset = (sequence - self.next) & 0xFFFFFFFF
+        if offset >= 0x80000000:
+            # Starts before next: retransmission, keep the new bytes only
+            payload = payload[(self.next - sequence) & 0xFFFFFFFF:]
+            offset = 0
+        if offset:
+            self.pending[sequence] = payload
+            return b''
+        data = [payload]
+        self.next = (self.next + len(payload)) & 0xFFFFFFFF
+        while self.pending:
+            for sequence in list(self.pending):
+                offset = (sequence - self.next) & 0xFFFFFFFF
+                if offset >= 0x80000000 or offset == 0:
+                    payload = self.pending.pop(sequence)[(self.next - sequence) & 0xFFFFFFFF:]
+                    data.append(payload)
+                    self.next = (self.next + len(payload)) & 0xFFFFFFFF
+                    break
+            else:
+                break
+        return b''.join(data)
+
+
+def apdus(packets, port=PORT):
+    """
+    Reassembles the TCP streams from and to port and cuts them into APDUs.
+    :param packets: (timestamp, link type, data) as from read_packets.
+    :return: Generator of (timestamp, source, destination, APDU without start byte
+    and length), the memoryview is valid until the next one is taken.
+    """
+    streams = {}
+    for timestamp, linktype, data in packets:
+        packet = ip_packet(linktype, data)
+        segment = packet and tcp_segment(packet)
+        if not segment:
+            continue
+        source, destination, sequence, flags, payload = segment
+        if port not in (source[1], destination[1]):
+            continue
+        stream = streams.get((source, destination))
+        if stream is None:
+            stream = streams[(source, destination)] = Stream()
+        data = stream.add(sequence, flags, payload)
+        if data:
+            for frame in stream.framer.feed(data):
+                yield timestamp, source, destination, frame
+
+
+class Statistics(object):
+    def __init__(self):
+        self.apdus = 0
+        self.bytes = 0
+        self.frames = collections.Counter()  # I, S, U
+        self.types = collections.Counter()  # type id of the I-frames
+        self.objects = 0
+        self.errors = 0  # I-frames without complete ASDU header
+        self.duration = 0.0
+
+    def report(self, out=sys.stdout):
+        duration = self.duration or float('nan')
+        out.write('{} APDUs, {} bytes in {:.3f}s: {:.0f} APDUs/s, {:.2f} MB/s\n'.format(
+            self.apdus, self.bytes, self.duration, self.apdus / duration, self.bytes / duration / 1e6))
+        out.write('I-frames {}, S-frames {}, U-frames {}, information objects {}, errors {}\n'.format(
+            self.frames['I'], self.frames['S'], self.frames['U'], self.objects, self.errors))
+        for type_id, count in sorted(self.types.items()):
+            info = asdu.InfoObjMeta.table[type_id]
+            out.write('{:4} {:10} {}\n'.format(type_id, info.name if info else '?', count))
+
+
+def decode(path, port=PORT):
+    """
+    Decodes all APDUs of a capture, ASDUs with asdu.ASDU.from_buffer.
+    :return: Statistics.
+    """
+    stats = Statistics()
+    with open(path, 'rb') as f:
+        start = time.time()
+        for timestamp, source, destination, frame in apdus(read_packets(f), port):
+            stats.apdus += 1
+            stats.bytes += 2 + len(frame)
+            control = bytearray(frame[0:1])[0]
+            if control & 1 == 0:
+                stats.frames['I'] += 1
+                if len(frame) < I_FRAME_MIN_LENGTH:
+                    stats.errors += 1
+                    continue
+                o_asdu = asdu.ASDU.from_buffer(frame, framer.APCI_LENGTH)
+                stats.types[o_asdu.type_id] += 1
+                stats.objects += len(o_asdu.objs)
+            elif control & 3 == 1:
+                stats.frames['S'] += 1
+            else:
+                stats.frames['U'] += 1
+        stats.duration = time.time() - start
+    return stats
+
+
+def monitor_asdus(path, port=PORT):
+    """
+    :return: List of (timestamp, ASDU) sent by the stations (from port), for replay().
+    """
+    with open(path, 'rb') as f:
+        return [(timestamp, frame[framer.APCI_LENGTH:].tobytes()) for timestamp, source, destination, frame
+                in apdus(read_packets(f), port)
+                if source[1] == port and len(frame) >= I_FRAME_MIN_LENGTH and not bytearray(frame[0:1])[0] & 1]
+
+
+def replay(path, speed=1.0, port=PORT, listen=PORT, **kwargs):
+    """
+    Serves the ASDUs the stations sent in the capture from a local IEC104Server
+    to every connected client, speed times faster than captured (0: as fast as
+    the k windows allow), starting when the first client is connected. The
+    server numbers the I-frames itself. Run the IOLoop to start.
+    :return: The server.
+    """
+    import tornado.gen
+    import tornado.ioloop
+    try:
+        from . import server
+    except (ImportError, ValueError):
+        import server
+
+    captured = monitor_asdus(path, port)
+    srv = server.IEC104Server(**kwargs)
+    srv.listen(listen)
+    loop = tornado.ioloop.IOLoop.current()
+
+    @tornado.gen.coroutine
+    def run():
+        while not srv.sessions:
+            yield tornado.gen.sleep(0.1)
+        start = loop.time()
+        first = captured[0][0] if captured else 0.0
+        for timestamp, data in captured:
+            if speed:
+                delay = start + (timestamp - first) / speed - loop.time()
+                if delay > 0:
+                    yield tornado.gen.sleep(delay)
+            for c in list(srv.sessions.values()):
+                c.send_asdu(data)
+
+    loop.add_callback(run)
+    return srv
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Decode or replay IEC 104 traffic of a pcap/pcapng file.')
+    parser.add_argument('path')
+    parser.add_argument('--port', type=int, default=PORT, help='TCP port of the captured stations')
+    parser.add_argument('--replay', type=float, metavar='SPEED',
+                        help='serve the captured ASDUs on port 2404 SPEED times faster than captured (0: at once)')
+    args = parser.parse_args(argv)
+    if args.replay is None:
+        decode(args.path, args.port).report()
+        return
+    import tornado.ioloop
+    replay(args.path, args.replay, args.port)
+    tornado.ioloop.IOLoop.current().start()
+
+
+if __name__ == "__main__":
+    main()
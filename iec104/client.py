@@ -4,10 +4,15 @@ import tornado.iostream
 import socket
 import binascii
 import acpi
-import asdu
+import framer
+import metrics
+import tracing
+import typetable
+import valuestore
+import window
 import struct
 import logging
-from bitstring import ConstBitStream
+from tornado import gen
 from tornado.gen import Task, engine
 
 import time
@@ -19,17 +24,41 @@ logging.basicConfig(level=logging.DEBUG)
 
 import functools
 
-class IEC104Client(object):
+# Sinks do not tell when they have room again, they are polled
+SINK_RETRY = 0.01
 
-    def __init__(self):
-        pass
-        
+
+class IEC104Client(object):
+    """
+    :param pipeline: sinks.Pipeline the received points are written to, reading
+    pauses while its sinks are full.
+    :param instrumented: Collects the metrics of the connections in registry (metrics.Registry).
+    :param trace_every: Keeps 1 in trace_every frames in trace (tracing.FrameTrace
+    of trace_size frames), dumped on sequence errors. 0 traces nothing.
+    """
+
+    def __init__(self, k=window.K, w=window.W, t2=window.T2, pipeline=None, instrumented=True,
+                 trace_every=0, trace_size=1024):
+        self.k = k
+        self.w = w
+        self.t2 = t2
+        self.t2_timer = None
+        # Latest value of every point received, kept across reconnects
+        self.values = valuestore.ValueStore()
+        self.pipeline = pipeline
+        self.registry = metrics.Registry() if instrumented else None
+        self.metrics = None
+        self.trace = tracing.FrameTrace(trace_size, trace_every) if trace_every else None
 
     def connect(self, ip, port=2404):
-        self.ssn = 0
-        self.rsn = 0
+        self.window = window.SlidingWindow(self.k, self.w, self.t2)
+        if self.registry is not None:
+            # Connecting again to the same station counts as reconnect
+            self.metrics = self.registry.session((ip, port), (ip, port))
+            self.window.latency = self.metrics.ack_rtt
         #self.stream = tornado.iostream.IOStream(self.socket)
         self.recived = 0
+        self.framer = framer.APDUFramer()
         self.socket = socket.socket()
         self.stream = tornado.iostream.IOStream(self.socket)
         self.stream.connect((ip, port), self.connect_callback)
@@ -38,55 +67,83 @@ class IEC104Client(object):
         self.stream.close()
 
     @engine
-    def receive(self, data):
-        self.recived = time.time()
-    
-        start, length = struct.unpack('2B', data)
-        #print "len:", length
-        data = yield Task(self.stream.read_bytes, length)
-        s_acpi = ''.join(struct.unpack_from('4s', data))  # keep 0x00
-        acpi_control = struct.unpack_from('B', data)[0]
-
-        if acpi_control & 1 == 0:  # I-FRAME
-            self.ssn, self.rsn = acpi.parse_i_frame(s_acpi)
-            LOG.debug("ssn: {}, rsn: {}".format(self.ssn, self.rsn))
-            #s_asdu = ConstBitStream(bytes=data, offset=5*8)
-            s_asdu = ConstBitStream(bytes=data, offset=4*8)
-            o_asdu = asdu.ASDU(s_asdu)
-            
-            ###
-            for o in o_asdu.objs:
-                if o is asdu.MMeTf1:
-                    print o.val
-                if o is asdu.MSpTb1:
-                    print o.val
-            
-            
-            #self.rsn = ssn + 1
-                
-            #LOG.debug("send>>>>>: ssn: {}, rsn: {}".format(self.ssn, self.rsn))
-            #yield Task(self.send, struct.pack('<1BHHHHH', 0x10, self.ssn, self.rsn, 0x0, 0x33, 0x16))
-            #print 'send>>>>>> ' + str(ssn +1)
-            #yield Task(self.sendfixed, acpi.s_frame(ssn +1))
-            #print  struct.pack('<3BHHHH', 0x10, 0x01, 0x00, ssn +1, 0x0, 0x33, 0x16)
-            #yield Task(self.sendraw, struct.pack('BBBHBB', 0x10, 0x01, 0x0,  0x03, 0x0, 0x16))
-            yield Task(self.send, acpi.s_frame2(self.ssn + 1))
-            #self.ssn += 1
-
-        elif acpi_control & 3 == 1:  # S-FRAME
-            print "S-FRAME"
-            self.rsn = acpi.parse_s_frame(s_acpi)
-            print self.rsn
-
-        elif acpi_control & 3 == 3:  # U-FRAME
-            print "U-FRAME"
-            if s_acpi == acpi.STARTDT_CON:
-                print 'connected'
-
-            if s_acpi == acpi.TESTFR_ACT:
-                print 'ping'
-                yield Task(self.send, acpi.TESTFR_CON)
-        self.stream.read_bytes(2, self.receive)
+    def receive(self):
+        while True:
+            while self.pipeline is not None and self.pipeline.full():
+                yield gen.sleep(SINK_RETRY)
+            count = yield Task(self.stream.read_into, self.framer.writable(), partial=True)
+            self.framer.written(count)
+            self.recived = time.time()
+            m = self.metrics
+            if m is not None:
+                received = self.window.frames_received
+                start = metrics.clock()
+            t = self.trace
+            debug = tracing.enabled(LOG)
+            for data in self.framer.frames():
+                if struct.unpack_from('B', data)[0] & 1 == 0 and len(data) < 4 + typetable.HEADER.size:
+                    LOG.debug("I-frame of %d bytes without ASDU header", len(data))
+                    if t is not None:
+                        t.dump(LOG)
+                    self.close()
+                    return
+                if m is not None:
+                    m.received(data)
+                if t is not None:
+                    t.record(tracing.IN, data, None, self.recived)
+                s_acpi = ''.join(struct.unpack_from('4s', data))  # keep 0x00
+                acpi_control = struct.unpack_from('B', data)[0]
+
+                if acpi_control & 1 == 0:  # I-FRAME
+                    ssn, rsn = acpi.parse_i_frame(s_acpi)
+                    if debug:
+                        LOG.debug("ssn: %s, rsn: %s", ssn, rsn)
+                    if not self.window.received(ssn, self.recived) or not self.window.acknowledged(rsn, self.recived):
+                        LOG.debug("Sequence error: V(R) %s, ssn: %s, rsn: %s", self.window.vr, ssn, rsn)
+                        if t is not None:
+                            t.dump(LOG)
+                        self.close()
+                        return
+                    #s_asdu = ConstBitStream(bytes=data, offset=5*8)
+                    self.values.update(data, 4, self.recived)
+                    if self.pipeline is not None:
+                        self.pipeline.put_asdu(data, 4, self.recived)
+
+                    #self.rsn = ssn + 1
+                        
+                    #LOG.debug("send>>>>>: ssn: {}, rsn: {}".format(self.ssn, self.rsn))
+                    #yield Task(self.send, struct.pack('<1BHHHHH', 0x10, self.ssn, self.rsn, 0x0, 0x33, 0x16))
+                    #print 'send>>>>>> ' + str(ssn +1)
+                    #yield Task(self.sendfixed, acpi.s_frame(ssn +1))
+                    #print  struct.pack('<3BHHHH', 0x10, 0x01, 0x00, ssn +1, 0x0, 0x33, 0x16)
+                    #yield Task(self.sendraw, struct.pack('BBBHBB', 0x10, 0x01, 0x0,  0x03, 0x0, 0x16))
+                    if self.window.ack_due(self.recived):
+                        yield Task(self.send, acpi.s_frame2(self.window.acknowledge()))
+                    elif self.t2_timer is None:
+                        self.t2_timer = tornado.ioloop.IOLoop.current().call_later(self.window.deadline - time.time(), self.check_ack)
+                    #self.ssn += 1
+
+                elif acpi_control & 3 == 1:  # S-FRAME
+                    rsn = acpi.parse_s_frame(s_acpi)
+                    if debug:
+                        LOG.debug("S-FRAME, rsn: %s", rsn)
+                    if not self.window.acknowledged(rsn, self.recived):
+                        self.close()
+                        return
+
+                elif acpi_control & 3 == 3:  # U-FRAME
+                    if debug:
+                        LOG.debug("U-FRAME")
+                    if s_acpi == acpi.STARTDT_CON:
+                        LOG.debug("STARTDT_CON")
+
+                    if s_acpi == acpi.TESTFR_ACT:
+                        LOG.debug("TESTFR_ACT")
+                        yield Task(self.send, acpi.TESTFR_CON)
+
+            if m is not None and self.window.frames_received != received:
+                # Time per I-frame of the read
+                m.decode.record((metrics.clock() - start) / (self.window.frames_received - received))
 
     @engine
     def connect_callback(self):
@@ -97,12 +154,28 @@ class IEC104Client(object):
         try:
         #if not self.stream.closed():
             yield Task(self.send, acpi.STARTDT_ACT)
-            self.stream.read_bytes(2, self.receive)
+            self.receive()
         except Exception as err:
             print err
         #print self.stream.closed()
         
+    def check_ack(self):
+        """
+        t2: acknowledges received I-frames that were not acknowledged by w.
+        """
+        self.t2_timer = None
+        if self.stream.closed():
+            return
+        if self.window.ack_due(time.time()):
+            self.send(acpi.s_frame2(self.window.acknowledge()), None)
+        elif self.window.deadline is not None:
+            self.t2_timer = tornado.ioloop.IOLoop.current().call_later(self.window.deadline - time.time(), self.check_ack)
+
     def send(self, data, callback):
+        if self.metrics is not None:
+            self.metrics.sent(data)
+        if self.trace is not None:
+            self.trace.record(tracing.OUT, data)
         self.stream.write("\x68" + struct.pack("B", len(data)) + data, callback)
         
     #def sendraw(self, data, callback):
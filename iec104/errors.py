@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import functools
+
+
+class IEC104Error(ValueError):
+    """
+    Base of the errors raised while wrapping or unwrapping IEC 104 messages.
+    """
+
+
+class InvalidValue(IEC104Error):
+    """
+    An argument has the wrong type or is out of range.
+    """
+
+
+class InvalidFrame(IEC104Error):
+    """
+    APDU header, frame format or U-frame function could not be determined.
+    """
+
+
+class LengthMismatch(IEC104Error):
+    """
+    The length of an APDU or ASDU does not match its content.
+    """
+
+
+class UnknownTypeId(IEC104Error):
+    """
+    The type identification is not assigned or not supported in this context.
+    """
+
+
+class UnknownCause(IEC104Error):
+    """
+    The cause of transmission is not known.
+    """
+
+
+def error_string(method):
+    """
+    Compatibility shim for the string API: returns "ERROR: <message>" instead of
+    raising an IEC104Error.
+    """
+    @functools.wraps(method)
+    def shim(*args, **kwargs):
+        try:
+            return method(*args, **kwargs)
+        except IEC104Error as error:
+            return "ERROR: " + str(error)
+    return shim
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+import logging
+
+LOG = logging.getLogger()
+
+START = 0x68
+APCI_LENGTH = 4
+APDU_MAX_LENGTH = 253
+
+
+class APDUFramer(object):
+    """
+    Incremental framer for a stream of 0x68-delimited APDUs.
+
+    TCP chunks are read straight into a preallocated buffer (writable()/written(),
+    e.g. with IOStream.read_into) or copied in with feed(). frames() yields a
+    memoryview of every complete APDU (APCI + ASDU, without start byte and length)
+    that is valid until the framer is written to again. Bytes that can not start an
+    APDU are skipped up to the next 0x68.
+    """
+
+    def __init__(self, size=65536):
+        if size < APDU_MAX_LENGTH + 2:
+            raise ValueError('Buffer has to hold at least one APDU')
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+        self.discarded = 0
+
+    def writable(self):
+        """
+        Free space at the end of the buffer. Pending bytes of an incomplete APDU
+        are moved to the front first.
+        """
+        if self.start:
+            pending = self.end - self.start
+            if pending:
+                self.buffer[:pending] = self.view[self.start:self.end].tobytes()
+            self.start = 0
+            self.end = pending
+        return self.view[self.end:]
+
+    def written(self, count):
+        self.end += count
+
+    def feed(self, data):
+        """
+        Copies data into the buffer and yields the complete APDUs as they appear.
+        """
+        data = memoryview(data)
+        while len(data):
+            free = self.writable()
+            count = min(len(free), len(data))
+            free[:count] = data[:count]
+            self.written(count)
+            data = data[count:]
+            for frame in self.frames():
+                yield frame
+
+    def frames(self):
+        buffer = self.buffer
+        while self.end - self.start >= 2:
+            length = buffer[self.start + 1]
+            if buffer[self.start] != START or length < APCI_LENGTH or length > APDU_MAX_LENGTH:
+                self.resync()
+                continue
+            start = self.start + 2
+            if start + length > self.end:
+                return
+            self.start = start + length
+            yield self.view[start:self.start]
+
+    def resync(self):
+        position = self.buffer.find(b'\x68', self.start + 1, self.end)
+        if position < 0:
+            position = self.end
+        LOG.debug("Discarding %d bytes", position - self.start)
+        self.discarded += position - self.start
+        self.start = position
@@ -0,0 +1,373 @@
+# -*- coding: utf-8 -*-
+"""
+Counters and latency histograms of IEC 104 connections.
+
+Every connection gets a SessionMetrics with preallocated arrays: frames in
+and out by frame kind (I, S, U) and by ASDU type id, bytes in and out,
+histograms of the decode time per APDU, the acknowledgement round trip of sent
+I-frames, the window occupancy (outstanding I-frames) and the time ASDUs
+wait for the window by priority. Recording a frame
+is an array increment, nothing is allocated or formatted per frame.
+
+A Registry holds the metrics of all connections of a process, counts
+connections and reconnects, and renders snapshot() (a dict) or the
+Prometheus text format (prometheus()), e.g. served from the event loop of
+the connections.
+"""
+import struct
+import timeit
+from array import array
+
+try:
+    from . import priority, typetable
+except (ImportError, ValueError):
+    import priority
+    import typetable
+
+# Directions
+IN = 0
+OUT = 1
+DIRECTIONS = ('in', 'out')
+
+# Frame kinds
+I_FRAME = 0
+S_FRAME = 1
+U_FRAME = 2
+KINDS = ('I', 'S', 'U')
+
+# Timer of the decode time, the best clock of the interpreter
+clock = timeit.default_timer
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+BYTE = struct.Struct('B')
+
+
+def frame_kind(control):
+    """
+    :param control: First control field octet of the APCI.
+    """
+    if control & 1 == 0:
+        return I_FRAME
+    if control & 3 == 1:
+        return S_FRAME
+    return U_FRAME
+
+
+class Histogram(object):
+    """
+    Log-linear histogram like HdrHistogram: values are counted in buckets of
+    preallocated counts with a relative error below 2 ** (1 - bits). Values
+    are scaled to integer units first (e.g. scale 1e6 for seconds counted in
+    microseconds), values above highest land in the last bucket.
+    """
+    __slots__ = ('scale', 'bits', 'half', 'highest', 'counts', 'count', 'total', 'min', 'max')
+
+    def __init__(self, highest, scale=1.0, bits=5):
+        self.scale = scale
+        self.bits = bits
+        self.half = 1 << (bits - 1)
+        self.highest = max(int(highest * scale), 1 << bits)
+        self.counts = array('L', [0]) * (self.index(self.highest) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+
+    def index(self, units):
+        if units < 1 << self.bits:
+            return units
+        shift = units.bit_length() - self.bits
+        return shift * self.half + (units >> shift)
+
+    def lowest(self, index):
+        """
+        :return: Lowest value (in units) of the bucket index.
+        """
+        if index < 1 << self.bits:
+            return index
+        shift = index // self.half - 1
+        return (index - shift * self.half) << shift
+
+    def record(self, value):
+        units = int(value * self.scale)
+        if units >> self.bits:
+            # index() inlined
+            if units < 0:
+                units = 0
+            else:
+                if units > self.highest:
+                    units = self.highest
+                shift = units.bit_length() - self.bits
+                units = shift * self.half + (units >> shift)
+        self.counts[units] += 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        """
+        :param q: Quantile between 0 and 1.
+        :return: Upper bound of the bucket holding the quantile, at most max. None if empty.
+        """
+        if not self.count:
+            return None
+        rank = max(1, int(q * self.count + 0.999999))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min((self.lowest(index + 1) - 1) / self.scale, self.max)
+        return self.max
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def snapshot(self):
+        result = {
+            'count': self.count,
+            'sum': self.total,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+            'mean': self.total / self.count if self.count else None,
+        }
+        for q in QUANTILES:
+            result['p{:g}'.format(q * 100)] = self.percentile(q)
+        return result
+
+
+class SessionMetrics(object):
+    """
+    Metrics of one connection, kept cheap enough for every frame: I-frames are
+    only counted by ASDU type (asdus_in/asdus_out, indexed by type id), S- and
+    U-frames by kind (frames_in/frames_out, indexed by S_FRAME and U_FRAME).
+    received() and sent() count a frame and its bytes, hot paths increment the
+    arrays themselves and add the bytes per read and write (bytes_in/bytes_out).
+    A hot path may also append the type ids of received I-frames to types_in
+    and decode times to decode_in, fold() adds them to asdus_in and decode
+    before they are read.
+    The decode time is taken per read divided by its I-frames, the window
+    occupancy once per flush. Bytes by frame kind are derived, S- and U-frames
+    have 6 bytes.
+    """
+
+    def __init__(self):
+        self.asdus_in = array('L', [0]) * 256
+        self.asdus_out = array('L', [0]) * 256
+        self.frames_in = array('L', [0]) * 3
+        self.frames_out = array('L', [0]) * 3
+        self.bytes_in = 0
+        self.bytes_out = 0
+        # Type ids of received I-frames and decode times not in asdus_in and decode yet
+        self.types_in = bytearray()
+        self.decode_in = array('d')
+        # Seconds per APDU, up to 1 s in microseconds
+        self.decode = Histogram(1.0, 1e6)
+        # Seconds from sending an I-frame to its acknowledgement, up to t1
+        self.ack_rtt = Histogram(255.0, 1e6)
+        # Outstanding I-frames after sending, up to the largest k
+        self.window = Histogram(32767)
+        # Seconds every sent ASDU waited for the window, by priority
+        self.queued = tuple(Histogram(255.0, 1e6) for name in priority.NAMES)
+
+    def received(self, frame):
+        """
+        Counts a received frame (APCI and ASDU as cut out by the framer).
+        """
+        self.bytes_in += len(frame) + 2
+        kind = frame_kind(BYTE.unpack_from(frame)[0])
+        if kind == I_FRAME:
+            self.asdus_in[BYTE.unpack_from(frame, 4)[0]] += 1
+        else:
+            self.frames_in[kind] += 1
+
+    def sent(self, apci, asdu=b''):
+        """
+        Counts a sent frame.
+        """
+        self.bytes_out += len(apci) + len(asdu) + 2
+        if asdu:
+            self.asdus_out[BYTE.unpack_from(asdu)[0]] += 1
+        else:
+            self.frames_out[frame_kind(BYTE.unpack_from(apci)[0])] += 1
+
+    def fold(self):
+        """
+        Adds the type ids waiting in types_in to asdus_in and the times waiting
+        in decode_in to decode.
+        """
+        types = self.types_in
+        if types:
+            for type_id in set(types):
+                self.asdus_in[type_id] += types.count(BYTE.pack(type_id))
+            del types[:]
+        if self.decode_in:
+            for seconds in self.decode_in:
+                self.decode.record(seconds)
+            del self.decode_in[:]
+
+    def merge(self, other):
+        self.fold()
+        other.fold()
+        for name in ('asdus_in', 'asdus_out', 'frames_in', 'frames_out'):
+            mine = getattr(self, name)
+            for slot, value in enumerate(getattr(other, name)):
+                if value:
+                    mine[slot] += value
+        self.bytes_in += other.bytes_in
+        self.bytes_out += other.bytes_out
+        self.decode.merge(other.decode)
+        self.ack_rtt.merge(other.ack_rtt)
+        self.window.merge(other.window)
+        for mine, theirs in zip(self.queued, other.queued):
+            mine.merge(theirs)
+
+    def frames(self, direction):
+        """
+        :return: Number of I-, S- and U-frames.
+        """
+        self.fold()
+        asdus, frames = (self.asdus_in, self.frames_in) if direction == IN else (self.asdus_out, self.frames_out)
+        return sum(asdus), frames[S_FRAME], frames[U_FRAME]
+
+    def bytes(self, direction):
+        """
+        :return: Bytes of the I-, S- and U-frames.
+        """
+        total = self.bytes_in if direction == IN else self.bytes_out
+        i_frames, s_frames, u_frames = self.frames(direction)
+        return total - 6 * (s_frames + u_frames), 6 * s_frames, 6 * u_frames
+
+    def asdus(self, direction):
+        """
+        Yields the type name (or id if unassigned) and number of I-frames of the types seen.
+        """
+        self.fold()
+        counts = self.asdus_in if direction == IN else self.asdus_out
+        for type_id in range(256):
+            if counts[type_id]:
+                info = typetable.TYPES[type_id]
+                yield (str(type_id) if info is None else info.name), counts[type_id]
+
+    def snapshot(self):
+        self.fold()
+        result = {'frames': {}, 'bytes': {}, 'asdus': {}}
+        for direction, name in enumerate(DIRECTIONS):
+            result['frames'][name] = dict(zip(KINDS, self.frames(direction)))
+            result['bytes'][name] = dict(zip(KINDS, self.bytes(direction)))
+            result['asdus'][name] = dict(self.asdus(direction))
+        result['decode'] = self.decode.snapshot()
+        result['ack_rtt'] = self.ack_rtt.snapshot()
+        result['window'] = self.window.snapshot()
+        result['queued'] = dict((name, histogram.snapshot()) for name, histogram in zip(priority.NAMES, self.queued))
+        return result
+
+
+class Registry(object):
+    """
+    Metrics of all connections of a process, keyed like the sessions. The
+    metrics of closed connections are kept in their sum.
+    """
+
+    def __init__(self):
+        self.sessions = {}
+        self.closed = SessionMetrics()
+        self.peers = set()
+        self.connections = 0
+        self.reconnects = 0
+
+    def session(self, key, peer=None):
+        """
+        :param peer: Counts as reconnect if a connection to peer was open before, e.g. the host of the station.
+        :return: New SessionMetrics of connection key.
+        """
+        self.remove(key)
+        self.connections += 1
+        if peer is not None:
+            if peer in self.peers:
+                self.reconnects += 1
+            self.peers.add(peer)
+        metrics = self.sessions[key] = SessionMetrics()
+        return metrics
+
+    def remove(self, key):
+        metrics = self.sessions.pop(key, None)
+        if metrics is not None:
+            self.closed.merge(metrics)
+
+    def total(self):
+        """
+        :return: SessionMetrics summed over all connections, open and closed.
+        """
+        total = SessionMetrics()
+        total.merge(self.closed)
+        for metrics in self.sessions.values():
+            total.merge(metrics)
+        return total
+
+    def snapshot(self):
+        return {
+            'connections': self.connections,
+            'reconnects': self.reconnects,
+            'total': self.total().snapshot(),
+            'sessions': dict((':'.join(str(part) for part in key) if isinstance(key, tuple) else str(key),
+                              metrics.snapshot()) for key, metrics in self.sessions.items()),
+        }
+
+    def prometheus(self, prefix='iec104'):
+        """
+        :return: Totals in the Prometheus text exposition format (per connection
+        labels would not scale to thousands of connections, see snapshot()).
+        """
+        total = self.total()
+        lines = []
+
+        def metric(name, kind, help, samples):
+            lines.append('# HELP {}_{} {}'.format(prefix, name, help))
+            lines.append('# TYPE {}_{} {}'.format(prefix, name, kind))
+            for labels, value in samples:
+                lines.append('{}_{}{} {}'.format(prefix, name, labels, value))
+
+        def summary(name, help, histograms):
+            """
+            :param histograms: List of labels (e.g. 'class="bulk"' or '') and histogram.
+            """
+            lines.append('# HELP {}_{} {}'.format(prefix, name, help))
+            lines.append('# TYPE {}_{} summary'.format(prefix, name))
+            for labels, histogram in histograms:
+                for q in QUANTILES:
+                    lines.append('{}_{}{{{}quantile="{}"}} {!r}'.format(
+                        prefix, name, labels + ',' if labels else '', q, float(histogram.percentile(q) or 0)))
+                labels = '{{{}}}'.format(labels) if labels else ''
+                lines.append('{}_{}_sum{} {!r}'.format(prefix, name, labels, float(histogram.total)))
+                lines.append('{}_{}_count{} {}'.format(prefix, name, labels, histogram.count))
+
+        metric('connections_total', 'counter', 'Connections opened.', [('', self.connections)])
+        metric('reconnects_total', 'counter', 'Connections opened to or from a peer seen before.',
+               [('', self.reconnects)])
+        metric('sessions', 'gauge', 'Open connections.', [('', len(self.sessions))])
+        for name, values, help in (('frames_total', total.frames, 'APDUs by frame kind.'),
+                                   ('bytes_total', total.bytes, 'Bytes of the APDUs by frame kind.')):
+            metric(name, 'counter', help, [
+                ('{{direction="{}",kind="{}"}}'.format(direction, kind), value)
+                for d, direction in enumerate(DIRECTIONS) for kind, value in zip(KINDS, values(d))])
+        metric('asdus_total', 'counter', 'I-frames by ASDU type.', [
+            ('{{direction="{}",type="{}"}}'.format(direction, type_name), value)
+            for d, direction in enumerate(DIRECTIONS) for type_name, value in total.asdus(d)])
+        summary('decode_seconds', 'Decode time per APDU.', [('', total.decode)])
+        summary('ack_rtt_seconds', 'Time from sending an I-frame to its acknowledgement.', [('', total.ack_rtt)])
+        summary('window_outstanding', 'Unacknowledged I-frames after sending one.', [('', total.window)])
+        summary('queued_seconds', 'Time the sent ASDUs waited for the window, by priority.',
+                [('class="{}"'.format(name), histogram) for name, histogram in zip(priority.NAMES, total.queued)])
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import struct
+
+START = 0x68
+APDU_MAX_LENGTH = 253
+
+HEADER = struct.Struct('BB')
+# Start byte, length, N(S) and N(R) of an I-frame
+I_HEADER = struct.Struct('<BBHH')
+
+
+class OutputBuffer(object):
+    """
+    Collects the APDUs of one connection in a preallocated buffer and hands them
+    to write() in one call instead of one socket write per frame.
+
+    The buffer is flushed when the next APDU does not fit (size), delay seconds
+    after the first APDU was added (time, scheduled with schedule(delay, callback),
+    e.g. IOLoop.call_later) or explicitly, e.g. when the k window closes.
+    write() receives a memoryview of the buffer and has to copy what it keeps.
+    """
+
+    def __init__(self, write, schedule=None, size=8192, delay=0.0):
+        if size < APDU_MAX_LENGTH + 2:
+            raise ValueError('Buffer has to hold at least one APDU')
+        self.write = write
+        self.schedule = schedule
+        self.delay = delay
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.end = 0
+        self.frames = 0
+        self.scheduled = False
+
+        # Counters
+        self.flushes = 0
+        self.frames_flushed = 0
+        self.bytes_flushed = 0
+
+    def __len__(self):
+        return self.end
+
+    def append(self, apci, asdu=b''):
+        """
+        Adds an APDU, start byte and length are prepended.
+        """
+        length = len(apci) + len(asdu)
+        if length > APDU_MAX_LENGTH:
+            raise ValueError('APDU of {} bytes is too long'.format(length))
+        if self.end + 2 + length > len(self.buffer):
+            self.flush()
+        end = self.end
+        HEADER.pack_into(self.buffer, end, START, length)
+        end += 2
+        self.buffer[end:end + len(apci)] = apci
+        end += len(apci)
+        self.buffer[end:end + len(asdu)] = asdu
+        self.end = end + len(asdu)
+        self.added()
+
+    def append_i_frame(self, ssn, rsn, asdu):
+        """
+        Adds an I-frame, start byte, length and APCI are packed in front of asdu
+        in place. asdu is only read, e.g. one ASDU broadcast to many connections.
+        """
+        length = 4 + len(asdu)
+        if length > APDU_MAX_LENGTH:
+            raise ValueError('APDU of {} bytes is too long'.format(length))
+        if self.end + 2 + length > len(self.buffer):
+            self.flush()
+        end = self.end
+        I_HEADER.pack_into(self.buffer, end, START, length, ssn << 1, rsn << 1)
+        end += I_HEADER.size
+        self.buffer[end:end + len(asdu)] = asdu
+        self.end = end + len(asdu)
+        self.added()
+
+    def added(self):
+        self.frames += 1
+        if self.schedule is not None and not self.scheduled:
+            self.scheduled = True
+            self.schedule(self.delay, self.expire)
+
+    def expire(self):
+        self.scheduled = False
+        self.flush()
+
+    def flush(self):
+        if not self.end:
+            return
+        self.flushes += 1
+        self.frames_flushed += self.frames
+        self.bytes_flushed += self.end
+        data = self.view[:self.end]
+        self.end = 0
+        self.frames = 0
+        self.write(data)
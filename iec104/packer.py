@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Packs any number of information objects of one type into the fewest ASDUs that
+fit into APDUs of at most 253 bytes.
+
+Runs of contiguous IOAs are sent as sequences (SQ=1, one IOA per ASDU), all other
+objects are filled into SQ=0 ASDUs. Updates are (ioa, field, ...) tuples as in
+typetable.pack_objects, e.g. (ioa, value, qds) for M_ME_NC_1. They are packed in
+the given order, sort them by IOA to get the longest runs.
+"""
+try:
+    from . import typetable
+except (ImportError, ValueError):
+    import typetable
+
+APDU_MAX_LENGTH = 253
+APCI_LENGTH = 4
+ASDU_MAX_LENGTH = APDU_MAX_LENGTH - APCI_LENGTH
+MAX_OBJECTS = 127
+
+# Type identification, VSQ, cause of transmission, originator address, common address
+ASDU_HEADER = typetable.HEADER
+IOA_LENGTH = 3
+
+
+def capacity(info, sequence):
+    """
+    :return: Maximum number of objects (SQ=0) or elements (SQ=1) of an ASDU of the type.
+    """
+    if info.single:
+        return 1
+    space = ASDU_MAX_LENGTH - ASDU_HEADER.size
+    if sequence:
+        return min(MAX_OBJECTS, (space - IOA_LENGTH) // info.size)
+    return min(MAX_OBJECTS, space // (IOA_LENGTH + info.size))
+
+
+def plan(info, ioas):
+    """
+    Splits the IOAs into the minimal number of ASDUs, keeping their order.
+    :return: List of (start, end, sequence) slices of ioas.
+    """
+    if info.variable:
+        raise ValueError('{} carries data of variable length'.format(info.name))
+    objects = capacity(info, False)
+    elements = capacity(info, True) if info.sequence and not info.single else 0
+    # The farther an ASDU reaches, the fewer objects remain, so the longest
+    # possible ASDU at every step gives the fewest ASDUs
+    result = []
+    start = 0
+    while start < len(ioas):
+        end, sequence = min(len(ioas), start + objects), False
+        if elements:
+            run = start + 1
+            limit = min(len(ioas), start + elements)
+            while run < limit and ioas[run] == ioas[run - 1] + 1:
+                run += 1
+            if run >= end:
+                end, sequence = run, True
+        result.append((start, end, sequence))
+        start = end
+    return result
+
+
+def pack_asdu(info, objects, sequence, cot, common_address, originator_address=0):
+    """
+    :param objects: (ioa, field, ...) tuples, contiguous IOAs if sequence is set.
+    :return: ASDU as a bytestring.
+    """
+    vsq = len(objects) | (0x80 if sequence else 0)
+    return (ASDU_HEADER.pack(info.type_id, vsq, cot, originator_address, common_address) +
+            typetable.pack_objects(info, objects, sequence))
+
+
+def pack(type_id, updates, cot, common_address, originator_address=0):
+    """
+    :param cot: Cause of transmission byte, including P/N and test bit.
+    :return: List of ASDUs as bytestrings.
+    """
+    info = typetable.get(type_id)
+    if info is None:
+        raise ValueError('Unknown type identification {}'.format(type_id))
+    updates = list(updates)
+    return [pack_asdu(info, updates[start:end], sequence, cot, common_address, originator_address)
+            for start, end, sequence in plan(info, [update[0] for update in updates])]
@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+"""
+Process image of a controlled station.
+
+Points are keyed by (common address, IOA) and live in one slot of typed arrays
+(value, quality, time). set_value() marks a point dirty when its quality changes
+or its value moves more than the deadband away from the value last reported,
+spontaneous() packs the dirty points into COT 3 ASDUs and interrogation()
+packs the whole image, both without an object per point.
+"""
+import ctypes
+import mmap
+import time
+from array import array
+
+try:
+    from . import packer, timetag, typetable
+except (ImportError, ValueError):
+    import packer
+    import timetag
+    import typetable
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+SPONTANEOUS = 3
+INTERROGATED_BY_STATION = 20
+
+# Interrogated points are sent without time tag
+UNTIMED = {}
+for name, untimed in (('M_SP_TA_1', 'M_SP_NA_1'), ('M_SP_TB_1', 'M_SP_NA_1'),
+                      ('M_DP_TA_1', 'M_DP_NA_1'), ('M_DP_TB_1', 'M_DP_NA_1'),
+                      ('M_ST_TA_1', 'M_ST_NA_1'), ('M_ST_TB_1', 'M_ST_NA_1'),
+                      ('M_BO_TA_1', 'M_BO_NA_1'), ('M_BO_TB_1', 'M_BO_NA_1'),
+                      ('M_ME_TA_1', 'M_ME_NA_1'), ('M_ME_TD_1', 'M_ME_NA_1'),
+                      ('M_ME_TB_1', 'M_ME_NB_1'), ('M_ME_TE_1', 'M_ME_NB_1'),
+                      ('M_ME_TC_1', 'M_ME_NC_1'), ('M_ME_TF_1', 'M_ME_NC_1'),
+                      ('M_IT_TA_1', 'M_IT_NA_1'), ('M_IT_TB_1', 'M_IT_NA_1')):
+    UNTIMED[typetable.BY_NAME[name].type_id] = typetable.BY_NAME[untimed].type_id
+
+# Single and double points carry value and quality in one byte (SIQ, DIQ)
+STATE_BITS = {1: 0x01, 2: 0x01, 30: 0x01, 3: 0x03, 4: 0x03, 31: 0x03}
+# Types with a value field and a quality descriptor, M_ME_ND_1 without quality
+POINT_TYPES = set(STATE_BITS) | set(UNTIMED) | set(UNTIMED.values()) | set([21])
+
+
+def element(info, value, quality, timestamp):
+    """
+    :param timestamp: Seconds since the epoch, for the time tag of the type.
+    :return: Information element fields of a point for typetable.pack_objects.
+    """
+    bits = STATE_BITS.get(info.type_id)
+    if bits is not None:
+        fields = ((int(value) & bits) | (quality & 0xF0),)
+    elif info.layout[0] == 'f':
+        fields = (value, quality)
+    elif info.type_id == 21:
+        fields = (int(value),)
+    else:
+        fields = (int(value), quality)
+    if info.time == 7:
+        fields += (timetag.epoch_ms_to_cp56time2a(int(round(timestamp * 1000))),)
+    elif info.time == 3:
+        milliseconds = int(round(timestamp * 1000)) % timetag.MS_PER_HOUR
+        fields += (timetag.pack_cp24time2a(milliseconds // timetag.MS_PER_MINUTE,
+                                           milliseconds % timetag.MS_PER_MINUTE),)
+    return fields
+
+
+class PointDatabase(object):
+    """
+    Points of all common addresses of a station.
+    """
+
+    def __init__(self):
+        self.index = {}  # (ca, ioa) -> slot
+        self.keys = []  # slot -> (ca, ioa)
+        self.common_addresses = set()
+        self.type_ids = array('B')
+        self.values = array('d')
+        self.qualities = array('B')
+        self.timestamps = array('d')
+        self.deadbands = array('d')
+        self.reported = array('d')  # value and quality of the last spontaneous transmission
+        self.reported_qualities = array('B')
+        self.groups = array('H')  # interrogation groups 1..16 as bits 0..15
+        self.dirty = bytearray()
+        self.changed = []  # dirty slots
+        self.order = None  # (ca, type id) -> slots sorted by IOA, rebuilt after add()
+
+        # Counters
+        self.updates = 0
+        self.suppressed = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def add(self, ca, ioa, type_id, value=0, quality=0, deadband=0.0, timestamp=None, groups=()):
+        """
+        Adds a point, it is not reported spontaneously until it changes.
+        :param deadband: Changes of the value up to this amount are not reported.
+        :param groups: Interrogation groups (1..16) of the point, all points belong to the station interrogation.
+        :return: Slot of the point.
+        """
+        if type_id not in POINT_TYPES:
+            raise ValueError('Points of type {} are not supported'.format(type_id))
+        if (ca, ioa) in self.index:
+            raise ValueError('Point {}/{} exists'.format(ca, ioa))
+        slot = len(self.keys)
+        self.index[(ca, ioa)] = slot
+        self.keys.append((ca, ioa))
+        self.common_addresses.add(ca)
+        self.type_ids.append(type_id)
+        self.allocate(slot, value, quality, time.time() if timestamp is None else timestamp)
+        self.deadbands.append(deadband)
+        self.reported.append(value)
+        self.reported_qualities.append(quality)
+        self.groups.append(sum(1 << (group - 1) for group in groups))
+        self.dirty.append(0)
+        self.order = None
+        return slot
+
+    def allocate(self, slot, value, quality, timestamp):
+        """
+        Stores value, quality and time of a new point.
+        """
+        self.values.append(value)
+        self.qualities.append(quality)
+        self.timestamps.append(timestamp)
+
+    def store(self, slot, value, quality, timestamp):
+        self.values[slot] = value
+        self.qualities[slot] = quality
+        self.timestamps[slot] = timestamp
+
+    def load(self, slot):
+        """
+        :return: value, quality, timestamp
+        """
+        return self.values[slot], self.qualities[slot], self.timestamps[slot]
+
+    def get(self, ca, ioa):
+        """
+        :return: value, quality, timestamp
+        """
+        return self.load(self.index[(ca, ioa)])
+
+    def set_value(self, ca, ioa, value, quality=None, timestamp=None):
+        """
+        Updates the image, the point becomes dirty if the quality changed or the
+        value left the deadband around the value last reported.
+        :param quality: Quality descriptor, unchanged if None.
+        :return: True if the point is dirty.
+        """
+        return self.update(self.index[(ca, ioa)], value, quality, timestamp)
+
+    def update(self, slot, value, quality=None, timestamp=None):
+        """
+        set_value() by slot.
+        """
+        if quality is None:
+            quality = self.qualities[slot]
+        self.store(slot, value, quality, time.time() if timestamp is None else timestamp)
+        return self.mark(slot, value, quality)
+
+    def mark(self, slot, value, quality):
+        """
+        Change detection of a new value and quality of a point.
+        :return: True if the point is dirty.
+        """
+        self.updates += 1
+        deadband = self.deadbands[slot]
+        change = abs(value - self.reported[slot])
+        significant = quality != self.reported_qualities[slot] or (change > deadband if deadband else change != 0)
+        if not significant:
+            if not self.dirty[slot]:
+                self.suppressed += 1
+            return bool(self.dirty[slot])
+        if not self.dirty[slot]:
+            self.dirty[slot] = 1
+            self.changed.append(slot)
+        return True
+
+    def changes(self):
+        """
+        Takes the dirty points, their current values count as reported.
+        :return: Slots of the dirty points.
+        """
+        changed = self.changed
+        self.changed = []
+        for slot in changed:
+            self.dirty[slot] = 0
+            self.reported[slot], self.reported_qualities[slot] = self.load(slot)[:2]
+        return changed
+
+    def sync(self):
+        """
+        Takes changes made by other processes, see SharedPointDatabase.
+        :return: Number of points changed.
+        """
+        return 0
+
+    def objects(self, info, slots):
+        """
+        :return: (ioa, field, ...) tuples of the points as info.
+        """
+        keys, values, qualities, timestamps = self.keys, self.values, self.qualities, self.timestamps
+        return [(keys[slot][1],) + element(info, values[slot], qualities[slot], timestamps[slot]) for slot in slots]
+
+    def spontaneous(self, cot=SPONTANEOUS):
+        """
+        Packs the dirty points into ASDUs of their type, one point at most once.
+        :return: List of ASDUs as bytestrings.
+        """
+        return self.pack(self.changes(), cot)
+
+    def pack(self, slots, cot=SPONTANEOUS):
+        """
+        Packs the points of slots into ASDUs of their common address and type, e.g.
+        the part of changes() a subscriber is interested in.
+        :return: List of ASDUs as bytestrings.
+        """
+        batches = {}
+        for slot in slots:
+            batches.setdefault((self.keys[slot][0], self.type_ids[slot]), []).append(slot)
+        result = []
+        for (ca, type_id), slots in sorted(batches.items()):
+            slots.sort(key=self.keys.__getitem__)
+            info = typetable.TYPES[type_id]
+            result.extend(packer.pack(type_id, self.objects(info, slots), cot, ca))
+        return result
+
+    def interrogation(self, ca=None, cot=INTERROGATED_BY_STATION, group=0):
+        """
+        Packs the image (of one common address) into ASDUs of the types without
+        time tag, one ASDU at a time.
+        :param group: Interrogation group 1..16, 0 for the station interrogation.
+        :return: Generator of ASDUs as bytestrings.
+        """
+        if self.order is None:
+            order = {}
+            for slot, key in enumerate(self.keys):
+                type_id = self.type_ids[slot]
+                order.setdefault((key[0], UNTIMED.get(type_id, type_id)), []).append(slot)
+            for slots in order.values():
+                slots.sort(key=self.keys.__getitem__)
+            self.order = sorted(order.items())
+        for (group_ca, type_id), slots in self.order:
+            if ca is not None and group_ca != ca:
+                continue
+            if group:
+                bit, groups = 1 << (group - 1), self.groups
+                slots = [slot for slot in slots if groups[slot] & bit]
+            info = typetable.TYPES[type_id]
+            keys = self.keys
+            for start, end, sequence in packer.plan(info, [keys[slot][1] for slot in slots]):
+                yield packer.pack_asdu(info, self.objects(info, slots[start:end]), sequence, cot, group_ca)
+
+
+class SharedPointDatabase(PointDatabase):
+    """
+    Process image with value, quality and time of the points in shared memory.
+
+    One producer process writes with set_value(), the worker processes call
+    sync() to mark the points written since their last call dirty and send them
+    to their own sessions. All processes add the same points in the same order,
+    usually once before forking. The memory is an anonymous mmap inherited by
+    forked processes unless a buffer of size(capacity) bytes is given, e.g. the
+    buf of a multiprocessing.shared_memory.SharedMemory on Python 3. Processes
+    that attach to a buffer the producer has filled already pass attach=True,
+    add() then leaves the values in the buffer as they are.
+
+    Every point has a seqlock: the producer makes its sequence number odd while
+    writing, readers retry until they read the same even number before and
+    after the values. Its generation is the value of the global generation
+    counter after its last write.
+    """
+    HEADER = 8
+    SLOT = 8 + 8 + 8 + 8 + 1  # sequence, generation, value, time, quality
+
+    def __init__(self, capacity, buffer=None, attach=False):
+        self.capacity = capacity
+        self.attach = attach
+        if buffer is None:
+            buffer = mmap.mmap(-1, self.size(capacity))
+        self.memory = buffer
+        offset = self.HEADER
+        self.generation = ctypes.c_uint64.from_buffer(buffer)
+        self.sequences = (ctypes.c_uint64 * capacity).from_buffer(buffer, offset)
+        offset += capacity * 8
+        self.generations = (ctypes.c_uint64 * capacity).from_buffer(buffer, offset)
+        self.generations_offset = offset
+        offset += capacity * 8
+        self.shared_values = (ctypes.c_double * capacity).from_buffer(buffer, offset)
+        offset += capacity * 8
+        self.shared_timestamps = (ctypes.c_double * capacity).from_buffer(buffer, offset)
+        offset += capacity * 8
+        self.shared_qualities = (ctypes.c_ubyte * capacity).from_buffer(buffer, offset)
+        self.synced = 0  # generation seen by sync()
+        PointDatabase.__init__(self)
+        self.values, self.qualities, self.timestamps = self.shared_values, self.shared_qualities, self.shared_timestamps
+
+    @classmethod
+    def size(cls, capacity):
+        return cls.HEADER + capacity * cls.SLOT
+
+    def allocate(self, slot, value, quality, timestamp):
+        if slot >= self.capacity:
+            raise ValueError('The shared image holds {} points'.format(self.capacity))
+        if not self.attach:
+            self.store(slot, value, quality, timestamp)
+
+    def store(self, slot, value, quality, timestamp):
+        # Single producer: no other process writes the sequence numbers
+        self.sequences[slot] += 1
+        self.values[slot] = value
+        self.qualities[slot] = quality
+        self.timestamps[slot] = timestamp
+        self.generation.value += 1
+        self.generations[slot] = self.generation.value
+        self.sequences[slot] += 1
+
+    def load(self, slot):
+        sequences = self.sequences
+        while True:
+            sequence = sequences[slot]
+            if sequence & 1:
+                continue
+            result = self.values[slot], self.qualities[slot], self.timestamps[slot]
+            if sequences[slot] == sequence:
+                return result
+
+    def objects(self, info, slots):
+        keys, load = self.keys, self.load
+        result = []
+        for slot in slots:
+            value, quality, timestamp = load(slot)
+            result.append((keys[slot][1],) + element(info, value, quality, timestamp))
+        return result
+
+    def sync(self):
+        """
+        Marks the points written by the producer since the last call dirty, they
+        are sent by the next spontaneous().
+        :return: Number of points written.
+        """
+        generation = self.generation.value
+        if generation == self.synced:
+            return 0
+        count = len(self.keys)
+        if numpy is not None:
+            generations = numpy.frombuffer(self.memory, numpy.uint64, count, self.generations_offset)
+            written = numpy.flatnonzero(generations > self.synced).tolist()
+        else:
+            generations, synced = self.generations, self.synced
+            written = [slot for slot in range(count) if generations[slot] > synced]
+        # Points written during the scan are taken again by the next call,
+        # unchanged values are not reported twice
+        self.synced = generation
+        for slot in written:
+            value, quality, timestamp = self.load(slot)
+            self.mark(slot, value, quality)
+        return len(written)
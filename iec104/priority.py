@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+Send priorities of ASDUs, by their cause of transmission.
+
+U- and S-frames are not queued at all, they go out as soon as they are due.
+Of the I-frames waiting for the k window, command confirmations and
+terminations and spontaneous events (URGENT) go out before cyclic,
+background and interrogated data (BULK), which can keep the window full
+for a long time.
+"""
+import struct
+
+URGENT = 0
+BULK = 1
+NAMES = ('urgent', 'bulk')
+
+# Causes of transmission of the bulk class: periodic/cyclic, background
+# scan, interrogated by station and groups 1..16, counter interrogations
+BULK_CAUSES = frozenset([1, 2] + list(range(20, 42)))
+
+# By the 6 bit cause of transmission
+PRIORITIES = tuple(BULK if cot in BULK_CAUSES else URGENT for cot in range(64))
+
+COT = struct.Struct('B')
+
+
+def classify(asdu):
+    """
+    :return: Priority of the ASDU, URGENT or BULK.
+    """
+    return PRIORITIES[COT.unpack_from(asdu, 2)[0] & 0x3F]
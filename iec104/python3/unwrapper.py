@@ -1,5 +1,20 @@
+import os
 import struct
+import sys
 import unittest
+from array import array
+from unittest import mock
+
+try:
+    from iec104 import errors, typetable
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    from iec104 import errors, typetable
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 TESTFR_CON = 131
 TESTFR_ACT = 67
@@ -31,73 +46,85 @@ M_ME_NC_1_LENGTH = 5
 
 APDU_MIN_LEN = 10
 
+# Columnar layout of SQ=1 sequence elements: (array typecode, numpy dtype) of the 4 byte value followed by a QDS byte.
+COLUMNAR_TYPES = {M_BO_NA_1: ('I', '<u4'), M_ME_NC_1: ('f', '<f4')}
+COLUMNAR_ELEMENT_LENGTH = 5
+
 class IEC104Unwrapper():
     """
     This class provides an unwrapper with functions to unwrap IEC 104 messages. Look into the IEC 104 specification to learn the details.
+    The decode_* functions raise an IEC104Error (see iec104.errors) if unwrapping fails, the unwrap_* functions are the same functions \
+    returning an "ERROR: ..." string instead.
+    :param trusted: If set, the decode_* functions skip the type checks of their arguments (e.g. for APDUs read from a socket, which \
+    are always bytestrings). Lengths, type identifications and causes of transmission are still checked.
     """
 
-    def unwrap_header(self, header):
+    def __init__(self, trusted = False):
+        self.trusted = trusted
+        # Information elements with a format of their own. All other types of the type table are unwrapped into their raw fields.
+        self.element_decoders = {
+            M_BO_NA_1: self.decode_information_element_m_bo_na_1,
+            M_ME_NC_1: self.decode_information_element_m_me_nc_1,
+            C_SC_NA_1: self.decode_information_element_c_sc_na_1,
+            C_IC_NA_1: self.decode_information_element_c_ic_na_1,
+        }
+
+    def decode_header(self, header):
         """
         Unwraps an IEC 104 APDU header.
         :param apdu: APDU header as a bytestring.
-        :return: Length of the APDU (excluding header). ERROR if failed.
+        :return: Length of the APDU (excluding header).
         """
-        if not type(header) is bytes:
-            return "ERROR: The APDU header has to be a bytestring."
+        if not self.trusted and not type(header) is bytes:
+            raise errors.InvalidValue("The APDU header has to be a bytestring.")
         if len(header) != 2:
-            return "ERROR: The APDU header has to be exactly 2 bytes long."
+            raise errors.LengthMismatch("The APDU header has to be exactly 2 bytes long.")
         start, length = struct.unpack('<2B', header)
         if start != 0x68:
-            return "ERROR: The APDU has to start with a 68H."
+            raise errors.InvalidFrame("The APDU has to start with a 68H.")
         return length
 
-    def unwrap_apdu(self, apdu, length):
+    def decode_apdu(self, apdu, length, columnar = False):
         """
         Unwraps an IEC 104 APDU header.
         :param apdu: APDU as a bytestring.
         :param length: Length of the APDU as an integer.
-        :return: A tuple containing the information carried by the APDU in the order it was packed(see IEC 104 specification figures). ERROR if failed.
+        :param columnar: If set, sequences (SQ=1) of M_BO_NA_1 and M_ME_NC_1 are unwrapped with decode_information_objects_columnar.
+        :return: A tuple containing the information carried by the APDU in the order it was packed(see IEC 104 specification figures).
         """
         offset = 0
-        if not type(apdu) is bytes:
-            return "ERROR: The APDU has to be a bytestring."
-        if (not type(length) is int) or (length < APDU_MIN_LEN):
-            return "ERROR: The length has to be an integer bigger than " + str(APDU_MIN_LEN - 1) + "(excluding header)."
-        frame = self.unwrap_frame(struct.unpack_from('<4B', apdu, offset))
-        if type(frame) is str:
-            return frame
-        type_id = struct.unpack_from('<B', apdu, offset + 4)[0]
-        asdu_type = self.unwrap_type_identification(type_id)
-        if "ERROR:" in asdu_type:
-            return asdu_type
-        vsq = self.unwrap_variable_structure_qualifier(struct.unpack_from('<B', apdu, offset + 5)[0])
-        if type(vsq) is str:
-            # At the moment this is not reachable due to the APDU being checked to be a bytestring. 
-            # In case it becomes possible in the future the check is already here but a test has yet to be added.
-            return vsq
-        cot = self.unwrap_cause_of_transmission(struct.unpack_from('<B', apdu, offset + 6)[0])
-        if type(cot) is str:
-            return cot
-        oa = struct.unpack_from('<B', apdu, offset + 7)[0]
-        ca = struct.unpack_from('<2B', apdu, offset + 8)[0]
+        if not self.trusted:
+            if not type(apdu) is bytes:
+                raise errors.InvalidValue("The APDU has to be a bytestring.")
+            if not type(length) is int:
+                raise errors.InvalidValue("The length has to be an integer bigger than " + str(APDU_MIN_LEN - 1) + "(excluding header).")
+        if length < APDU_MIN_LEN:
+            raise errors.LengthMismatch("The length has to be an integer bigger than " + str(APDU_MIN_LEN - 1) + "(excluding header).")
+        frame = self.decode_frame(struct.unpack_from('<4B', apdu, offset))
+        type_id = apdu[offset + 4]
+        asdu_type = self.decode_type_identification(type_id)
+        vsq = self.decode_variable_structure_qualifier(apdu[offset + 5])
+        cot = self.decode_cause_of_transmission(apdu[offset + 6])
+        oa = apdu[offset + 7]
+        ca = apdu[offset + 8]
         if vsq[1] == 0:
             if (len(apdu) - APDU_MIN_LEN) != 0:
-                return "ERROR: No information object was expected but the APDU still contains information."
-            else:
-                return (frame, asdu_type, (vsq[0], vsq[1]), cot, oa, ca, "No information objects/elements.")
-        io = self.unwrap_information_objects(type_id, vsq[0], vsq[1], apdu, (length - APDU_MIN_LEN), offset + 10)
-        if type(io) is str:
-            return io
-        return (frame, asdu_type, (vsq[0], vsq[1]), cot, oa, ca, io)
+                raise errors.LengthMismatch("No information object was expected but the APDU still contains information.")
+            return (frame, asdu_type, vsq, cot, oa, ca, "No information objects/elements.")
+        if columnar and vsq[0] == 1 and type_id in COLUMNAR_TYPES:
+            io = self.decode_information_objects_columnar(type_id, vsq[1], apdu, (length - APDU_MIN_LEN), offset + 10)
+        else:
+            io = self.decode_information_objects(type_id, vsq[0], vsq[1], apdu, (length - APDU_MIN_LEN), offset + 10)
+        return (frame, asdu_type, vsq, cot, oa, ca, io)
 
-    def unwrap_frame(self, frame):
+    def decode_frame(self, frame):
         """
         Unwraps an IEC 104 frame.
         :param frame: Tuple containing 4 integers representing a frame.
-        :return: A tuple containing the frame type and depending on the type some of the following: send sequence number, receive sequence number, function name. ERROR if failed.
+        :return: A tuple containing the frame type and depending on the type some of the following: send sequence number, receive sequence number, function name.
         """
-        if (not type(frame) is tuple) or (len(frame) != 4):
-            return "ERROR: The frame has to be a tuple containing 4 integers."
+        if not self.trusted and ((not type(frame) is tuple) or (len(frame) != 4)):
+            raise errors.InvalidValue("The frame has to be a tuple containing 4 integers.")
         if (frame[0] & 0x01) == 0:
             frame_type = "i-frame"
             ssn = (frame[1] << 7) + (frame[0] >> 1)
@@ -125,52 +152,43 @@ class IEC104Unwrapper():
                     elif frame[0] == NO_FUNC:
                         ssn = "NO_FUNC"
                     else:
-                        return "ERROR: Function type could not be determined."
+                        raise errors.InvalidFrame("Function type could not be determined.")
                     rsn = 0
                 else:
-                    return "ERROR: Frame type could not be determined."
+                    raise errors.InvalidFrame("Frame type could not be determined.")
         return (frame_type, ssn, rsn)
     
-    def unwrap_type_identification(self, type_id):
+    def decode_type_identification(self, type_id):
         """
         Finds the IEC 104 ASDU type corresponding to the given type identification.
         :param type_id: Type identification as integer.
-        :return: ASDU Type as string. ERROR if failed.
-        """
-        if not type(type_id) is int:
-            return "ERROR: The type identification has to be an integer."
-        if type_id == M_BO_NA_1:
-            asdu_type = "M_BO_NA_1"
-        elif type_id == M_ME_NC_1:
-            asdu_type = "M_ME_NC_1"
-        elif type_id == C_SC_NA_1:
-            asdu_type = "C_SC_NA_1"
-        elif type_id == C_IC_NA_1:
-            asdu_type = "C_IC_NA_1"
-        elif type_id == C_RD_NA_1:
-            asdu_type = "C_RD_NA_1"
-        else:
-            return "ERROR: The ASDU type was not recognized."
-        return asdu_type
-
-    def unwrap_variable_structure_qualifier(self, vsq):
+        :return: ASDU Type as string.
+        """
+        if not self.trusted and not type(type_id) is int:
+            raise errors.InvalidValue("The type identification has to be an integer.")
+        info = typetable.get(type_id)
+        if info is None:
+            raise errors.UnknownTypeId("The ASDU type was not recognized.")
+        return info.name
+
+    def decode_variable_structure_qualifier(self, vsq):
         """
         Reads the sequence bit and length from an IEC 104 variable structure qualifier.
         :param vsq: Variable structure qualifier as integer.
-        :return: Tuple containing the sequence bit and the length. ERROR if failed.
+        :return: Tuple containing the sequence bit and the length.
         """
-        if not type(vsq) is int:
-            return "ERROR: The variable structure qualifier has to be an integer."
+        if not self.trusted and not type(vsq) is int:
+            raise errors.InvalidValue("The variable structure qualifier has to be an integer.")
         return (((vsq >> 7) & 0x01), (vsq & 0x7F))
 
-    def unwrap_cause_of_transmission(self, cot):
+    def decode_cause_of_transmission(self, cot):
         """
         Reads the P/N bit, the Testbit and cause of transmission from an integer.
         :param cot: Integer representing a cause of transmission and the corresponding P/N bit and Testbit.
-        :return: Tuple containing the cause of transmission, the P/N bit and the Testbit. ERROR if failed.
+        :return: Tuple containing the cause of transmission, the P/N bit and the Testbit.
         """
-        if not type(cot) is int:
-            return "ERROR: The cause of transmission, P/N bit and Testit have to be wrapped into an integer."
+        if not self.trusted and not type(cot) is int:
+            raise errors.InvalidValue("The cause of transmission, P/N bit and Testit have to be wrapped into an integer.")
         cause_id = (cot & 0x3F)
         if cause_id == PERIODIC:
             cause = "periodic"
@@ -185,10 +203,10 @@ class IEC104Unwrapper():
         elif cause_id == RETURN_INFORMATION_BY_REMOTE_COMMAND:
             cause = "return information by remote command"
         else:
-            return "ERROR: No cause of transmission was found."
+            raise errors.UnknownCause("No cause of transmission was found.")
         return (cause, ((cot >> 6) & 0x01), ((cot >> 7) & 0x01))
 
-    def unwrap_information_objects(self, type_id, sequence, asdu_length, asdu, length, offset):
+    def decode_information_objects(self, type_id, sequence, asdu_length, asdu, length, offset):
         """
         Unpacks information object(s)/element(s) and their corresponding object information.
         :param type_id: Type of the message as an integer.
@@ -197,175 +215,193 @@ class IEC104Unwrapper():
         :param asdu: Information object(s)/element(s) of an ASDU as a single bytestring.
         :param length: Expected byte length of the information object(s)/element(s).
         :return: List of tuples each containing an information object/element found in the ASDU and \
-        the corresponding object information depending on the type identification(see IEC 104 specification for Details). ERROR if failed.
+        the corresponding object information depending on the type identification(see IEC 104 specification for Details).
         """
         i = 0
         result = []
-        if not type(type_id) is int:
-            return "ERROR: The type identification has to be an integer."
-        if not sequence in [0,1]:
-            return "ERROR: Sequence bit has to be 0 or 1."
-        if (not type(asdu_length) is int) or (asdu_length < 1):
-            return "ERROR: The ASDU length has to be an integer bigger than 0."
-        if not type(asdu) is bytes:
-            return "ERROR: The ASDU has to be a bytestring."
-        if not type(length) is int:
-            return "ERROR: The ASDU byte length has to be an integer."
+        if not self.trusted:
+            if not type(type_id) is int:
+                raise errors.InvalidValue("The type identification has to be an integer.")
+            if not sequence in [0,1]:
+                raise errors.InvalidValue("Sequence bit has to be 0 or 1.")
+            if (not type(asdu_length) is int) or (asdu_length < 1):
+                raise errors.InvalidValue("The ASDU length has to be an integer bigger than 0.")
+            if not type(asdu) is bytes:
+                raise errors.InvalidValue("The ASDU has to be a bytestring.")
+            if not type(length) is int:
+                raise errors.InvalidValue("The ASDU byte length has to be an integer.")
+        info = typetable.get(type_id)
+        decode_element = self.element_decoders.get(type_id)
         if sequence == 1:
-            if type_id == M_BO_NA_1:
-                if (asdu_length * M_BO_NA_1_LENGTH + INFORMATION_OBJECT_ADDRESS_LENGTH) != length:
-                    return "ERROR: The expected ASDU length does not equal the real length."
-                ioa = self.unwrap_information_object_address(struct.unpack_from('<3B', asdu, offset))
-                if type(ioa) is str:
-                    # At the moment this(as well as other exception catching within the function) is not reachable due to the ASDU being checked to be a bytestring. 
-                    # In case it becomes possible in the future the checks are already here but tests have yet to be added.
-                   return ioa
-                result.append(ioa)
-                offset = offset + 3
-                while i < asdu_length:
-                    bsi = struct.unpack_from('<4s', asdu, offset)[0].decode()
-                    qds = self.unwrap_quality_descriptor(struct.unpack_from('<B', asdu, offset + 4)[0])
-                    if type(qds) is str:
-                        return qds
-                    result.append((bsi, qds))
-                    offset = offset + 5
-                    i = i + 1
-            elif type_id == M_ME_NC_1:
-                if (asdu_length * M_ME_NC_1_LENGTH + INFORMATION_OBJECT_ADDRESS_LENGTH) != length:
-                    return "ERROR: The expected ASDU length does not equal the real length."
-                ioa = self.unwrap_information_object_address(struct.unpack_from('<3B', asdu, offset))
-                if type(ioa) is str:
-                    return ioa
-                result.append(ioa)
-                offset = offset + 3
-                while i < asdu_length:
-                    number = struct.unpack_from('<f', asdu, offset)[0]
-                    qds = self.unwrap_quality_descriptor(struct.unpack_from('<B', asdu, offset + 4)[0])
-                    if type(qds) is str:
-                        return qds
-                    result.append((number, qds))
-                    offset = offset + 5
-                    i = i + 1
-            else: 
-                return "ERROR: The ASDU type was not recognized or does not work as a sequence."
+            if info is None or not info.sequence:
+                raise errors.UnknownTypeId("The ASDU type was not recognized or does not work as a sequence.")
+            if (asdu_length * info.size + INFORMATION_OBJECT_ADDRESS_LENGTH) != length:
+                raise errors.LengthMismatch("The expected ASDU length does not equal the real length.")
+            result.append(self.decode_information_object_address(struct.unpack_from('<3B', asdu, offset)))
+            offset = offset + INFORMATION_OBJECT_ADDRESS_LENGTH
+            while i < asdu_length:
+                result.append(decode_element(asdu, offset) if decode_element else info.element.unpack_from(asdu, offset))
+                offset = offset + info.size
+                i = i + 1
         else:
-            if type_id == M_BO_NA_1:
-                if (asdu_length * (M_BO_NA_1_LENGTH + INFORMATION_OBJECT_ADDRESS_LENGTH)) != length:
-                    return "ERROR: The expected ASDU length does not equal the real length."
-                while i < asdu_length:
-                    ioa = self.unwrap_information_object_address(struct.unpack_from('<3B', asdu, offset))
-                    if type(ioa) is str:
-                        return ioa
-                    bsi = struct.unpack_from('<4s', asdu, offset + 3)[0].decode()
-                    qds = self.unwrap_quality_descriptor(struct.unpack_from('<B', asdu, offset + 7)[0])
-                    if type(qds) is str:
-                        return qds
-                    result.append((ioa, bsi, qds))
-                    offset = offset + 8
-                    i = i + 1
-            elif type_id == M_ME_NC_1:
-                if (asdu_length * (M_ME_NC_1_LENGTH + INFORMATION_OBJECT_ADDRESS_LENGTH)) != length:
-                    return "ERROR: The expected ASDU length does not equal the real length."
-                while i < asdu_length:
-                    ioa = self.unwrap_information_object_address(struct.unpack_from('<3B', asdu, offset))
-                    if type(ioa) is str:
-                        return ioa
-                    number = struct.unpack_from('<f', asdu, offset + 3)[0]
-                    qds = self.unwrap_quality_descriptor(struct.unpack_from('<B', asdu, offset + 7)[0])
-                    if type(qds) is str:
-                        return qds
-                    result.append((ioa, number, qds))
-                    offset = offset + 8
-                    i = i + 1
-            elif type_id == C_SC_NA_1:
-                if asdu_length != 1:
-                    return "ERROR: C_SC_NA_1 expects only one information object."
-                if (asdu_length + INFORMATION_OBJECT_ADDRESS_LENGTH) != length:
-                    return "ERROR: The expected ASDU length does not equal the real length."
-                ioa = self.unwrap_information_object_address(struct.unpack_from('<3B', asdu, offset))
-                if type(ioa) is str:
-                    return ioa
-                sco = self.unwrap_single_command(struct.unpack_from('<B', asdu, offset + 3)[0])
-                if type(sco) is str:
-                    return sco
-                result.append((ioa, sco))
-            elif type_id == C_IC_NA_1:
-                if asdu_length != 1:
-                    return "ERROR: C_IC_NA_1 expects only one information object."
-                if (asdu_length + INFORMATION_OBJECT_ADDRESS_LENGTH) != length:
-                    return "ERROR: The expected ASDU length does not equal the real length."
-                ioa = self.unwrap_information_object_address(struct.unpack_from('<3B', asdu))
-                if type(ioa) is str:
-                    return ioa
-                qoi = self.unwrap_qualifier_of_interrogation(struct.unpack_from('<B', asdu, offset + 3)[0])
-                if type(qoi) is str:
-                    return qoi
-                result.append((ioa, qoi))
-            elif type_id == C_RD_NA_1:
-                if asdu_length != 1:
-                    return "ERROR: C_RD_NA_1 expects only one information object."
-                if INFORMATION_OBJECT_ADDRESS_LENGTH != length:
-                    return "ERROR: The expected ASDU length does not equal the real length."
-                ioa = self.unwrap_information_object_address(struct.unpack_from('<3B', asdu))
-                if type(ioa) is str:
-                    return ioa
-                result.append(ioa)
-            else:
-                return "ERROR: The ASDU type was not recognized or does only work as a sequence."
+            if info is None:
+                raise errors.UnknownTypeId("The ASDU type was not recognized or does only work as a sequence.")
+            if info.single and asdu_length != 1:
+                raise errors.LengthMismatch(info.name + " expects only one information object.")
+            if info.variable:
+                # Segments carry their own length
+                return typetable.unpack_objects(info, asdu, offset, asdu_length, 0)
+            if (asdu_length * (info.size + INFORMATION_OBJECT_ADDRESS_LENGTH)) != length:
+                raise errors.LengthMismatch("The expected ASDU length does not equal the real length.")
+            while i < asdu_length:
+                ioa = self.decode_information_object_address(struct.unpack_from('<3B', asdu, offset))
+                offset = offset + INFORMATION_OBJECT_ADDRESS_LENGTH
+                element = decode_element(asdu, offset) if decode_element else info.element.unpack_from(asdu, offset)
+                # Objects without information element (C_RD_NA_1) are just their address
+                result.append((ioa,) + element if info.size else ioa)
+                offset = offset + info.size
+                i = i + 1
         return result
 
-    def unwrap_information_object_address(self, ioa):
+    def decode_information_element_m_bo_na_1(self, asdu, offset):
+        """
+        Unpacks an M_BO_NA_1 information element.
+        :return: Tuple containing the bitstring as string and the quality descriptor.
+        """
+        bsi = struct.unpack_from('<4s', asdu, offset)[0].decode()
+        return (bsi, self.decode_quality_descriptor(asdu[offset + 4]))
+
+    def decode_information_element_m_me_nc_1(self, asdu, offset):
+        """
+        Unpacks an M_ME_NC_1 information element.
+        :return: Tuple containing the value and the quality descriptor.
+        """
+        number = struct.unpack_from('<f', asdu, offset)[0]
+        return (number, self.decode_quality_descriptor(asdu[offset + 4]))
+
+    def decode_information_element_c_sc_na_1(self, asdu, offset):
+        """
+        Unpacks a C_SC_NA_1 information element.
+        :return: Tuple containing the single command.
+        """
+        return (self.decode_single_command(asdu[offset]),)
+
+    def decode_information_element_c_ic_na_1(self, asdu, offset):
+        """
+        Unpacks a C_IC_NA_1 information element.
+        :return: Tuple containing the qualifier of interrogation.
+        """
+        return (self.decode_qualifier_of_interrogation(asdu[offset]),)
+
+    def decode_information_objects_columnar(self, type_id, asdu_length, asdu, length, offset):
+        """
+        Unpacks a sequence (SQ=1) of M_BO_NA_1 or M_ME_NC_1 elements into columns without creating an object per element.
+        The values and quality descriptors are gathered with strided slices over the ASDU bytes. NumPy arrays are returned if NumPy \
+        is installed, array.array otherwise.
+        :param type_id: Type of the message as an integer.
+        :param asdu_length: Amount of elements as an integer.
+        :param asdu: Information elements of an ASDU as a single bytestring.
+        :param length: Expected byte length of the information elements.
+        :param offset: Offset of the information object address within asdu.
+        :return: Tuple containing the information object address of the first element, the amount of elements, \
+        the values (float32 for M_ME_NC_1, uint32 for M_BO_NA_1) and the raw quality descriptors (uint8).
+        """
+        if not type_id in COLUMNAR_TYPES:
+            raise errors.UnknownTypeId("The ASDU type was not recognized or can not be unwrapped into columns.")
+        if not self.trusted:
+            if (not type(asdu_length) is int) or (asdu_length < 1):
+                raise errors.InvalidValue("The ASDU length has to be an integer bigger than 0.")
+            if not type(asdu) is bytes:
+                raise errors.InvalidValue("The ASDU has to be a bytestring.")
+        if (asdu_length * COLUMNAR_ELEMENT_LENGTH + INFORMATION_OBJECT_ADDRESS_LENGTH) != length:
+            raise errors.LengthMismatch("The expected ASDU length does not equal the real length.")
+        start = offset + INFORMATION_OBJECT_ADDRESS_LENGTH
+        end = start + asdu_length * COLUMNAR_ELEMENT_LENGTH
+        if len(asdu) < end:
+            raise errors.LengthMismatch("The ASDU is shorter than its information elements.")
+        ioa = self.decode_information_object_address(struct.unpack_from('<3B', asdu, offset))
+        typecode, dtype = COLUMNAR_TYPES[type_id]
+        if numpy is not None:
+            elements = numpy.frombuffer(asdu, numpy.dtype([('value', dtype), ('qds', 'u1')]), asdu_length, start)
+            return (ioa, asdu_length, numpy.ascontiguousarray(elements['value']), numpy.ascontiguousarray(elements['qds']))
+        values = bytearray(asdu_length * 4)
+        for i in range(4):
+            values[i::4] = asdu[start + i:end:COLUMNAR_ELEMENT_LENGTH]
+        values = array(typecode, values)
+        if sys.byteorder == 'big':
+            values.byteswap()
+        return (ioa, asdu_length, values, array('B', asdu[start + 4:end:COLUMNAR_ELEMENT_LENGTH]))
+
+    def decode_information_object_address(self, ioa):
         """
         Reads the bits of an IEC 104 information object address.
         :param ioa: Tuple containing with 3 members with bits of the information object address in the following order: lower bits, middle bits, upper bits.
-        :return: IEC 104 information object address as an integer. ERROR if failed.
+        :return: IEC 104 information object address as an integer.
         """
-        if (not type(ioa) is tuple) or (len(ioa) != 3) or (not type(ioa[0]) is int) or (not type(ioa[1]) is int) or (not type(ioa[2]) is int):
-            return "ERROR: Information object address has to be a tuple containing 3 integers."
+        if not self.trusted and ((not type(ioa) is tuple) or (len(ioa) != 3) or (not type(ioa[0]) is int) or (not type(ioa[1]) is int) or (not type(ioa[2]) is int)):
+            raise errors.InvalidValue("Information object address has to be a tuple containing 3 integers.")
         return ioa[0] + (ioa[1] << 8) + (ioa[2] << 16)
 
 
-    def unwrap_quality_descriptor(self, qds):
+    def decode_quality_descriptor(self, qds):
         """
         Reads the bits of an IEC 104 quality descriptor from an integer.
         :param qds: Quality descriptor as an integer.
-        :return: Tuple containing the overflow bit, the blocked bit, the substituted bit, the not topical bit and the invalid bit in this order. ERROR if failed.
+        :return: Tuple containing the overflow bit, the blocked bit, the substituted bit, the not topical bit and the invalid bit in this order.
         """
-        if not type(qds) is int:
-            return "ERROR: The quality descriptor has to be an integer."
+        if not self.trusted and not type(qds) is int:
+            raise errors.InvalidValue("The quality descriptor has to be an integer.")
         return (qds & 0x01, (qds >> 4) & 0x01, (qds >> 5) & 0x01, (qds >> 6) & 0x01, (qds >> 7) & 0x01)
 
-    def unwrap_single_command(self, sco):
+    def decode_single_command(self, sco):
         """
         Reads the bits of an IEC 104 single command from an integer.
         :param sco: Single command as an integer.
-        :return: Tuple containing the single command state bit and a qualifier of command. ERROR if failed.
+        :return: Tuple containing the single command state bit and a qualifier of command.
         """
-        if not type(sco) is int:
-            return "ERROR: A single command has to be an integer."
-        qoc = self.unwrap_qualifier_of_command((sco & 0xFC) >> 2)
-        return (sco & 0x01, qoc)
+        if not self.trusted and not type(sco) is int:
+            raise errors.InvalidValue("A single command has to be an integer.")
+        return (sco & 0x01, self.decode_qualifier_of_command((sco & 0xFC) >> 2))
 
-    def unwrap_qualifier_of_command(self, qoc):
+    def decode_qualifier_of_command(self, qoc):
         """
         Reads the bits of an IEC 104 qualifier of command from an integer.
         :param qoc: Qualifier of command as an integer.
-        :return: Tuple containing a qualifier and the S/E bit. ERROR if failed.
+        :return: Tuple containing a qualifier and the S/E bit.
         """
-        if not type(qoc) is int:
-            return "ERROR: Qualifier of command has to be an integer."
+        if not self.trusted and not type(qoc) is int:
+            raise errors.InvalidValue("Qualifier of command has to be an integer.")
         return (qoc & 0x1F, (qoc >> 5) & 0x01)
 
-    def unwrap_qualifier_of_interrogation(self, qualifier):
+    def decode_qualifier_of_interrogation(self, qualifier):
         """
         Creates an IEC 104 qualifier of interrogation.
         :param qualifier: Number representing an interrogation type as defined in IEC 104.
-        :return: IEC 104 qualifier of interrogation as a bytestring. ERROR if failed.
+        :return: IEC 104 qualifier of interrogation as a bytestring.
         """
-        if (not type(qualifier) is int) or (qualifier < 0) or (qualifier > 255):
-            return "ERROR: Qualifier of interrogation has to be an integer between 0 and 255."
+        if not self.trusted and ((not type(qualifier) is int) or (qualifier < 0) or (qualifier > 255)):
+            raise errors.InvalidValue("Qualifier of interrogation has to be an integer between 0 and 255.")
         return qualifier
-                
+
+    # String API: "ERROR: ..." is returned instead of raising an IEC104Error.
+    unwrap_header = errors.error_string(decode_header)
+    unwrap_apdu = errors.error_string(decode_apdu)
+    unwrap_frame = errors.error_string(decode_frame)
+    unwrap_type_identification = errors.error_string(decode_type_identification)
+    unwrap_variable_structure_qualifier = errors.error_string(decode_variable_structure_qualifier)
+    unwrap_cause_of_transmission = errors.error_string(decode_cause_of_transmission)
+    unwrap_information_objects = errors.error_string(decode_information_objects)
+    unwrap_information_element_m_bo_na_1 = errors.error_string(decode_information_element_m_bo_na_1)
+    unwrap_information_element_m_me_nc_1 = errors.error_string(decode_information_element_m_me_nc_1)
+    unwrap_information_element_c_sc_na_1 = errors.error_string(decode_information_element_c_sc_na_1)
+    unwrap_information_element_c_ic_na_1 = errors.error_string(decode_information_element_c_ic_na_1)
+    unwrap_information_objects_columnar = errors.error_string(decode_information_objects_columnar)
+    unwrap_information_object_address = errors.error_string(decode_information_object_address)
+    unwrap_quality_descriptor = errors.error_string(decode_quality_descriptor)
+    unwrap_single_command = errors.error_string(decode_single_command)
+    unwrap_qualifier_of_command = errors.error_string(decode_qualifier_of_command)
+    unwrap_qualifier_of_interrogation = errors.error_string(decode_qualifier_of_interrogation)
+
     def verify_apdu_content(self, apdu, frame_type, asdu_type, sequence, cause_of_transmission, pn, min_io = 0, max_io = 127):
         """
         Checks if the contents of an APDU are what of the expected format. Look at IEC 104 specification for details on the parameters.
@@ -437,6 +473,8 @@ class TestUnwrapper(unittest.TestCase):
         self.assertEqual("C_SC_NA_1", unwrapper.unwrap_type_identification(C_SC_NA_1))
         self.assertEqual("C_IC_NA_1", unwrapper.unwrap_type_identification(C_IC_NA_1))
         self.assertEqual("C_RD_NA_1", unwrapper.unwrap_type_identification(C_RD_NA_1))
+        self.assertEqual("M_ME_TF_1", unwrapper.unwrap_type_identification(36))
+        self.assertEqual("ERROR: The ASDU type was not recognized.", unwrapper.unwrap_type_identification(256))
         self.assertEqual("ERROR: The type identification has to be an integer.", unwrapper.unwrap_type_identification("Test"))
         self.assertEqual("ERROR: The ASDU type was not recognized.", unwrapper.unwrap_type_identification(-1))
 
@@ -521,6 +559,16 @@ class TestUnwrapper(unittest.TestCase):
         self.assertEqual([(65537, (0, (31, 1)))], unwrapper.unwrap_information_objects(C_SC_NA_1, 0, 1, b'\x01\x00\x01\xFC', 4, 0))
         self.assertEqual([(65537, 255)], unwrapper.unwrap_information_objects(C_IC_NA_1, 0, 1, b'\x01\x00\x01\xFF', 4, 0))
         self.assertEqual([(65537)], unwrapper.unwrap_information_objects(C_RD_NA_1, 0, 1, b'\x01\x00\x01', 3, 0))
+
+        # Types without element unwrapper return the raw fields of the type table
+        self.assertEqual([10, (-2, 0), (3, 128)], \
+            unwrapper.unwrap_information_objects(11, 1, 2, b'\x0A\x00\x00\xFE\xFF\x00\x03\x00\x80', 9, 0))
+        self.assertEqual([(10, 1, b'\x01\x02\x03\x04\x05\x06\x07')], \
+            unwrapper.unwrap_information_objects(30, 0, 1, b'\x0A\x00\x00\x01\x01\x02\x03\x04\x05\x06\x07', 11, 0))
+        self.assertEqual("ERROR: C_SE_NC_1 expects only one information object.", \
+            unwrapper.unwrap_information_objects(50, 0, 2, b'\x0A\x00\x00\x00\x00\x80\x3F\x00', 8, 0))
+        self.assertEqual("ERROR: The ASDU type was not recognized or does not work as a sequence.", \
+            unwrapper.unwrap_information_objects(50, 1, 1, b'\x0A\x00\x00\x00\x00\x80\x3F\x00', 8, 0))
         
         # Exceptions
         self.assertEqual("ERROR: The type identification has to be an integer.", unwrapper.unwrap_information_objects("Test", 0, 1, b'\x01\x00\x01', 3, 0))
@@ -550,6 +598,38 @@ class TestUnwrapper(unittest.TestCase):
         self.assertEqual("ERROR: The expected ASDU length does not equal the real length.", unwrapper.unwrap_information_objects(C_IC_NA_1, 0, 1, b'\x01\x00\x01\xFF', 40, 0))
         self.assertEqual("ERROR: The expected ASDU length does not equal the real length.", unwrapper.unwrap_information_objects(C_RD_NA_1, 0, 1, b'\x01\x00\x01', 30, 0))
 
+    def test_unwrap_information_objects_columnar(self):
+        unwrapper = IEC104Unwrapper()
+        asdu = b'\xFF\x0A\x00\x00\x00\x00\x80\x3F\x00\x9a\x99\x59\x40\x81\x00\x00\x20\xC1\xF0'
+        bsi = b'\xFF\x0A\x00\x00Test\x00\x01\x00\x00\x00\x10'
+
+        def unwrap():
+            ioa, count, values, qds = unwrapper.unwrap_information_objects_columnar(M_ME_NC_1, 3, asdu, 18, 1)
+            self.assertEqual((10, 3), (ioa, count))
+            # Should be 3.4 but flotaing point errors..
+            self.assertEqual([1.0, 3.4000000953674316, -10.0], [float(value) for value in values])
+            self.assertEqual(4, values.itemsize)
+            self.assertEqual(b'\x00\x81\xF0', bytes(qds))
+            ioa, count, values, qds = unwrapper.unwrap_information_objects_columnar(M_BO_NA_1, 2, bsi, 13, 1)
+            self.assertEqual((10, 2, [0x74736554, 1]), (ioa, count, [int(value) for value in values]))
+            self.assertEqual(b'\x00\x10', bytes(qds))
+            # The length argument matches, the buffer is too short
+            self.assertEqual("ERROR: The ASDU is shorter than its information elements.", \
+                unwrapper.unwrap_information_objects_columnar(M_ME_NC_1, 3, asdu[:-1], 18, 1))
+
+        # NumPy if installed, then array.array
+        unwrap()
+        with mock.patch.object(sys.modules[__name__], 'numpy', None):
+            unwrap()
+
+        # Exceptions
+        self.assertEqual("ERROR: The ASDU type was not recognized or can not be unwrapped into columns.", \
+            unwrapper.unwrap_information_objects_columnar(C_SC_NA_1, 1, b'\x01\x00\x01\xFC', 4, 0))
+        self.assertEqual("ERROR: The ASDU length has to be an integer bigger than 0.", unwrapper.unwrap_information_objects_columnar(M_ME_NC_1, 0, asdu, 18, 1))
+        self.assertEqual("ERROR: The ASDU has to be a bytestring.", unwrapper.unwrap_information_objects_columnar(M_ME_NC_1, 3, "Test", 18, 1))
+        self.assertEqual("ERROR: The expected ASDU length does not equal the real length.", \
+            unwrapper.unwrap_information_objects_columnar(M_ME_NC_1, 3, asdu, 17, 1))
+
     def test_unwrap_apdu(self):
         unwrapper = IEC104Unwrapper()
         self.assertEqual((('i-frame', 1, 1), 'M_BO_NA_1', (0, 2), ('periodic', 0, 0), 0, 1, [(0, "Test", (0, 0, 0, 0, 0)), (1, "Test", (0, 0, 0, 0, 0))]), \
@@ -572,6 +652,35 @@ class TestUnwrapper(unittest.TestCase):
             unwrapper.unwrap_apdu(b'\x02\x00\x02\x00\x07\x00\x01\x00\x01\x00\x00\x00\x00Test\x00\x01\x00\x00Test\x00', 26))
         self.assertEqual("ERROR: The expected ASDU length does not equal the real length.", \
             unwrapper.unwrap_apdu(b'\x02\x00\x02\x00\x07\x02\x01\x00\x01\x00', 10))
+        apdu = unwrapper.unwrap_apdu(b'\x02\x00\x02\x00\x0D\x82\x01\x00\x01\x00\x05\x00\x00\x00\x00\x80\x3F\x00\x00\x00\x00\x40\x80', 23, True)
+        self.assertEqual((('i-frame', 1, 1), 'M_ME_NC_1', (1, 2), ('periodic', 0, 0), 0, 1), apdu[:6])
+        self.assertEqual((5, 2, [1.0, 2.0], b'\x00\x80'), (apdu[6][0], apdu[6][1], [float(value) for value in apdu[6][2]], bytes(apdu[6][3])))
+
+    def test_decode_apdu(self):
+        unwrapper = IEC104Unwrapper()
+        trusted = IEC104Unwrapper(trusted = True)
+        apdu = b'\x02\x00\x02\x00\x07\x02\x01\x00\x01\x00\x00\x00\x00Test\x00\x01\x00\x00Test\x00'
+        self.assertEqual(unwrapper.unwrap_apdu(apdu, 26), unwrapper.decode_apdu(apdu, 26))
+        self.assertEqual(unwrapper.unwrap_apdu(apdu, 26), trusted.decode_apdu(apdu, 26))
+        # Trusted unwrappers accept any buffer
+        self.assertEqual(unwrapper.unwrap_apdu(apdu, 26), trusted.decode_apdu(bytearray(apdu), 26))
+
+        # Exceptions
+        with self.assertRaises(errors.InvalidValue):
+            unwrapper.decode_apdu("Test", 10)
+        with self.assertRaises(errors.LengthMismatch):
+            trusted.decode_apdu(apdu, 9)
+        with self.assertRaises(errors.InvalidFrame):
+            trusted.decode_apdu(b'\x0F' + apdu[1:], 26)
+        with self.assertRaises(errors.UnknownTypeId) as context:
+            trusted.decode_apdu(apdu[:4] + b'\xFF' + apdu[5:], 26)
+        self.assertEqual("The ASDU type was not recognized.", str(context.exception))
+        with self.assertRaises(errors.UnknownCause):
+            trusted.decode_apdu(apdu[:6] + b'\x3F' + apdu[7:], 26)
+        with self.assertRaises(errors.LengthMismatch):
+            trusted.decode_apdu(apdu[:10], 10)
+        with self.assertRaises(errors.IEC104Error):
+            trusted.decode_information_objects(50, 1, 1, b'\x0A\x00\x00\x00\x00\x80\x3F\x00', 8, 0)
 
 
 
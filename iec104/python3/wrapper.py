@@ -1,6 +1,20 @@
+import os
 import struct
+import sys
 import unittest
 
+try:
+    from iec104 import errors, packer, typetable
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    from iec104 import errors, packer, typetable
+from iec104.python3 import unwrapper
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 TESTFR_CON = 131
 TESTFR_ACT = 67
 
@@ -25,30 +39,53 @@ ACTIVATION = 6
 ACTIVATION_CONFIRMATION = 7
 RETURN_INFORMATION_BY_REMOTE_COMMAND = 11
 
+INFORMATION_OBJECT_ADDRESS_LENGTH = 3
+
+# Bulk M_ME_NC_1: type identification, VSQ, cause of transmission and originator address, common address
+ASDU_HEADER = struct.Struct('<2B2sH')
+# Information object (SQ=0): IOA as lower 16 bits and upper 8 bits, value, QDS
+M_ME_NC_1_OBJECT = struct.Struct('<HBfB')
+# Information element (SQ=1): value, QDS
+M_ME_NC_1_ELEMENT = struct.Struct('<fB')
+M_ME_NC_1_OBJECT_DTYPE = [('ioa_low', '<u2'), ('ioa_high', 'u1'), ('value', '<f4'), ('qds', 'u1')]
+M_ME_NC_1_ELEMENT_DTYPE = [('value', '<f4'), ('qds', 'u1')]
+
 class IEC104Wrapper():
     """
     This class provides a wrapper with functions to create IEC 104 messages. Look into the IEC 104 specification to learn the details.
+    The encode_* functions raise an IEC104Error (see iec104.errors) if wrapping fails, create_*, wrap_* and the frame functions are \
+    the same functions returning an "ERROR: ..." string instead.
+    :param trusted: If set, the encode_* functions skip the checks of single fields (types, bits and ranges), e.g. for messages \
+    built by the application itself. ASDU types, causes of transmission and the amount of objects/elements are still checked.
     """
 
-    def __init__(self):
+    def __init__(self, trusted = False):
+        self.trusted = trusted
         # Internal counter for the information object address.
         self.information_object_address = 0
+        # Information elements with a format of their own. All other types of the type table expect a tuple of their raw fields.
+        self.element_encoders = {
+            M_BO_NA_1: self.encode_information_object_m_bo_na_1,
+            M_ME_NC_1: self.encode_information_object_m_me_nc_1,
+            C_SC_NA_1: self.encode_information_object_c_sc_na_1,
+            C_IC_NA_1: self.encode_information_object_c_ic_na_1,
+        }
 
-    def create_apdu_header(self, apdu):
+    def encode_apdu_header(self, apdu):
         """
         Creates a IEC 104 APDU header.
         :param apdu: APDU as a bytestring.
-        :return: IEC 104 APDU header as a bytestring. ERROR if failed.
+        :return: IEC 104 APDU header as a bytestring.
         """
-        if not type(apdu) is bytes:
-            return "ERROR: An APDU has to be a bytestring."
+        if not self.trusted and not type(apdu) is bytes:
+            raise errors.InvalidValue("An APDU has to be a bytestring.")
         start = b'\x68'
         apdu_length = len(apdu)
         if apdu_length > 253:
-            return "ERROR: APDU too long."
+            raise errors.LengthMismatch("APDU too long.")
         return start + struct.pack("B", len(apdu))
 
-    def create_apdu(self, frame, asdu_type, sequence, cause_of_transmission, common_address, message, ssn = 0, rsn = 0, originator_address = 0):
+    def encode_apdu(self, frame, asdu_type, sequence, cause_of_transmission, common_address, message, ssn = 0, rsn = 0, originator_address = 0):
         """
         Creates a IEC 104 APDU without header.
         :param frame: Frame format to be used.
@@ -60,65 +97,59 @@ class IEC104Wrapper():
         :param ssn: Send sequence number. This is also used to store relevant information for the U-Frame(has to contain the function name and type: e.g. "test-con").
         :param rsn: Receive sequence number.
         :param originator_address: Originator address as an integer.
-        :return: IEC 104 APDU without header as a bytestring. ERROR if failed.
+        :return: IEC 104 APDU without header as a bytestring.
         """
-        apci = self.wrap_frame(frame, ssn, rsn)
-        if type(apci) is str:
-            return apci
-        asdu = self.wrap_asdu(asdu_type, sequence, cause_of_transmission, common_address, message, originator_address)
-        if type(asdu) is str:
-            return asdu
-        return apci + asdu
+        apci = self.encode_frame(frame, ssn, rsn)
+        return apci + self.encode_asdu(asdu_type, sequence, cause_of_transmission, common_address, message, originator_address)
 
-    def wrap_frame(self, frame, ssn, rsn):
+    def encode_frame(self, frame, ssn, rsn):
         """
         Creates an IEC 104 frame.
         If needed the send sequence number and receive sequence number are used to wrap the frame.
         :param frame: Frame format to be used.
         :param ssn: Send sequence number. This is also used to store relevant information for the U-Frame(has to contain the function name and type: e.g. "test-con").
         :param rsn: Receive sequence number.
-        :return: IEC 104 frame as a bytestring. ERROR if failed.
+        :return: IEC 104 frame as a bytestring.
         """
-        if not type(frame) is str:
-            return "ERROR: Frame format has to be a string."
+        if not self.trusted and not type(frame) is str:
+            raise errors.InvalidValue("Frame format has to be a string.")
         if frame == "i-frame":
-            res = self.i_frame(ssn, rsn)
-        elif frame == "s-frame":
-            res = self.s_frame(rsn)
-        elif frame == "u-frame":
-            res = self.u_frame(ssn)
-        else:
-            res = "ERROR: No valid frame format was given."
-        return res
+            return self.encode_i_frame(ssn, rsn)
+        if frame == "s-frame":
+            return self.encode_s_frame(rsn)
+        if frame == "u-frame":
+            return self.encode_u_frame(ssn)
+        raise errors.InvalidFrame("No valid frame format was given.")
 
-    def i_frame(self, ssn, rsn):
+    def encode_i_frame(self, ssn, rsn):
         """
         Creates an IEC 104 I-Frame.
         :param ssn: Send sequence number.
         :param rsn: Receive sequence number.
-        :return: IEC 104 I-Frame as a bytestring. ERROR if failed.
+        :return: IEC 104 I-Frame as a bytestring.
         """
-        if (not type(ssn) is int) or (ssn < 0) or (ssn > 32767):
-            return "ERROR: Send sequence number has to be an integer between 0 and 32767."
-        if (not type(rsn) is int) or (rsn < 0) or (rsn > 32767):
-            return "ERROR: Receive sequence number has to be an integer between 0 and 32767."
+        if not self.trusted:
+            if (not type(ssn) is int) or (ssn < 0) or (ssn > 32767):
+                raise errors.InvalidValue("Send sequence number has to be an integer between 0 and 32767.")
+            if (not type(rsn) is int) or (rsn < 0) or (rsn > 32767):
+                raise errors.InvalidValue("Receive sequence number has to be an integer between 0 and 32767.")
         return struct.pack('<2H', ssn << 1, rsn << 1)
 
-    def s_frame(self, rsn):
+    def encode_s_frame(self, rsn):
         """
         Creates an IEC 104 S-Frame.
         :param rsn: Receive sequence number.
-        :return: IEC 104 S-Frame as a bytestring. ERROR if failed.
+        :return: IEC 104 S-Frame as a bytestring.
         """
-        if (not type(rsn) is int) or (rsn < 0) or (rsn > 32767):
-            return "ERROR: Receive sequence number has to be an integer between 0 and 32767."
+        if not self.trusted and ((not type(rsn) is int) or (rsn < 0) or (rsn > 32767)):
+            raise errors.InvalidValue("Receive sequence number has to be an integer between 0 and 32767.")
         return struct.pack('<2BH', 0x1, 0x00, rsn << 1)
 
-    def u_frame(self, function):
+    def encode_u_frame(self, function):
         """
         Creates an IEC 104 U-Frame.
         :param function: Function to be used. Has to contain the function name and type: e.g. "test-con". Defaults to no function being used.
-        :return: IEC 104 U-Frame as a bytestring. ERROR if failed.
+        :return: IEC 104 U-Frame as a bytestring.
         """
         byte = NO_FUNC
         function = function.lower()
@@ -140,7 +171,7 @@ class IEC104Wrapper():
             print("Warning: U-Frame was made without an active function.")
         return struct.pack('<2BH', byte, 0x00, 0x00)
     
-    def wrap_asdu(self, asdu_type, sequence, cause_of_transmission, common_address, message, originator_address = 0):
+    def encode_asdu(self, asdu_type, sequence, cause_of_transmission, common_address, message, originator_address = 0):
         """
         Creates a IEC 104 ASDU.
         :param asdu_type: ASDU type as string.
@@ -149,90 +180,76 @@ class IEC104Wrapper():
         :param common_address: Common address of ASDUs as integer.
         :param message: Message to be wrapped. Has to be a list containing less than 128 objects/elements.
         :param originator_address: Originator address as integer.
-        :return: An IEC 104 ASDU as a bytestring. ERROR if failed.
-        """
-        if not sequence in [0,1]:
-            return "ERROR: Sequence bit has to be 0 or 1."
-        type_id = self.wrap_asdu_type(asdu_type)
-        if type(type_id) is str:
-            return type_id
-        vsq = self.wrap_variable_structure_qualifier(type_id, sequence, message)
-        if type(vsq) is str:
-            return vsq
-        cot = self.wrap_cause_of_transmission(cause_of_transmission, originator_address)
-        if type(cot) is str:
-            return cot
-        ca = self.wrap_common_address(common_address)
-        if type(ca) is str:
-            return ca
-        io = self.wrap_information_object(type_id, vsq, message)
-        if type(io) is str:
-            return io
+        :return: An IEC 104 ASDU as a bytestring.
+        """
+        if not self.trusted and not sequence in [0,1]:
+            raise errors.InvalidValue("Sequence bit has to be 0 or 1.")
+        type_id = self.encode_asdu_type(asdu_type)
+        vsq = self.encode_variable_structure_qualifier(type_id, sequence, message)
+        cot = self.encode_cause_of_transmission(cause_of_transmission, originator_address)
+        ca = self.encode_common_address(common_address)
+        io = self.encode_information_object(type_id, vsq, message)
         return struct.pack('<2B', type_id, vsq) + cot + ca + io
 
-    def wrap_asdu_type(self, asdu_type):
+    def encode_asdu_type(self, asdu_type):
         """
         Finds the type identification corresponding to the given ASDU type.
         :param asdu_type: ASDU type as string.
-        :return: Type identification as integer. ERROR if failed.
-        """
-        if not type(asdu_type) is str:
-            return "ERROR: The ASDU type has to be a string."
-        if asdu_type == 'M_BO_NA_1':
-            type_id = M_BO_NA_1
-        elif asdu_type == 'M_ME_NC_1':
-            type_id = M_ME_NC_1
-        elif asdu_type == 'C_SC_NA_1':
-            type_id = C_SC_NA_1
-        elif asdu_type == 'C_IC_NA_1':
-            type_id = C_IC_NA_1
-        elif asdu_type == 'C_RD_NA_1':
-            type_id = C_RD_NA_1
-        else:
-            return "ERROR: The ASDU type was not recognized."
-        return type_id
+        :return: Type identification as integer.
+        """
+        if not self.trusted and not type(asdu_type) is str:
+            raise errors.InvalidValue("The ASDU type has to be a string.")
+        info = typetable.BY_NAME.get(asdu_type)
+        if info is None:
+            raise errors.UnknownTypeId("The ASDU type was not recognized.")
+        return info.type_id
 
-    def wrap_variable_structure_qualifier(self, type_id, sequence, message):
+    def encode_variable_structure_qualifier(self, type_id, sequence, message):
         """
         Determines the IEC 104 variable structure qualifier.
         :param type_id: APDU type as integer.
         :param sequence: SQ bit as defined in IEC 104.
         :param message: Message to be wrapped. Has to be a list containing less than 128 objects/elements.
-        :return: Variable structure qualifier as defined in IEC 104 as integer. ERROR if failed.
-        """
-        if not type(type_id) is int:
-             return "ERROR: The type identification has to be an integer."
-        if not sequence in [0,1]:
-            return "ERROR: Sequence bit has to be 0 or 1."
-        if (not type(message) is list) or (len(message) > 128):
-             return "ERROR: The message has to be a list containing less than 128 objects/elements."
-        if type_id in [M_BO_NA_1, M_ME_NC_1]:
+        :return: Variable structure qualifier as defined in IEC 104 as integer.
+        """
+        if not self.trusted:
+            if not type(type_id) is int:
+                raise errors.InvalidValue("The type identification has to be an integer.")
+            if not sequence in [0,1]:
+                raise errors.InvalidValue("Sequence bit has to be 0 or 1.")
+            if not type(message) is list:
+                raise errors.InvalidValue("The message has to be a list containing less than 128 objects/elements.")
+        if len(message) > 128:
+            raise errors.LengthMismatch("The message has to be a list containing less than 128 objects/elements.")
+        info = typetable.get(type_id)
+        if info is None:
+            raise errors.UnknownTypeId("The type identification was not recognized.")
+        if info.single:
+            vsq = 1
+        else:
             vsq = len(message)
             if sequence == 1:
                 vsq += 128
-        elif type_id in [C_SC_NA_1, C_IC_NA_1, C_RD_NA_1]:
-            vsq = 1
-        else:
-            return "ERROR: The type identification was not recognized."
         return vsq
 
-    def wrap_cause_of_transmission(self, cause_of_transmission, originator_address = 0):
+    def encode_cause_of_transmission(self, cause_of_transmission, originator_address = 0):
         """
         Creates an IEC 104 cause of transmission and and IEC 104 originator address.
         :param cause_of_transmission: A tuple containing the cause of transmission as string(e.g. periodic), P/N bit and Testbit.
         :param originator_address: Originator address as integer.
-        :return: IEC 104 cause of transmission and IEC 104 originator address as a bytestring. ERROR if failed.
-        """
-        if not type(cause_of_transmission) is tuple:
-            return "ERROR: Cause of transmission also needs a P/N bit and Testbit."
-        if not type(cause_of_transmission[0]) is str:
-            return "ERROR: Cause of transmission has to be a string."
-        if not cause_of_transmission[1] in [0,1]:
-            return "ERROR: P/N bit has to be 0 or 1."
-        if not cause_of_transmission[2] in [0,1]:
-            return "ERROR: Testbit has to be 0 or 1."
-        if (not type(originator_address) is int) or (originator_address < 0) or (originator_address > 255):
-            return "ERROR: Originator address has to be an integer between 0 and 255."
+        :return: IEC 104 cause of transmission and IEC 104 originator address as a bytestring.
+        """
+        if not self.trusted:
+            if not type(cause_of_transmission) is tuple:
+                raise errors.InvalidValue("Cause of transmission also needs a P/N bit and Testbit.")
+            if not type(cause_of_transmission[0]) is str:
+                raise errors.InvalidValue("Cause of transmission has to be a string.")
+            if not cause_of_transmission[1] in [0,1]:
+                raise errors.InvalidValue("P/N bit has to be 0 or 1.")
+            if not cause_of_transmission[2] in [0,1]:
+                raise errors.InvalidValue("Testbit has to be 0 or 1.")
+            if (not type(originator_address) is int) or (originator_address < 0) or (originator_address > 255):
+                raise errors.InvalidValue("Originator address has to be an integer between 0 and 255.")
         if ("periodic" in cause_of_transmission[0]) or ("cyclic" in cause_of_transmission[0]):
             cause = PERIODIC
         elif "spontaneous" in cause_of_transmission[0]:
@@ -246,196 +263,156 @@ class IEC104Wrapper():
         elif ("return information" in cause_of_transmission[0]) and ("remote command" in cause_of_transmission[0]):
             cause = RETURN_INFORMATION_BY_REMOTE_COMMAND
         else:
-            return "ERROR: No cause of transmission was found."
+            raise errors.UnknownCause("No cause of transmission was found.")
         pn = 64 if cause_of_transmission[1] == 1 else 0
         test = 128 if cause_of_transmission[2] == 1 else 0
         return struct.pack('<2B', cause + pn + test, originator_address)
 
-    def wrap_common_address(self, common_address):
+    def encode_common_address(self, common_address):
         """
         Creates an IEC 104 common address.
         :param common_address: Common address of ASDUs as integer.
-        :return: IEC 104 common address as a bytestring. ERROR if failed.
+        :return: IEC 104 common address as a bytestring.
         """
-        if (not type(common_address) is int) or (common_address < 0) or (common_address > 65535):
-            return "ERROR: Common address has to be an integer between 0 and 65535."
+        if not self.trusted and ((not type(common_address) is int) or (common_address < 0) or (common_address > 65535)):
+            raise errors.InvalidValue("Common address has to be an integer between 0 and 65535.")
         return struct.pack('<2B', common_address & 0xFF, (common_address >> 8) & 0xFF)
 
-    def wrap_information_object(self, type_id, vsq, message):
+    def encode_information_object(self, type_id, vsq, message):
         """
         Packs the message into the format that is dictated by the type identification.
         :param type_id: Type of the message as an integer.
         :param vsq: Variable structure qualifier as defined in IEC 104 as an integer.
         :param message: Message to be wrapped. Has to be a list containing less than 128 objects/elements. The wrapping functions for each type explain which specific \
         format is expected. For the type C_RD_NA_1 a single object/element is expected that will not be used.
-        :return: An information object as defined in IEC 104 as a bytestring. ERROR if failed.
+        :return: An information object as defined in IEC 104 as a bytestring.
         """
         result = b''
         i = 0
-        if not type(type_id) is int:
-            return "ERROR: The type identification has to be an integer."
-        if not type(vsq) is int:
-            return "ERROR: The variable structure qualifier has to be an integer."
-        if (not type(message) is list) or (len(message) > 128):
-            return "ERROR: The message has to be a list containing less than 128 objects/elements."
+        if not self.trusted:
+            if not type(type_id) is int:
+                raise errors.InvalidValue("The type identification has to be an integer.")
+            if not type(vsq) is int:
+                raise errors.InvalidValue("The variable structure qualifier has to be an integer.")
+            if not type(message) is list:
+                raise errors.InvalidValue("The message has to be a list containing less than 128 objects/elements.")
+        if len(message) > 128:
+            raise errors.LengthMismatch("The message has to be a list containing less than 128 objects/elements.")
         # Number of objects/elements expected based on the VSQ value
         length = (vsq & 0x7F)
         # No information object needed
         if length == 0:
             return result
         if length > len(message):
-            return "ERROR: Variable structure qualifier expects more messages than given."
+            raise errors.LengthMismatch("Variable structure qualifier expects more messages than given.")
         if length < len(message):
-            return "ERROR: Variable structure qualifier expects fewer messages than given."
+            raise errors.LengthMismatch("Variable structure qualifier expects fewer messages than given.")
+        info = typetable.get(type_id)
         # SQ == 1
         if (vsq & 0x80) == 0x80:
-            temp = self.wrap_information_object_address()
-            if type(temp) is str:
-                return temp
-            result += temp
-            if type_id == M_BO_NA_1:
-                while i < length:
-                    temp = self.wrap_information_object_m_bo_na_1(message[i])
-                    if type(temp) is str:
-                        return temp
-                    result += temp
-                    i += 1
-            elif type_id == M_ME_NC_1:
-                while i < length:
-                    temp = self.wrap_information_object_m_me_nc_1(message[i])
-                    if type(temp) is str:
-                        return temp
-                    result += temp
-                    i += 1
-            else: 
-                return "ERROR: The ASDU type was not recognized or is not fit to be a sequence of elements."
+            if info is None or not info.sequence:
+                raise errors.UnknownTypeId("The ASDU type was not recognized or is not fit to be a sequence of elements.")
+            result += self.encode_information_object_address()
+            while i < length:
+                result += self.encode_information_element(info, message[i])
+                i += 1
         # SQ == 0
         else:
-            if type_id == M_BO_NA_1:
-                while i < length:
-                    temp = self.wrap_information_object_address()
-                    if type(temp) is str:
-                        return temp
-                    result += temp
-                    temp = self.wrap_information_object_m_bo_na_1(message[i])
-                    if type(temp) is str:
-                        return temp
-                    result += temp
-                    i += 1
-            elif type_id == M_ME_NC_1:
-                while i < length:
-                    temp = self.wrap_information_object_address()
-                    if type(temp) is str:
-                        return temp
-                    result += temp
-                    temp = self.wrap_information_object_m_me_nc_1(message[i])
-                    if type(temp) is str:
-                        return temp
-                    result += temp
-                    i += 1
-            elif type_id == C_SC_NA_1:
-                if length != 1:
-                    return "ERROR: C_SC_NA_1 length has to be 1."
-                temp = self.wrap_information_object_address()
-                if type(temp) is str:
-                    return temp
-                result += temp
-                temp = self.wrap_information_object_c_sc_na_1(message[0])
-                if type(temp) is str:
-                    return temp
-                result += temp
-            elif type_id == C_IC_NA_1:
-                if length != 1:
-                    return "ERROR: C_IC_NA_1 length has to be 1."
-                temp = self.wrap_information_object_address()
-                if type(temp) is str:
-                    return temp
-                result += temp
-                temp = self.wrap_information_object_c_ic_na_1(message[0])
-                if type(temp) is str:
-                    return temp
-                result += temp
-            elif type_id == C_RD_NA_1:
-                if length != 1:
-                    return "ERROR: C_RD_NA_1 length has to be 1."
-                temp = self.wrap_information_object_address()
-                if type(temp) is str:
-                    return temp
-                result += temp
-            else:
-                return "ERROR: The ASDU type was not recognized or has to be a sequence of elements."
+            if info is None:
+                raise errors.UnknownTypeId("The ASDU type was not recognized or has to be a sequence of elements.")
+            if info.single and length != 1:
+                raise errors.LengthMismatch(info.name + " length has to be 1.")
+            while i < length:
+                result += self.encode_information_object_address()
+                result += self.encode_information_element(info, message[i])
+                i += 1
         return result
 
-    def wrap_information_object_address(self):
+    def encode_information_element(self, info, message):
+        """
+        Packs a single information element of any type of the type table.
+        :param info: Entry of the type table.
+        :param message: Message in the format of the element wrapper of the type, otherwise a tuple containing the fields of the element layout \
+        (time tags as bytestrings). Types without element (C_RD_NA_1) ignore the message.
+        :return: Information element as a bytestring.
+        """
+        encode_element = self.element_encoders.get(info.type_id)
+        if encode_element is not None:
+            return encode_element(message)
+        if not info.size:
+            return b''
+        if not type(message) is tuple:
+            message = (message,)
+        try:
+            return info.element.pack(*message)
+        except struct.error:
+            raise errors.InvalidValue(info.name + " expects a tuple matching the layout " + info.layout + ".")
+
+    def encode_information_object_address(self):
         """
         Creates an IEC 104 information object address.
-        :return: IEC 104 information object address as a bytestring. ERROR if failed.
+        :return: IEC 104 information object address as a bytestring.
         """
         if (not type(self.information_object_address) is int) or (self.information_object_address < 0) or (self.information_object_address > 16777215):
-            return "ERROR: Information object address has to be an integer between 0 and 16777215."
+            raise errors.InvalidValue("Information object address has to be an integer between 0 and 16777215.")
         result = struct.pack('<3B', self.information_object_address & 0xFF, (self.information_object_address >> 8) & 0xFF, (self.information_object_address >> 16) & 0xFF)
         self.set_information_object_address(self.information_object_address + 1)
         if self.get_information_object_address() > 16777215:
             self.set_information_object_address(0)
         return result
 
-    def wrap_information_object_m_bo_na_1(self, message):
+    def encode_information_object_m_bo_na_1(self, message):
         """
         Packs the message into the M_BO_NA_1 format. 
         :param message: Tuple containing a string or bytestring and a tuple containing the following bits of the IEC 104 quality descriptor in this order: \
         blocked, substituted, not topical, invalid. 
-        :return: Message as a bytestring in the M_BO_NA_1 format. ERROR if failed.
+        :return: Message as a bytestring in the M_BO_NA_1 format.
         """
-        if not type(message) is tuple:
-            return "ERROR: M_BO_NA_1 expects a string and a tuple containing some bits of the IEC 104 quality descriptor in a tuple."
-        if not (type(message[0]) is bytes or type(message[0]) is str):
-             return "ERROR: M_BO_NA_1 expects a string or bytestring."
+        if not self.trusted:
+            if not type(message) is tuple:
+                raise errors.InvalidValue("M_BO_NA_1 expects a string and a tuple containing some bits of the IEC 104 quality descriptor in a tuple.")
+            if not (type(message[0]) is bytes or type(message[0]) is str):
+                raise errors.InvalidValue("M_BO_NA_1 expects a string or bytestring.")
         if type(message[0]) is str:
             msg = message[0].encode()
         else:
             msg = message[0]
         overflow = 1 if len(msg) > 4 else 0
-        io = self.wrap_quality_descriptor(overflow, message[1][0], message[1][1], message[1][2], message[1][3])
-        if type(io) is str:
-            return io
-        return struct.pack('<4s', msg[0:4]) + io
+        return struct.pack('<4s', msg[0:4]) + self.encode_quality_descriptor(overflow, message[1][0], message[1][1], message[1][2], message[1][3])
 
-    def wrap_information_object_m_me_nc_1(self, message):
+    def encode_information_object_m_me_nc_1(self, message):
         """
         Packs the message into the M_ME_NC_1 format.
         :param message: Tuple containing a single float value and a tuple containing the following bits of the quality descriptor in this order: \
         blocked, substituted, not topical, invalid. 
-        :return: Message as a bytestring in the M_ME_NC_1 format. ERROR if failed.
+        :return: Message as a bytestring in the M_ME_NC_1 format.
         """
-        if not type(message) is tuple:
-            return "ERROR: M_ME_NC_1 expects a float value and a tuple containing some bits of the IEC 104 quality descriptor in a tuple."
-        if not type(message[0]) is float:
-            return "ERROR: M_ME_NC_1 expects a float value."
-        io = self.wrap_quality_descriptor(0, message[1][0], message[1][1], message[1][2], message[1][3])
-        if type(io) is str:
-            return io
-        return struct.pack('<f', message[0]) + io
+        if not self.trusted:
+            if not type(message) is tuple:
+                raise errors.InvalidValue("M_ME_NC_1 expects a float value and a tuple containing some bits of the IEC 104 quality descriptor in a tuple.")
+            if not type(message[0]) is float:
+                raise errors.InvalidValue("M_ME_NC_1 expects a float value.")
+        return struct.pack('<f', message[0]) + self.encode_quality_descriptor(0, message[1][0], message[1][1], message[1][2], message[1][3])
 
-    def wrap_information_object_c_sc_na_1(self, message):
+    def encode_information_object_c_sc_na_1(self, message):
         """
         Packs the message into the C_SC_NA_1 format.
         :param message: Tuple containing a single command state bit and a qualifier of command.
-        :return: Message as a bytestring in the C_SC_NA_1 format. ERROR if failed.
+        :return: Message as a bytestring in the C_SC_NA_1 format.
         """
-        if not type(message) is tuple:
-            return "ERROR: C_SC_NA_1 expects a single command state and a qualifier of command in a tuple."
-        io = self.wrap_single_command(message[0], message[1])
-        return io
+        if not self.trusted and not type(message) is tuple:
+            raise errors.InvalidValue("C_SC_NA_1 expects a single command state and a qualifier of command in a tuple.")
+        return self.encode_single_command(message[0], message[1])
         
-    def wrap_information_object_c_ic_na_1(self, message):
+    def encode_information_object_c_ic_na_1(self, message):
         """
         Packs the message into the C_IC_NA_1 format.
         :param message: Number representing an interrogation type as defined in IEC 104.
-        :return: Message as a bytestring in the C_IC_NA_1 format. ERROR if failed.
+        :return: Message as a bytestring in the C_IC_NA_1 format.
         """
-        return self.wrap_qualifier_of_interrogation(message)
+        return self.encode_qualifier_of_interrogation(message)
 
-    def wrap_quality_descriptor(self, overflow, blocked, substituted, not_topical, invalid):
+    def encode_quality_descriptor(self, overflow, blocked, substituted, not_topical, invalid):
         """
         Creates an IEC 104 quality descriptor.
         :param overflow: Overflow bit as defined in IEC 104.
@@ -443,72 +420,141 @@ class IEC104Wrapper():
         :param substituted: Substituted bit as defined in IEC 104.
         :param not_topical: Not topical bit as defined in IEC 104.
         :param invalid: Invalid bit as defined in IEC 104.
-        :return: IEC 104 quality descriptor as a bytestring. ERROR if failed.
-        """
-        if not overflow in [0,1]:
-            return "ERROR: Overflow bit has to be 0 or 1."
-        if not blocked in [0,1]:
-            return "ERROR: Blocked bit has to be 0 or 1."
-        if not substituted in [0,1]:
-            return "ERROR: Substituted bit has to be 0 or 1."
-        if not not_topical in [0,1]:
-            return "ERROR: Not topical bit has to be 0 or 1."
-        if not invalid in [0,1]:
-            return "ERROR: Invalid bit has to be 0 or 1."
+        :return: IEC 104 quality descriptor as a bytestring.
+        """
+        if not self.trusted:
+            if not overflow in [0,1]:
+                raise errors.InvalidValue("Overflow bit has to be 0 or 1.")
+            if not blocked in [0,1]:
+                raise errors.InvalidValue("Blocked bit has to be 0 or 1.")
+            if not substituted in [0,1]:
+                raise errors.InvalidValue("Substituted bit has to be 0 or 1.")
+            if not not_topical in [0,1]:
+                raise errors.InvalidValue("Not topical bit has to be 0 or 1.")
+            if not invalid in [0,1]:
+                raise errors.InvalidValue("Invalid bit has to be 0 or 1.")
         bl = 16 if blocked == 1 else 0
         sb = 32 if substituted == 1 else 0
         nt = 64 if not_topical == 1 else 0
         iv = 128 if invalid == 1 else 0
         return struct.pack('<B', overflow + bl + sb + nt + iv)
 
-    def wrap_single_command(self, single_command_state, qualifier_of_command):
+    def encode_single_command(self, single_command_state, qualifier_of_command):
         """
         Creates an IEC 104 single command.
         :param single_command_state: Single command state bit as defined in IEC 104.
         :param qualifier_of_command: Qualifier of command as defined in IEC 104. S/E is expected as least significant bit.
-        :return: Struct containing an IEC 104 single command as a bytestring. ERROR if failed.
-        """
-        if not single_command_state in [0,1]:
-            return "ERROR: Single command state bit has to be 0 or 1."
-        if (not type(qualifier_of_command) is int) or (qualifier_of_command < 0) or (qualifier_of_command > 63):
-            return "ERROR: Qualifier of command has to be an integer between 0 and 63."
-        qoc = self.wrap_qualifier_of_command((qualifier_of_command >> 1) & 0xFF, qualifier_of_command & 0x01)
+        :return: Struct containing an IEC 104 single command as a bytestring.
+        """
+        if not self.trusted:
+            if not single_command_state in [0,1]:
+                raise errors.InvalidValue("Single command state bit has to be 0 or 1.")
+            if (not type(qualifier_of_command) is int) or (qualifier_of_command < 0) or (qualifier_of_command > 63):
+                raise errors.InvalidValue("Qualifier of command has to be an integer between 0 and 63.")
+        qoc = self.encode_qualifier_of_command((qualifier_of_command >> 1) & 0xFF, qualifier_of_command & 0x01)
         qoc = (qoc << 2) & 0xFF
         return struct.pack('<B', single_command_state + qoc)
 
-    def wrap_qualifier_of_command(self, qualifier, select_execute):
+    def encode_qualifier_of_command(self, qualifier, select_execute):
         """
         Builds an IEC 104 qualifier of command.
         :param overflow: Number representing a command type as defined in IEC 104.
         :param select_execute: S/E bit as defined in IEC 104.
-        :return: An IEC 104 qualifier of command as integer. ERROR if failed.
+        :return: An IEC 104 qualifier of command as integer.
         """
-        if not select_execute in [0,1]:
-            return "ERROR: S/E bit has to be 0 or 1."
-        if (not type(qualifier) is int) or (qualifier < 0) or (qualifier > 31):
-            return "ERROR: Qualifier of command has to be an integer between 0 and 31."
+        if not self.trusted:
+            if not select_execute in [0,1]:
+                raise errors.InvalidValue("S/E bit has to be 0 or 1.")
+            if (not type(qualifier) is int) or (qualifier < 0) or (qualifier > 31):
+                raise errors.InvalidValue("Qualifier of command has to be an integer between 0 and 31.")
         se = 32 if select_execute == 1 else 0
         return qualifier + se
 
-    def wrap_qualifier_of_interrogation(self, qualifier):
+    def encode_qualifier_of_interrogation(self, qualifier):
         """
         Creates an IEC 104 qualifier of interrogation.
         :param qualifier: Number representing an interrogation type as defined in IEC 104.
-        :return: IEC 104 qualifier of interrogation as a bytestring. ERROR if failed.
+        :return: IEC 104 qualifier of interrogation as a bytestring.
         """
-        if (not type(qualifier) is int) or (qualifier < 0) or (qualifier > 255):
-            return "ERROR: Qualifier of interrogation has to be an integer between 0 and 255."
+        if not self.trusted and ((not type(qualifier) is int) or (qualifier < 0) or (qualifier > 255)):
+            raise errors.InvalidValue("Qualifier of interrogation has to be an integer between 0 and 255.")
         return struct.pack('<B', qualifier)
 
-    def wrap_message_for_m_bo_na_1(self, message):
+    def encode_m_me_nc_1_into(self, buffer, offset, sequence, cause_of_transmission, common_address, ioas, values, qds, originator_address = 0):
+        """
+        Writes a complete M_ME_NC_1 ASDU into a preallocated buffer without checking the single elements and without the \
+        information object address counter.
+        Each element is written with one pack_into. If values is a NumPy array, all elements are written at once through a \
+        structured dtype over the buffer.
+        :param buffer: Writable buffer, e.g. a bytearray.
+        :param offset: Offset of the ASDU within the buffer.
+        :param sequence: SQ bit as defined in IEC 104. If set, only the first IOA is sent and the IOAs are expected to be contiguous.
+        :param cause_of_transmission: A tuple containing the cause of transmission as string(e.g. periodic), P/N bit and Testbit.
+        :param common_address: Common address of ASDUs as integer.
+        :param ioas: Information object addresses as integers (list, array or NumPy array).
+        :param values: Float values, one per IOA.
+        :param qds: Packed quality descriptors, one byte per IOA (e.g. a bytestring).
+        :param originator_address: Originator address as integer.
+        :return: Length of the ASDU in bytes.
+        """
+        count = len(values)
+        maximum = packer.capacity(typetable.get(M_ME_NC_1), sequence)
+        if count < 1 or count > maximum:
+            raise errors.LengthMismatch("The amount of elements has to be between 1 and {} to fit into an APDU.".format(maximum))
+        if len(ioas) < (1 if sequence else count) or len(qds) != count:
+            raise errors.LengthMismatch("Every value needs an information object address and a quality descriptor.")
+        element = M_ME_NC_1_ELEMENT if sequence else M_ME_NC_1_OBJECT
+        length = ASDU_HEADER.size + (INFORMATION_OBJECT_ADDRESS_LENGTH if sequence else 0) + count * element.size
+        if len(buffer) - offset < length:
+            raise errors.LengthMismatch("The buffer is too small for the ASDU.")
+        cot = self.encode_cause_of_transmission(cause_of_transmission, originator_address)
+        ASDU_HEADER.pack_into(buffer, offset, M_ME_NC_1, count | (0x80 if sequence else 0), cot, common_address)
+        offset += ASDU_HEADER.size
+        if sequence:
+            ioa = int(ioas[0])
+            struct.pack_into('<HB', buffer, offset, ioa & 0xFFFF, ioa >> 16)
+            offset += INFORMATION_OBJECT_ADDRESS_LENGTH
+        if numpy is not None and isinstance(values, numpy.ndarray):
+            elements = numpy.frombuffer(buffer, M_ME_NC_1_ELEMENT_DTYPE if sequence else M_ME_NC_1_OBJECT_DTYPE, count, offset)
+            if not sequence:
+                ioas = numpy.asarray(ioas)
+                elements['ioa_low'] = ioas & 0xFFFF
+                elements['ioa_high'] = ioas >> 16
+            elements['value'] = values
+            elements['qds'] = numpy.frombuffer(qds, numpy.uint8) if isinstance(qds, (bytes, bytearray)) else qds
+            return length
+        pack_into = element.pack_into
+        size = element.size
+        if sequence:
+            for i in range(count):
+                pack_into(buffer, offset, values[i], qds[i])
+                offset += size
+        else:
+            for i in range(count):
+                ioa = ioas[i]
+                pack_into(buffer, offset, ioa & 0xFFFF, ioa >> 16, values[i], qds[i])
+                offset += size
+        return length
+
+    def encode_m_me_nc_1(self, sequence, cause_of_transmission, common_address, ioas, values, qds, originator_address = 0):
+        """
+        Creates an M_ME_NC_1 ASDU with encode_m_me_nc_1_into.
+        :return: An IEC 104 ASDU as a bytestring.
+        """
+        count = len(values)
+        buffer = bytearray(ASDU_HEADER.size + INFORMATION_OBJECT_ADDRESS_LENGTH + count * M_ME_NC_1_OBJECT.size)
+        length = self.encode_m_me_nc_1_into(buffer, 0, sequence, cause_of_transmission, common_address, ioas, values, qds, originator_address)
+        return bytes(buffer[:length])
+
+    def encode_message_for_m_bo_na_1(self, message):
         """
         Creates a message from a string that can be used with wrap_information_object_m_bo_na_1.
         :param message: String to be wrapped.
         :return: A tuple containing a bytestring and a tuple containing the following bits of the IEC 104 quality descriptor in this order: \
-        blocked, substituted, not topical, invalid. All bits are set to 0. ERROR if failed.
+        blocked, substituted, not topical, invalid. All bits are set to 0.
         """
         if not type(message) is str:
-            return "ERROR: wrap_message_for_m_bo_na_1 expects a string as message."
+            raise errors.InvalidValue("wrap_message_for_m_bo_na_1 expects a string as message.")
         n = 4
         msg = [message[i:i+n] for i in range(0, len(message), n)]
         result = [None] * len(msg)
@@ -529,6 +575,104 @@ class IEC104Wrapper():
         if type(information_object_address) is int:
             self.information_object_address = information_object_address
 
+    # String API: "ERROR: ..." is returned instead of raising an IEC104Error.
+    create_apdu_header = errors.error_string(encode_apdu_header)
+    create_apdu = errors.error_string(encode_apdu)
+    wrap_frame = errors.error_string(encode_frame)
+    i_frame = errors.error_string(encode_i_frame)
+    s_frame = errors.error_string(encode_s_frame)
+    u_frame = errors.error_string(encode_u_frame)
+    wrap_asdu = errors.error_string(encode_asdu)
+    wrap_asdu_type = errors.error_string(encode_asdu_type)
+    wrap_variable_structure_qualifier = errors.error_string(encode_variable_structure_qualifier)
+    wrap_cause_of_transmission = errors.error_string(encode_cause_of_transmission)
+    wrap_common_address = errors.error_string(encode_common_address)
+    wrap_information_object = errors.error_string(encode_information_object)
+    wrap_information_element = errors.error_string(encode_information_element)
+    wrap_information_object_address = errors.error_string(encode_information_object_address)
+    wrap_information_object_m_bo_na_1 = errors.error_string(encode_information_object_m_bo_na_1)
+    wrap_information_object_m_me_nc_1 = errors.error_string(encode_information_object_m_me_nc_1)
+    wrap_information_object_c_sc_na_1 = errors.error_string(encode_information_object_c_sc_na_1)
+    wrap_information_object_c_ic_na_1 = errors.error_string(encode_information_object_c_ic_na_1)
+    wrap_quality_descriptor = errors.error_string(encode_quality_descriptor)
+    wrap_single_command = errors.error_string(encode_single_command)
+    wrap_qualifier_of_command = errors.error_string(encode_qualifier_of_command)
+    wrap_qualifier_of_interrogation = errors.error_string(encode_qualifier_of_interrogation)
+    wrap_message_for_m_bo_na_1 = errors.error_string(encode_message_for_m_bo_na_1)
+
+
+class TestEncode(unittest.TestCase):
+
+    def test_encode_errors(self):
+        wrapper = IEC104Wrapper()
+        self.assertEqual(b'\x02\x00\x02\x00', wrapper.encode_frame("i-frame", 1, 1))
+        with self.assertRaises(errors.InvalidValue):
+            wrapper.encode_i_frame(-1, 1)
+        with self.assertRaises(errors.InvalidValue):
+            wrapper.encode_common_address(70000)
+        with self.assertRaises(errors.InvalidFrame):
+            wrapper.encode_frame("Test", 0, 0)
+        with self.assertRaises(errors.UnknownTypeId) as context:
+            wrapper.encode_asdu_type("Test")
+        self.assertEqual("The ASDU type was not recognized.", str(context.exception))
+        with self.assertRaises(errors.UnknownCause):
+            wrapper.encode_cause_of_transmission(("Test", 0, 0))
+        with self.assertRaises(errors.IEC104Error):
+            wrapper.encode_apdu("i-frame", "M_ME_NC_1", 2, ("periodic", 0, 0), 1, [(1.5, (0, 0, 0, 0, 0))])
+
+    def test_wrap_error_strings(self):
+        wrapper = IEC104Wrapper()
+        self.assertEqual(b'\x02\x00\x02\x00', wrapper.wrap_frame("i-frame", 1, 1))
+        self.assertEqual("ERROR: Send sequence number has to be an integer between 0 and 32767.", wrapper.i_frame(-1, 1))
+        self.assertEqual("ERROR: No valid frame format was given.", wrapper.wrap_frame("Test", 0, 0))
+        self.assertEqual("ERROR: The ASDU type was not recognized.", wrapper.wrap_asdu_type("Test"))
+        self.assertEqual("ERROR: Common address has to be an integer between 0 and 65535.", wrapper.wrap_common_address(70000))
+        self.assertEqual("ERROR: Sequence bit has to be 0 or 1.", \
+            wrapper.create_apdu("i-frame", "M_ME_NC_1", 2, ("periodic", 0, 0), 1, [(1.5, (0, 0, 0, 0, 0))]))
+
+    def test_encode_trusted(self):
+        wrapper = IEC104Wrapper()
+        trusted = IEC104Wrapper(trusted = True)
+        message = [(1.5, (0, 0, 0, 0, 0)), (2.5, (0, 0, 0, 0, 1))]
+        self.assertEqual(wrapper.encode_apdu("i-frame", "M_ME_NC_1", 0, ("periodic", 0, 0), 1, message, 1, 1), \
+            trusted.encode_apdu("i-frame", "M_ME_NC_1", 0, ("periodic", 0, 0), 1, message, 1, 1))
+        # Field checks are skipped
+        with self.assertRaises(errors.InvalidValue):
+            wrapper.encode_common_address(True)
+        self.assertEqual(b'\x01\x00', trusted.encode_common_address(True))
+        with self.assertRaises(errors.InvalidValue):
+            wrapper.encode_quality_descriptor(0, 0, 0, 0, 2)
+        trusted.encode_quality_descriptor(0, 0, 0, 0, 2)
+        # Type ids and causes of transmission are always checked
+        with self.assertRaises(errors.UnknownTypeId):
+            trusted.encode_asdu_type("Test")
+        with self.assertRaises(errors.UnknownCause):
+            trusted.encode_cause_of_transmission(("Test", 0, 0))
+
+    def test_encode_bulk_m_me_nc_1(self):
+        bulk = IEC104Wrapper()
+        decoder = unwrapper.IEC104Unwrapper()
+        for sequence, count, ioas in ((0, 30, [70000 + 3 * i for i in range(30)]), (1, 48, range(70000, 70048))):
+            values = [i / 4.0 for i in range(count)]
+            qds = bytes(i % 2 * 0x80 for i in range(count))
+            inputs = [(list(ioas), values, qds)]
+            if numpy is not None:
+                inputs.append((numpy.array(ioas), numpy.array(values, numpy.float32), numpy.frombuffer(qds, numpy.uint8)))
+            for ioas_in, values_in, qds_in in inputs:
+                asdu = bulk.encode_m_me_nc_1(sequence, ("spontaneous", 0, 0), 1, ioas_in, values_in, qds_in)
+                self.assertLessEqual(4 + len(asdu), 253)
+                self.assertEqual((M_ME_NC_1, sequence, count), (asdu[0], asdu[1] >> 7, asdu[1] & 0x7F))
+                objects = decoder.decode_information_objects(M_ME_NC_1, sequence, count, asdu, len(asdu) - 6, 6)
+                # Invalid bit of every second quality descriptor
+                elements = [(value, (0, 0, 0, 0, i % 2)) for i, value in enumerate(values)]
+                if sequence:
+                    self.assertEqual([70000] + elements, objects)
+                else:
+                    self.assertEqual([(ioa,) + element for ioa, element in zip(ioas, elements)], objects)
+            # One more does not fit into an APDU
+            with self.assertRaises(errors.LengthMismatch):
+                bulk.encode_m_me_nc_1(sequence, ("spontaneous", 0, 0), 1, range(count + 1), [0.0] * (count + 1), bytes(count + 1))
+
 # class TestWrapper(unittest.TestCase):
 
 #     def test_wrap_message_for_m_bo_na_1(self):
@@ -3,13 +3,27 @@ import tornado.ioloop
 import tornado.tcpserver
 
 import tornado.iostream
+import tornado.web
 import socket
 import binascii
 import acpi
-import asdu
+import framer
+import itertools
+import metrics
+import output
+import packer
+import pointdb
+import priority
+import subscriptions
+import timerwheel
+import tracing
+import typetable
+import window
 import struct
 import logging
-from bitstring import ConstBitStream
+import os
+import sys
+import tornado.netutil
 from tornado.gen import Task, engine
 
 import time
@@ -19,6 +33,7 @@ import struct
 LOG = logging.getLogger()
 logging.basicConfig(level=logging.DEBUG)
 
+import collections
 import functools
 
 def handle_connection(connection, address):
@@ -60,49 +75,133 @@ class IEC104ServerX(object):
         io_loop.start()
 '''
 
-class C1(tornado.tcpserver.TCPServer):
-    def __init__(self):
-        super(C1, self).__init__()
-        self.ssn = 0
-        self.rsn = 0
-        self.recived = 0
+# Standard timeouts in seconds
+T1 = 15
+T2 = window.T2
+T3 = 20
+
+C_IC_NA_1 = typetable.BY_NAME['C_IC_NA_1']
+
+# Causes of transmission
+ACTIVATION = 6
+ACTIVATION_CON = 7
+ACTIVATION_TERMINATION = 10
+UNKNOWN_CAUSE = 45
+UNKNOWN_COMMON_ADDRESS = 46
+NEGATIVE = 0x40
+
+BROADCAST = 0xFFFF
+# Station interrogation, groups 1..16 follow
+QOI_STATION = 20
+
+
+class Session(object):
+    """
+    State of one controlling station connection.
+
+    U- and S-frames are sent as soon as they are due. ASDUs wait for the k
+    window in one queue per priority (see priority.classify): command
+    confirmations and spontaneous events go out before cyclic data, then the
+    ASDUs of a running interrogation as the window opens.
+    """
+    __slots__ = ('address', 'port', 'stream', 'window', 'queues', 'output', 'server', 'recived', 'test_sent',
+                 'framer', 'interrogation', 'metrics', 'trace')
+
+    def __init__(self, address, stream, window, server=None, size=8192, delay=0.0, metrics=None, trace=None):
+        self.address, self.port = address[:2]
+        self.stream = stream
+        self.window = window
+        # (time queued, ASDU) waiting for the k window to open, by priority
+        self.queues = tuple(collections.deque() for name in priority.NAMES)
+        # APDUs sent in one loop iteration go out in one write
+        self.output = output.OutputBuffer(self.write, tornado.ioloop.IOLoop.current().call_later, size, delay)
+        self.server = server
+        self.recived = time.time()
+        self.test_sent = None
+        self.framer = framer.APDUFramer()
+        # ASDUs of a running interrogation, generated as the k window opens
+        self.interrogation = None
+        # metrics.SessionMetrics, None if not instrumented
+        self.metrics = metrics
+        if metrics is not None:
+            window.latency = metrics.ack_rtt
+        # tracing.FrameTrace of the frames sent and received, dumped on protocol errors
+        self.trace = trace
    
     @engine
-    def receive(self, data):
+    def receive(self):
         #yield Task(self.send, acpi.s_frame2(self.ssn + 1))
         
-        self.recived = time.time()
-        start, length = struct.unpack('2B', data)
-        #print self.port, " len:", length
-        data = yield Task(self.stream.read_bytes, length)
-        s_acpi = ''.join(struct.unpack_from('4s', data))  # keep 0x00
-        acpi_control = struct.unpack_from('B', data)[0]
-
-        if acpi_control & 1 == 0:  # I-FRAME
-            self.ssn, self.rsn = acpi.parse_i_frame(s_acpi)
-            LOG.debug("ssn: {}, rsn: {}".format(self.ssn, self.rsn))
-            s_asdu = ConstBitStream(bytes=data, offset=4*8)
-            o_asdu = asdu.ASDU(s_asdu)
-            #LOG.debug(">>>>>>>>>>>>>>>>>.Send S-FRAME ssn: {}".format(self.ssn + 1))
-            yield Task(self.send, acpi.s_frame2(self.ssn + 1))
-            
+        while True:
+            try:
+                count = yield Task(self.stream.read_into, self.framer.writable(), partial=True)
+            except tornado.iostream.StreamClosedError:
+                return
+            self.framer.written(count)
+            self.recived = time.time()
+            m = self.metrics
+            if m is not None:
+                m.bytes_in += count
+                received = self.window.frames_received
+                start = metrics.clock()
+            t = self.trace
+            debug = tracing.enabled(LOG)
+            for data in self.framer.frames():
+                if t is not None:
+                    t.record(tracing.IN, data, None, self.recived)
+                s_acpi = ''.join(struct.unpack_from('4s', data))  # keep 0x00
+                acpi_control = struct.unpack_from('B', data)[0]
 
-        elif acpi_control & 3 == 1:  # S-FRAME
-            print "S-FRAME"
-            self.rsn = acpi.parse_s_frame(s_acpi)
-            print self.rsn
+                if acpi_control & 1 == 0:  # I-FRAME
+                    if len(data) < 4 + typetable.HEADER.size:
+                        self.protocol_error("I-frame of %d bytes without ASDU header", len(data))
+                        return
+                    ssn, rsn = acpi.parse_i_frame(s_acpi)
+                    if debug:
+                        LOG.debug("ssn: %s, rsn: %s", ssn, rsn)
+                    if not self.window.received(ssn, self.recived):
+                        self.protocol_error("Sequence error: expected %s, received %s", self.window.vr, ssn)
+                        return
+                    if not self.acknowledged(rsn):
+                        return
+                    type_id = struct.unpack_from('B', data, 4)[0]
+                    if m is not None:
+                        m.asdus_in[type_id] += 1
+                    if len(data) >= 14 and type_id == C_IC_NA_1.type_id:
+                        type_id, vsq, cot, orig, ca = packer.ASDU_HEADER.unpack_from(data, 4)
+                        self.interrogate(ca, struct.unpack_from('B', data, 13)[0], cot, orig)
+                    if self.window.ack_due(self.recived):
+                        self.send(acpi.s_frame2(self.window.acknowledge()))
+                    elif self.server is not None:
+                        self.server.schedule_ack(self)
 
-        elif acpi_control & 3 == 3:  # U-FRAME
-            print "U-FRAME"
-            if s_acpi == acpi.STARTDT_CON:
-                print 'connected'
+                elif acpi_control & 3 == 1:  # S-FRAME
+                    if debug:
+                        LOG.debug("S-FRAME")
+                    if m is not None:
+                        m.frames_in[metrics.S_FRAME] += 1
+                    if not self.acknowledged(acpi.parse_s_frame(s_acpi)):
+                        return
 
-            if s_acpi == acpi.TESTFR_ACT:
-                print 'ping'
-                yield Task(self.send, acpi.TESTFR_CON)
-                
-        #yield Task(self.send, acpi.s_frame2(self.ssn + 1))
-        self.stream.read_bytes(2, self.receive)
+                elif acpi_control & 3 == 3:  # U-FRAME
+                    if debug:
+                        LOG.debug("U-FRAME")
+                    if m is not None:
+                        m.frames_in[metrics.U_FRAME] += 1
+                    if s_acpi == acpi.STARTDT_CON:
+                        LOG.debug("STARTDT_CON")
+
+                    if s_acpi == acpi.TESTFR_ACT:
+                        LOG.debug("TESTFR_ACT")
+                        self.send(acpi.TESTFR_CON)
+
+                    if s_acpi == acpi.TESTFR_CON:
+                        self.test_sent = None
+                        
+                #yield Task(self.send, acpi.s_frame2(self.ssn + 1))
+            if m is not None and self.window.frames_received != received:
+                # Time per I-frame of the read, measuring every frame would cost more than decoding it
+                m.decode.record((metrics.clock() - start) / (self.window.frames_received - received))
  
     @engine
     def connect_callback(self):
@@ -111,35 +210,339 @@ class C1(tornado.tcpserver.TCPServer):
         try:
         #if not self.stream.closed():
             #yield Task(self.send, acpi.STARTDT_ACT)
-            yield Task(self.send, acpi.STARTDT_CON)
-            self.stream.read_bytes(2, self.receive)
+            self.send(acpi.STARTDT_CON)
+            self.receive()
         except Exception as err:
             print err
 
-    def send(self, data, callback):
-        self.stream.write("\x68" + struct.pack("B", len(data)) + data, callback)
+    def acknowledged(self, rsn):
+        if not self.window.acknowledged(rsn, self.recived):
+            self.protocol_error("N(R) %s acknowledges unsent I-frames", rsn)
+            return False
+        self.flush()
+        return True
+
+    def protocol_error(self, message, *args):
+        """
+        Closes the connection, logs the frame trace first if there is one.
+        """
+        LOG.warning(message, *args)
+        if self.trace is not None:
+            self.trace.dump(LOG, reason='Frames of {}:{}'.format(self.address, self.port))
+        self.stream.close()
+
+    def interrogate(self, ca, qoi, cot, orig=0):
+        """
+        Answers C_IC_NA_1: ACT_CON, the image as COT 20 (station) or 21..36
+        (group 1..16) ASDUs and ACT_TERM. The image ASDUs are packed one by one
+        while the k window is open, not all at once.
+        """
+        points = None if self.server is None else self.server.points
+        if cot & 0x3F != ACTIVATION:
+            cot = UNKNOWN_CAUSE | NEGATIVE
+        elif points is None or (ca != BROADCAST and ca not in points.common_addresses):
+            cot = UNKNOWN_COMMON_ADDRESS | NEGATIVE
+        elif not QOI_STATION <= qoi <= QOI_STATION + 16 or self.interrogation is not None:
+            cot = ACTIVATION_CON | NEGATIVE
+        else:
+            cot = ACTIVATION_CON
+        self.send_asdu(packer.pack_asdu(C_IC_NA_1, [(0, qoi)], False, cot, ca, orig))
+        if cot != ACTIVATION_CON:
+            return
+        term = packer.pack_asdu(C_IC_NA_1, [(0, qoi)], False, ACTIVATION_TERMINATION, ca, orig)
+        self.interrogation = itertools.chain(
+            points.interrogation(None if ca == BROADCAST else ca, qoi, qoi - QOI_STATION), [term])
+        self.flush()
+
+    def send_asdu(self, data, level=None):
+        """
+        Sends an ASDU as I-frame, or queues it while k I-frames are not acknowledged.
+        :param level: priority.URGENT or priority.BULK, by the cause of transmission if None.
+        """
+        self.queues[priority.classify(data) if level is None else level].append((time.time(), data))
+        self.flush()
+
+    def send_asdus(self, asdus, levels=None):
+        """
+        Sends ASDUs as I-frames like send_asdu(), with one flush for all. The
+        ASDUs are only read, they may be shared by many sessions.
+        :param levels: Priority of every ASDU, by the cause of transmission if None.
+        """
+        now = time.time()
+        queues = self.queues
+        if levels is None:
+            levels = [priority.classify(data) for data in asdus]
+        for data, level in zip(asdus, levels):
+            queues[level].append((now, data))
+        self.flush()
+
+    def flush(self):
+        now = time.time()
+        sent = False
+        window = self.window
+        m = self.metrics
+        # I-frames the k window has room for, taken once: frames are only
+        # written when the output buffer is flushed, write() skips closed streams
+        room = 0 if self.stream.closed() else window.k - window.outstanding
+        for level, queue in enumerate(self.queues):
+            if room > 0 and queue:
+                while room > 0 and queue:
+                    queued, data = queue.popleft()
+                    if m is not None:
+                        m.queued[level].record(now - queued)
+                    ssn, rsn = window.send(now)
+                    self.send_i_frame(ssn, rsn, data)
+                    room -= 1
+                sent = True
+        while room > 0 and self.interrogation is not None:
+            data = next(self.interrogation, None)
+            if data is None:
+                self.interrogation = None
+                break
+            ssn, rsn = window.send(now)
+            self.send_i_frame(ssn, rsn, data)
+            room -= 1
+            sent = True
+        if sent and m is not None:
+            m.window.record(window.outstanding)
+        if sent and self.server is not None:
+            self.server.schedule_t1(self)
+        if not self.window.can_send():
+            # Nothing more can be sent until the peer acknowledges what it has received
+            self.output.flush()
+
+    def send(self, apci, asdu=b''):
+        if self.metrics is not None:
+            self.metrics.sent(apci, asdu)
+        if self.trace is not None:
+            self.trace.record(tracing.OUT, apci, asdu)
+        self.output.append(apci, asdu)
+
+    def send_i_frame(self, ssn, rsn, asdu):
+        """
+        Sends asdu with the APCI of this session in front, without copying it first.
+        """
+        m = self.metrics
+        if m is not None:
+            m.asdus_out[metrics.BYTE.unpack_from(asdu)[0]] += 1
+            m.bytes_out += 6 + len(asdu)
+        if self.trace is not None:
+            self.trace.record(tracing.OUT, acpi.i_frame2(ssn, rsn), asdu)
+        self.output.append_i_frame(ssn, rsn, asdu)
+
+    def write(self, data):
+        if not self.stream.closed():
+            self.stream.write(data.tobytes())
         
 class IEC104Server(tornado.tcpserver.TCPServer):
+    """
+    Controlled station. Sessions are kept in a dict keyed by peer address, the
+    t1/t2/t3 timeouts of all sessions run on one timer wheel. The process image
+    is held in points, publish() sends what changed to all sessions.
+    :param instrumented: Collects the metrics of all sessions in registry (metrics.Registry).
+    :param trace_every: Keeps 1 in trace_every frames of every session in a
+    tracing.FrameTrace of trace_size frames, dumped on protocol errors. 0 traces nothing.
+    :param filters: IOA ranges subscribed by the sessions of a host, list of
+    (ca, first, last) as of subscribe() by host. Sessions without subscription receive all points.
+    """
+
+    def __init__(self, t1=T1, t2=T2, t3=T3, k=window.K, w=window.W, tick=1.0, flush_size=8192, flush_delay=0.0,
+                 points=None, instrumented=True, trace_every=0, trace_size=1024, filters=None, **kwargs):
+        super(IEC104Server, self).__init__(**kwargs)
+        self.points = pointdb.PointDatabase() if points is None else points
+        self.registry = metrics.Registry() if instrumented else None
+        self.trace_every = trace_every
+        self.trace_size = trace_size
+        self.filters = {} if filters is None else filters
+        # Interests of the sessions, by their address
+        self.subscriptions = subscriptions.SubscriptionIndex()
+        self.flush_size = flush_size
+        self.flush_delay = flush_delay
+        self.t1 = t1
+        self.t2 = t2
+        self.t3 = t3
+        self.k = k
+        self.w = w
+        self.sessions = {}
+        self.timers = timerwheel.TimerWheel(tick, now=time.time())
+        self.ticker = tornado.ioloop.PeriodicCallback(self.expire, tick * 1000)
+        self.ticker.start()
 
-    connections = []
-    
-    @engine
     def handle_stream(self, stream, address):
         LOG.debug("Handle stream")
         LOG.debug(address)
-        LOG.debug(address[1])
+        address = address[:2]  # host, port also for IPv6
         
-        c = C1()
-        c.address = address[0]
-        c.port = address[1]
-        c.stream = stream
+        m = None if self.registry is None else self.registry.session(address, address[0])
+        c = Session(address, stream, window.SlidingWindow(self.k, self.w, self.t2), self,
+                    self.flush_size, self.flush_delay, m,
+                    tracing.FrameTrace(self.trace_size, self.trace_every) if self.trace_every else None)
+        self.sessions[address] = c
+        for ca, first, last in self.filters.get(address[0], ()):
+            self.subscribe(address, ca, first, last)
+        stream.set_close_callback(functools.partial(self.remove, address))
+        self.timers.schedule((address, 't3'), c.recived, self.t3)
         c.connect_callback()
-        self.connections.append(c)
+
+    def remove(self, address):
+        LOG.debug("Connection to %s:%s closed", *address[:2])
+        self.sessions.pop(address, None)
+        self.subscriptions.unsubscribe(address)
+        if self.registry is not None:
+            self.registry.remove(address)
+        self.timers.cancel((address, 't1'))
+        self.timers.cancel((address, 't2'))
+        self.timers.cancel((address, 't3'))
+
+    def listen_metrics(self, port, address=''):
+        """
+        Serves the metrics in the Prometheus text format at
+        http://address:port/metrics from the IOLoop of the server.
+        """
+        application = tornado.web.Application([('/metrics', MetricsHandler, {'registry': self.registry})])
+        return application.listen(port, address)
+
+    def publish(self):
+        """
+        Sends the points changed since the last call as spontaneous ASDUs, to
+        the sessions subscribed to them (see subscribe()) and those without subscription.
+        :return: Number of ASDUs packed.
+        """
+        self.points.sync()
+        if not self.subscriptions:
+            return self.broadcast(self.points.spontaneous())
+        changed = self.points.changes()
+        everyone = [c for address, c in self.sessions.items() if address not in self.subscriptions]
+        count = self.broadcast(self.points.pack(changed), everyone) if everyone else 0
+        # Points by the sessions subscribed to them, each group is packed once
+        groups = {}
+        keys = self.points.keys
+        match = self.subscriptions.match
+        for slot in changed:
+            ca, ioa = keys[slot]
+            groups.setdefault(match(ca, ioa), []).append(slot)
+        for addresses, slots in groups.items():
+            sessions = [self.sessions[address] for address in addresses if address in self.sessions]
+            if sessions:
+                count += self.broadcast(self.points.pack(slots), sessions)
+        return count
+
+    def subscribe(self, address, ca=None, first=0, last=subscriptions.MAX_IOA):
+        """
+        Limits the spontaneous points sent to the session of address to the
+        subscribed IOA ranges of common address ca (None for all).
+        """
+        self.subscriptions.subscribe(address, ca, first, last)
+
+    def unsubscribe(self, address):
+        """
+        Sends all points to the session of address again.
+        """
+        self.subscriptions.unsubscribe(address)
+
+    def broadcast(self, asdus, sessions=None):
+        """
+        Sends ASDUs to all sessions (or those given). Every ASDU is encoded once
+        and shared, each session only packs its own start byte, length and APCI
+        in front of it into its output buffer.
+        :return: Number of ASDUs.
+        """
+        # Immutable, a session may keep them queued until its window opens
+        asdus = tuple(bytes(data) if isinstance(data, bytearray) else data for data in asdus)
+        if asdus:
+            levels = [priority.classify(data) for data in asdus]
+            for c in list(self.sessions.values() if sessions is None else sessions):
+                c.send_asdus(asdus, levels)
+        return len(asdus)
+
+    def schedule_ack(self, c):
+        key = ((c.address, c.port), 't2')
+        # I-frames sent in reply may have acknowledged everything already
+        if key not in self.timers and c.window.deadline is not None:
+            now = time.time()
+            self.timers.schedule(key, now, c.window.deadline - now)
+
+    def schedule_t1(self, c):
+        """
+        Arms t1 for the oldest unacknowledged I-frame, unless t1 runs already.
+        """
+        key = ((c.address, c.port), 't1')
+        if key not in self.timers and c.window.oldest_sent is not None:
+            now = time.time()
+            self.timers.schedule(key, now, c.window.oldest_sent + self.t1 - now)
+
+    def expire(self):
+        now = time.time()
+        for address, timer in self.timers.advance(now):
+            c = self.sessions.get(address)
+            if c is None or c.stream.closed():
+                continue
+            if timer == 't2':
+                # Received I-frames not acknowledged by w
+                if c.window.unacknowledged:
+                    c.send(acpi.s_frame2(c.window.acknowledge()))
+            elif timer == 't1':
+                # TESTFR_ACT or I-frames not confirmed in time
+                started = [t for t in (c.test_sent, c.window.oldest_sent) if t is not None]
+                if started and now - min(started) >= self.t1:
+                    LOG.debug("No connection to %s:%s?", c.address, c.port)
+                    c.stream.close()
+                elif started:
+                    self.timers.schedule((address, 't1'), now, min(started) + self.t1 - now)
+            else:
+                idle = now - c.recived
+                if idle < self.t3:
+                    self.timers.schedule((address, 't3'), now, self.t3 - idle)
+                    continue
+                LOG.debug("Send TESTFR_ACT")
+                c.test_sent = now
+                c.send(acpi.TESTFR_ACT)
+                if (address, 't1') not in self.timers:
+                    self.timers.schedule((address, 't1'), now, self.t1)
+                self.timers.schedule((address, 't3'), now, self.t3)
         
+
+class MetricsHandler(tornado.web.RequestHandler):
+    def initialize(self, registry):
+        self.registry = registry
+
+    def get(self):
+        self.set_header('Content-Type', metrics.CONTENT_TYPE)
+        self.write(self.registry.prometheus())
+
+
 import signal
 
 def handle_signal(sig, frame):
     tornado.ioloop.IOLoop.instance().add_callback(tornado.ioloop.IOLoop.instance().stop)
+
+
+def start_workers(count, port=2404, points=None, publish_interval=1.0, **kwargs):
+    """
+    Forks count worker processes. Each one accepts connections on its own
+    SO_REUSEPORT socket (the kernel spreads the connections over the workers)
+    and publishes the changes of the shared image points every publish_interval
+    seconds. Has to be called before an IOLoop runs in this process, which then
+    is the producer that writes points.
+    :param points: pointdb.SharedPointDatabase with all points added.
+    :return: Process ids of the workers.
+    """
+    pids = []
+    for i in range(count):
+        pid = os.fork()
+        if pid:
+            pids.append(pid)
+            continue
+        try:
+            signal.signal(signal.SIGINT, handle_signal)
+            signal.signal(signal.SIGTERM, handle_signal)
+            worker = IEC104Server(points=points, **kwargs)
+            worker.add_sockets(tornado.netutil.bind_sockets(port, reuse_port=True))
+            tornado.ioloop.PeriodicCallback(worker.publish, publish_interval * 1000).start()
+            tornado.ioloop.IOLoop.current().start()
+        finally:
+            os._exit(0)
+    return pids
 '''    
 def test():
     print 'periodical----------------------------'
@@ -177,86 +580,57 @@ def test():
             #no. 7
 '''
 
+# CA 45 + 50 * 256, IOA 36 + 68 * 256
+DEMO_CA = 45 | 50 << 8
+DEMO_IOA = 36 | 68 << 8
+
+
+def add_demo_points(points):
+    points.add(DEMO_CA, DEMO_IOA, 30, True)  # M_SP_TB_1
+    points.add(DEMO_CA, DEMO_IOA + 1, 36, 0.0, deadband=0.5)  # M_ME_TF_1
+
+
+def update_demo_points(points):
+    value, quality, timestamp = points.get(DEMO_CA, DEMO_IOA)
+    points.set_value(DEMO_CA, DEMO_IOA, not value)
+    value, quality, timestamp = points.get(DEMO_CA, DEMO_IOA + 1)
+    points.set_value(DEMO_CA, DEMO_IOA + 1, value + 1)
+
+
 from tornado import gen
 @gen.coroutine
 def minute_loop():
     global server
- 
-    #sp = asdu.cSIQ()
-    sp = asdu.cMSpTb1()
-    sp.casdu1 = 45
-    sp.casdu2 = 50
-    sp.ioa1 = 36
-    sp.ioa2 = 68
-    sp.ioa3 = 0
-    sp.iv = False
-    sp.nt = False
-    sp.sb = False
-    sp.bl = False
-    sp.spi = True
-    sp.CP56Time2a.year = 16
-    sp.CP56Time2a.month = 8
-    sp.CP56Time2a.dom = 4
-    sp.CP56Time2a.hour = 3
-    sp.CP56Time2a.minute = 10
-    sp.CP56Time2a.minute = 1234
-    
-    f = asdu.cMMeTf1()
-    f.casdu1 = 45
-    f.casdu2 = 50
-    f.ioa1 = 36
-    f.ioa2 = 68
-    f.ioa3 = 0
-    
-    
+
+    add_demo_points(server.points)
+
     while True:
-        sp.spi = not sp.spi
-        f.value = f.value + 1
-        
-    
-        #nxt = gen.sleep(10)   # Start the clock.
-        #yield test()  # Run while the clock is ticking.
-        #yield nxt             # Wait for the timer to run out.
-        #yield test()
-        #print 'y'
-        #yield test()
+        update_demo_points(server.points)
 
         nxt = gen.sleep(5)
-        for c in server.connections:
-            if time.time() - c.recived > 10:
-                LOG.debug("No connection to %s:%s?", c.address, c.port)
-                server.connections.remove(c)
-                #tornado.ioloop.IOLoop.instance().close()
-                #tornado.ioloop.IOLoop.instance().stop()
-                #iec.close()
-                #iec.connect('127.0.0.1')
-            else:    
-                #LOG.debug("Send S-FRAME ssn: {}".format(c.ssn + 1))
-                #yield Task(c.send, acpi.s_frame2(c.ssn + 1))
-                #LOG.debug("Send I-FRAME")
-                #Task(c.send, acpi.i_frame2(c.rsn, c.ssn) + '\x24\x01\x03\x00\x14\x29\xcb\xb2\x02\xcd\xcc\x2c\x3e\x00\x94\xdc\x02\x8a\x23\x0a\x0b')
-                LOG.debug("Send TESTFR_ACT")
-                Task(c.send, acpi.TESTFR_ACT)
-                
-                #DATA
-                #sp = asdu.cSIQ()
-                #sp_bytes = sp.getBytes()
-                Task(c.send, acpi.i_frame2(c.rsn, c.ssn + 1) + sp.bytes())
-                c.rsn += 1
-                Task(c.send, acpi.i_frame2(c.rsn, c.ssn + 1) + f.bytes())
-                c.rsn += 1
-                
-                #print ">>>>>>"
-                #print "hex: ", binascii.hexlify(sp_bytes)
-                
-                LOG.debug("Send I-FRAME ssn: {}, rsn: {}".format(c.rsn, c.ssn + 1))
-                Task(c.send, acpi.i_frame2(c.rsn, c.ssn + 1) + '\x24\x01\x03\x00\x14\x29\xcb\xb2\x02\xcd\xcc\x2c\x3e\x00\x94\xdc\x02\x8a\x23\x0a\x0b')
-                c.rsn += 1
+        # Only changed points are sent, liveness is checked by the t1/t3 timers of the server
+        count = server.publish()
+        LOG.debug("Published %d ASDUs to %d sessions", count, len(server.sessions))
 
         yield nxt
-        #yield gen.sleep(2)
  
-if __name__ == "__main__":
+if __name__ == "__main__" and len(sys.argv) > 1:
+    # Multi-process mode, number of workers as argument: this process updates
+    # the shared image, the workers serve the connections
+    points = pointdb.SharedPointDatabase(2)
+    add_demo_points(points)
+    pids = start_workers(int(sys.argv[1]), 2404, points)
+    try:
+        while True:
+            update_demo_points(points)
+            time.sleep(5)
+    except KeyboardInterrupt:
+        pass
+    for pid in pids:
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+
+elif __name__ == "__main__":
     signal.signal(signal.SIGINT, handle_signal)
     signal.signal(signal.SIGTERM, handle_signal)
     
@@ -268,6 +642,7 @@ if __name__ == "__main__":
     
     server = IEC104Server()
     server.listen(2404)
+    server.listen_metrics(9104)
     
     #tornado.ioloop.PeriodicCallback(test, 2000).start()
     tornado.ioloop.IOLoop.instance().start()
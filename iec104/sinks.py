@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+Batched sinks for the points received by a controlling station.
+
+A Pipeline decodes monitored ASDUs into rows (see FIELDS) and hands them to
+its sinks in batches, when batch_size rows are collected or delay seconds
+after the first row of a batch, never one call per object. Sinks that cannot
+keep up report full(), the client then stops reading from the socket until
+they have room again (TCP flow control pushes back on the station).
+"""
+import csv
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    from . import pointdb, typetable, valuestore
+except (ImportError, ValueError):
+    import pointdb
+    import typetable
+    import valuestore
+
+# Columns of a row
+FIELDS = ('received', 'ca', 'ioa', 'type_id', 'cot', 'value', 'quality', 'timestamp')
+
+
+class Pipeline(object):
+    """
+    :param schedule: schedule(delay, callback), e.g. IOLoop.call_later or
+    asyncio's loop.call_later. Without it batches are only flushed by size or
+    explicitly.
+    """
+
+    def __init__(self, batch_size=1024, delay=1.0, schedule=None):
+        self.batch_size = batch_size
+        self.delay = delay
+        self.schedule = schedule
+        self.sinks = []
+        self.batch = []
+        self.scheduled = False
+
+        # Counters
+        self.rows = 0
+        self.batches = 0
+
+    def add(self, sink):
+        self.sinks.append(sink)
+        return sink
+
+    def put_asdu(self, buf, offset=0, received=None):
+        """
+        Adds the points of a monitored ASDU, other ASDUs are ignored.
+        :return: Number of rows added.
+        """
+        type_id, vsq, cot, orig, ca = typetable.HEADER.unpack_from(buf, offset)
+        if type_id not in pointdb.POINT_TYPES:
+            return 0
+        info = typetable.TYPES[type_id]
+        objects = typetable.unpack_objects(info, buf, offset + typetable.HEADER.size, vsq & 0x7F, vsq >> 7)
+        if received is None:
+            received = time.time()
+        cot &= 0x3F
+        point = valuestore.point
+        self.extend([(received, ca, obj[0], type_id, cot) + point(info, obj[1:], received) for obj in objects])
+        return len(objects)
+
+    def extend(self, rows):
+        self.batch.extend(rows)
+        # Full batches go out right away, the rest when the time window ends
+        self.emit(len(self.batch) - len(self.batch) % self.batch_size)
+        if self.batch and self.schedule is not None and not self.scheduled:
+            self.scheduled = True
+            self.schedule(self.delay, self.expire)
+
+    def expire(self):
+        self.scheduled = False
+        self.flush()
+
+    def flush(self):
+        self.emit(len(self.batch))
+
+    def emit(self, count):
+        """
+        Hands the first count rows to the sinks, in batches of at most batch_size rows.
+        """
+        if not count:
+            return
+        rows = self.batch[:count]
+        del self.batch[:count]
+        for start in range(0, count, self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            self.rows += len(batch)
+            self.batches += 1
+            for sink in self.sinks:
+                sink.write(batch)
+
+    def full(self):
+        """
+        :return: True while a sink has no room for more batches.
+        """
+        for sink in self.sinks:
+            if sink.full():
+                return True
+        return False
+
+    def close(self):
+        self.flush()
+        for sink in self.sinks:
+            sink.close()
+
+
+class Sink(object):
+    """
+    Base of the sinks. A sink has write(batch), called with a list of rows;
+    full() tells the pipeline to stop reading, close() is called once at the
+    end. The base only provides full() and close() for sinks that never fill
+    up and hold nothing to release.
+    """
+
+    def full(self):
+        return False
+
+    def close(self):
+        pass
+
+
+class CallbackSink(Sink):
+    def __init__(self, callback):
+        self.callback = callback
+
+    def write(self, batch):
+        self.callback(batch)
+
+
+class QueueSink(Sink):
+    """
+    Puts batches into a bounded queue, an asyncio.Queue or queue.Queue. Batches
+    that do not fit wait in a backlog, the sink is full until it is empty.
+    """
+
+    def __init__(self, queue):
+        self.queue = queue
+        self.backlog = []
+
+    def write(self, batch):
+        self.backlog.append(batch)
+        self.full()
+
+    def full(self):
+        while self.backlog and not self.queue.full():
+            self.queue.put_nowait(self.backlog.pop(0))
+        return bool(self.backlog)
+
+
+class ThreadSink(Sink):
+    """
+    Runs the write() of another sink in a thread of its own, so slow storage
+    does not block the event loop. Full while maxsize batches are waiting,
+    write() blocks if the pipeline writes more anyway.
+    """
+
+    def __init__(self, sink, maxsize=16):
+        self.sink = sink
+        self.queue = queue.Queue(maxsize)
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        while True:
+            batch = self.queue.get()
+            if batch is None:
+                break
+            self.sink.write(batch)
+        self.sink.close()
+
+    def write(self, batch):
+        self.queue.put(batch)
+
+    def full(self):
+        return self.queue.full()
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+
+class CSVSink(Sink):
+    """
+    Appends the rows to a CSV file with header. The file is rotated like
+    logging.handlers.RotatingFileHandler once it reaches max_bytes: path
+    becomes path.1, path.1 becomes path.2 and so on, up to backups files.
+    """
+
+    def __init__(self, path, max_bytes=64 * 1024 * 1024, backups=5):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.file = None
+        self.writer = None
+        self.open()
+
+    def open(self):
+        if sys.version_info[0] < 3:
+            self.file = open(self.path, 'ab')
+        else:
+            self.file = open(self.path, 'a', newline='')
+        self.writer = csv.writer(self.file)
+        if not self.file.tell():
+            self.writer.writerow(FIELDS)
+
+    def write(self, batch):
+        self.writer.writerows(batch)
+        self.file.flush()
+        if self.max_bytes and self.file.tell() >= self.max_bytes:
+            self.rotate()
+
+    def rotate(self):
+        self.file.close()
+        for i in range(self.backups - 1, 0, -1):
+            name = '{}.{}'.format(self.path, i)
+            if os.path.exists(name):
+                os.rename(name, '{}.{}'.format(self.path, i + 1))
+        if self.backups:
+            os.rename(self.path, self.path + '.1')
+        else:
+            os.remove(self.path)
+        self.open()
+
+    def close(self):
+        self.file.close()
+
+
+class SQLiteSink(Sink):
+    """
+    Inserts the rows into a table with one column per field, one transaction per batch.
+    :param database: Path of the database file or a sqlite3 connection.
+    """
+
+    def __init__(self, database, table='points'):
+        self.own = not isinstance(database, sqlite3.Connection)
+        # Written by a ThreadSink, created in the thread of the caller
+        self.connection = sqlite3.connect(database, check_same_thread=False) if self.own else database
+        self.connection.execute('CREATE TABLE IF NOT EXISTS {} (received REAL, ca INTEGER, ioa INTEGER, '
+                                'type_id INTEGER, cot INTEGER, value REAL, quality INTEGER, timestamp REAL)'.format(table))
+        self.insert = 'INSERT INTO {} VALUES ({})'.format(table, ', '.join('?' * len(FIELDS)))
+
+    def write(self, batch):
+        with self.connection:
+            self.connection.executemany(self.insert, batch)
+
+    def close(self):
+        if self.own:
+            self.connection.close()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Interests of subscribers (e.g. the sessions of a server) in IOA ranges of
+common addresses.
+
+Per common address the ranges of all subscribers are cut into disjoint
+intervals at their ends, each holding the frozenset of subscribers that
+cover it (a flattened interval index). match() finds the subscribers of a
+point with one bisection, whatever the number of subscribers and ranges.
+The index of a common address is built on its first match after a change;
+common addresses without ranges of their own share one index for the
+subscriptions of all common addresses.
+"""
+import bisect
+import collections
+
+MAX_IOA = 0xFFFFFF
+
+NOBODY = frozenset()
+
+
+def casdu(casdu1, casdu2):
+    """
+    :return: Common address of its low (casdu1, first on the wire) and high (casdu2) octet.
+    """
+    return casdu2 << 8 | casdu1
+
+
+class SubscriptionIndex(object):
+    """
+    Ranges of IOAs subscribed by key, of one common address or of all (None).
+    """
+
+    def __init__(self):
+        self.ranges = {}  # key -> [(ca, first, last)]
+        self.addresses = set()  # common addresses with ranges of their own
+        self.tables = {}  # ca -> starts, owners; None for the other common addresses
+
+    def __len__(self):
+        return len(self.ranges)
+
+    def __contains__(self, key):
+        return key in self.ranges
+
+    def subscribe(self, key, ca=None, first=0, last=MAX_IOA):
+        """
+        Adds IOAs first..last (both included) of common address ca to the interests of key.
+        :param ca: Common address, None for all.
+        """
+        if not 0 <= first <= last <= MAX_IOA:
+            raise ValueError('IOA range {}..{} outside 0..{}'.format(first, last, MAX_IOA))
+        self.ranges.setdefault(key, []).append((ca, first, last))
+        if ca is not None:
+            self.addresses.add(ca)
+        self.tables.clear()
+
+    def unsubscribe(self, key):
+        """
+        Removes all interests of key.
+        """
+        if self.ranges.pop(key, None) is not None:
+            self.addresses = set(ca for ranges in self.ranges.values() for ca, first, last in ranges
+                                 if ca is not None)
+            self.tables.clear()
+
+    def table(self, ca):
+        """
+        :return: Start IOAs of the intervals and the frozensets of their subscribers.
+        """
+        if ca not in self.addresses:
+            ca = None
+        table = self.tables.get(ca)
+        if table is not None:
+            return table
+        events = collections.defaultdict(list)
+        for key, ranges in self.ranges.items():
+            for range_ca, first, last in ranges:
+                if range_ca is None or range_ca == ca:
+                    events[first].append((key, 1))
+                    events[last + 1].append((key, -1))
+        active = collections.Counter()
+        # The same subscribers share one frozenset, publishers group by it
+        shared = {NOBODY: NOBODY}
+        starts = [0]
+        owners = [NOBODY]
+        for start in sorted(events):
+            for key, change in events[start]:
+                active[key] += change
+                if not active[key]:
+                    del active[key]
+            keys = frozenset(active)
+            keys = shared.setdefault(keys, keys)
+            if start == starts[-1]:
+                owners[-1] = keys
+            elif keys is not owners[-1]:
+                starts.append(start)
+                owners.append(keys)
+        table = self.tables[ca] = (starts, owners)
+        return table
+
+    def match(self, ca, ioa):
+        """
+        :return: frozenset of the keys subscribed to the point.
+        """
+        starts, owners = self.tables.get(ca if ca in self.addresses else None) or self.table(ca)
+        return owners[bisect.bisect_right(starts, ioa) - 1]
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+import struct
+
+from iec104 import acpi
+
+M_ME_TF_1 = b'\x24\x01\x03\x00\x14\x29\xcb\xb2\x02\xcd\xcc\x2c\x3e\x00\x94\xdc\x02\x8a\x23\x0a\x0b'
+
+
+def apdu(data):
+    return b'\x68' + struct.pack('B', len(data)) + data
+
+
+def test_frames_match_acpi():
+    builder = acpi.FrameBuilder()
+    for ssn, rsn in ((0, 0), (1, 2), (32767, 12345)):
+        assert builder.i_frame(ssn, rsn, M_ME_TF_1).tobytes() == apdu(acpi.i_frame2(ssn, rsn) + M_ME_TF_1)
+        assert builder.i_frame(ssn, rsn).tobytes() == apdu(acpi.i_frame2(ssn, rsn))
+        assert builder.i_header(ssn, rsn, len(M_ME_TF_1)).tobytes() + M_ME_TF_1 == builder.i_frame(
+            ssn, rsn, M_ME_TF_1).tobytes()
+        assert builder.s_frame(rsn).tobytes() == apdu(acpi.s_frame2(rsn))
+    assert builder.u_frame(acpi.TESTFR_ACT).tobytes() == apdu(acpi.TESTFR_ACT)
+
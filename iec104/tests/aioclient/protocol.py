@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import socket
+import struct
+
+from iec104 import acpi
+from iec104 import aioclient
+from iec104 import framer
+from iec104 import metrics
+from iec104 import sinks
+
+M_ME_TF_1 = b'\x24\x01\x03\x00\x14\x29\xcb\xb2\x02\xcd\xcc\x2c\x3e\x00\x94\xdc\x02\x8a\x23\x0a\x0b'
+
+
+def apdu(data):
+    return b'\x68' + struct.pack('B', len(data)) + data
+
+
+async def outstation(frames, **kwargs):
+    """
+    Connects a client to a scripted outstation that answers STARTDT_ACT and TESTFR_ACT,
+    sends frames and closes. Returns the decoded ASDUs and the frames sent by the client.
+    """
+    received = []
+
+    async def handle(reader, writer):
+        f = framer.APDUFramer()
+        while True:
+            data = await reader.read(1024)
+            if not data:
+                break
+            for frame in f.feed(data):
+                frame = frame.tobytes()
+                received.append(frame)
+                if frame == acpi.STARTDT_ACT:
+                    writer.write(apdu(acpi.STARTDT_CON) + apdu(acpi.TESTFR_ACT) + b''.join(frames))
+                    await writer.drain()
+                elif frame.startswith(b'\x01\x00') and acpi.parse_s_frame(frame) == len(frames):
+                    writer.close()
+                    return
+
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    protocol = await aioclient.connect('127.0.0.1', port, **kwargs)
+    asdus = [o_asdu async for o_asdu in protocol]
+    server.close()
+    return asdus, received
+
+
+def test_receive_and_acknowledge():
+    frames = [apdu(acpi.i_frame2(ssn, 0) + M_ME_TF_1) for ssn in range(3)]
+    asdus, received = asyncio.run(outstation(frames, w=1, maxsize=1))
+    assert [o_asdu.type_id for o_asdu in asdus] == [36, 36, 36]
+    assert abs(asdus[0].objs[0].val - 0.16875) < 1e-6
+    assert received == [acpi.STARTDT_ACT, acpi.TESTFR_CON] + [acpi.s_frame2(rsn) for rsn in (1, 2, 3)]
+
+
+def test_batched_acknowledge():
+    # w frames are acknowledged with one S-frame, the rest when t2 expires
+    frames = [apdu(acpi.i_frame2(ssn, 0) + M_ME_TF_1) for ssn in range(5)]
+    asdus, received = asyncio.run(outstation(frames, w=4, t2=0.05))
+    assert len(asdus) == 5
+    assert received == [acpi.STARTDT_ACT, acpi.TESTFR_CON, acpi.s_frame2(4), acpi.s_frame2(5)]
+
+
+def test_sequence_error_closes_connection():
+    frames = [apdu(acpi.i_frame2(ssn, 0) + M_ME_TF_1) for ssn in (0, 2)]
+    asdus, received = asyncio.run(outstation(frames, w=1))
+    assert len(asdus) == 1
+    assert received[-1] == acpi.s_frame2(1)
+
+
+def test_t1_unacknowledged_i_frames():
+    # The outstation answers TESTFR_ACT, but never acknowledges I-frames
+    async def handle(reader, writer):
+        f = framer.APDUFramer()
+        while True:
+            data = await reader.read(1024)
+            if not data:
+                break
+            for frame in f.feed(data):
+                if frame.tobytes() == acpi.STARTDT_ACT:
+                    writer.write(apdu(acpi.STARTDT_CON))
+                elif frame.tobytes() == acpi.TESTFR_ACT:
+                    writer.write(apdu(acpi.TESTFR_CON))
+
+    async def run():
+        server = await asyncio.start_server(handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        protocol = await aioclient.connect('127.0.0.1', port, t1=0.1, t3=0.05)
+        protocol.send_asdu(M_ME_TF_1)
+        closed = await asyncio.wait_for(protocol.closed, 2)
+        server.close()
+        return closed
+
+    assert asyncio.run(run()) is None
+
+
+def test_send_under_backpressure():
+    # Frames the socket does not take at once are queued by the transport
+    async def run():
+        loop = asyncio.get_running_loop()
+        a, b = socket.socketpair()
+        a.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+        b.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        b.setblocking(False)
+        transport, protocol = await loop.create_connection(
+            lambda: aioclient.IEC104Protocol(k=1000, w=1000), sock=a)
+        for i in range(400):
+            protocol.send_asdu(M_ME_TF_1)
+        f = framer.APDUFramer()
+        received = []
+        while len(received) < 401:
+            received.extend(frame.tobytes() for frame in f.feed(await loop.sock_recv(b, 65536)))
+        # Never started, nobody waits for STARTDT_CON
+        protocol.started.cancel()
+        transport.close()
+        b.close()
+        return received
+
+    received = asyncio.run(run())
+    assert received[0] == acpi.STARTDT_ACT
+    assert received[1:] == [acpi.i_frame2(ssn, 0) + M_ME_TF_1 for ssn in range(400)]
+
+
+def test_pipeline_backpressure():
+    # A queue of one batch: reading pauses until the consumer takes it
+    frames = [apdu(acpi.i_frame2(ssn, 0) + M_ME_TF_1) for ssn in range(5)]
+
+    async def run():
+        batches = asyncio.Queue(1)
+        pipeline = sinks.Pipeline(batch_size=1)
+        pipeline.add(sinks.QueueSink(batches))
+        consumer = asyncio.ensure_future(outstation(frames, w=1, pipeline=pipeline))
+        received = []
+        while len(received) < 5:
+            await asyncio.sleep(0.05)
+            received.append(await batches.get())
+        await consumer
+        return received
+
+    received = asyncio.run(run())
+    assert [batch[0][2] for batch in received] == [0x02b2cb] * 5
+
+
+def test_metrics():
+    frames = [apdu(acpi.i_frame2(ssn, 0) + M_ME_TF_1) for ssn in range(3)]
+    registry = metrics.Registry()
+    asdus, received = asyncio.run(outstation(frames, w=1, registry=registry))
+    assert len(asdus) == 3
+    total = registry.total().snapshot()
+    assert registry.sessions == {}
+    assert total['frames'] == {'in': {'I': 3, 'S': 0, 'U': 2}, 'out': {'I': 0, 'S': 3, 'U': 2}}
+    assert total['asdus']['in'] == {'M_ME_TF_1': 3}
+    # Once per read
+    assert 1 <= total['decode']['count'] <= 3
+    assert total['bytes']['in'] == {'I': 3 * (6 + len(M_ME_TF_1)), 'S': 0, 'U': 12}
+    assert total['ack_rtt']['count'] == 0
+
+
+def test_serve_metrics():
+    async def run():
+        registry = metrics.Registry()
+        registry.session('a')
+        server = await aioclient.serve_metrics(registry, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        responses = []
+        for path in ('/metrics', '/'):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write('GET {} HTTP/1.1\r\nHost: localhost\r\n\r\n'.format(path).encode())
+            responses.append(await reader.read())
+            writer.close()
+        server.close()
+        return responses
+
+    found, missing = asyncio.run(run())
+    assert found.startswith(b'HTTP/1.1 200 OK\r\n')
+    assert b'\r\n\r\n# HELP iec104_connections_total' in found
+    assert b'iec104_sessions 1\n' in found
+    assert missing.startswith(b'HTTP/1.1 404')
+
+
+def test_sequence_error_dumps_trace(caplog):
+    frames = [apdu(acpi.i_frame2(ssn, 0) + M_ME_TF_1) for ssn in (0, 2)]
+    with caplog.at_level(logging.WARNING):
+        asdus, received = asyncio.run(outstation(frames, w=1, trace_every=1, trace_size=4))
+    assert len(asdus) == 1
+    message = [record.getMessage() for record in caplog.records if record.getMessage().startswith('Frame trace')]
+    lines = message[0].splitlines()
+    assert lines[0] == 'Frame trace: 4 of 7 frames kept'
+    # TESTFR_CON, I-frame 0, S-frame, I-frame 2
+    assert [line.split()[1:] for line in lines[1:]] == [
+        ['out', '83000000'], ['in', '00000000' + M_ME_TF_1.hex()], ['out', '01000200'],
+        ['in', '04000000' + M_ME_TF_1.hex()]]
+
+
+class Transport(object):
+    """
+    Collects what a protocol writes instead of a socket transport.
+    """
+
+    def __init__(self):
+        self.data = bytearray()
+        self.closes = 0
+
+    def get_extra_info(self, name, default=None):
+        return ('127.0.0.1', 2404) if name in ('peername', 'sockname') else default
+
+    def write(self, data):
+        self.data += data
+
+    def writelines(self, data):
+        for part in data:
+            self.write(part)
+
+    def is_closing(self):
+        return self.closes > 0
+
+    def close(self):
+        self.closes += 1
+
+
+def feed(chunk, **kwargs):
+    """
+    Passes chunk to a connected protocol in one data_received call.
+    :return: The protocol.
+    """
+    async def run():
+        protocol = aioclient.IEC104Protocol(**kwargs)
+        protocol.connection_made(Transport())
+        protocol.data_received(chunk)
+        protocol.timer.cancel()
+        return protocol
+    return asyncio.run(run())
+
+
+def test_failed_chunk_not_handled_further(caplog):
+    frames = b''.join(apdu(acpi.i_frame2(ssn, 0) + M_ME_TF_1) for ssn in (1, 2, 3))
+    with caplog.at_level(logging.WARNING):
+        protocol = feed(frames, trace_every=1)
+    assert protocol.transport.closes == 1
+    assert [record.getMessage() for record in caplog.records if 'Sequence error' in record.getMessage()] == [
+        'Sequence error: expected 0, received 1']
+    assert len([record for record in caplog.records if record.getMessage().startswith('Frame trace')]) == 1
+
+
+def test_short_i_frame(caplog):
+    for chunk in (b'\x68\x04\x00\x00\x00\x00', b'\x68\x06\x02\x00\x00\x00\x0d\x01'):
+        for kwargs in ({}, {'pipeline': sinks.Pipeline(), 'registry': metrics.Registry()}):
+            with caplog.at_level(logging.WARNING):
+                protocol = feed(chunk + apdu(acpi.i_frame2(0, 0) + M_ME_TF_1), **kwargs)
+            assert protocol.transport.closes == 1
+            assert protocol.queue.empty()
+            assert caplog.records[-1].getMessage().startswith('I-frame of {} bytes'.format(ord(chunk[1:2])))
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+import struct
+
+from bitstring import ConstBitStream
+
+from iec104 import asdu
+from iec104 import packer
+
+# M_ME_TF_1 from https://www.cloudshark.org/captures/a4ea80e9b1f8 (no. 7)
+M_ME_TF_1 = b'\x24\x01\x03\x00\x14\x29\xcb\xb2\x02\xcd\xcc\x2c\x3e\x00\x94\xdc\x02\x8a\x23\x0a\x0b'
+
+# M_SP_NA_1, SQ=0, 8 objects
+M_SP_NA_1 = b'\x01\x08\x03\x00\x2d\x32' + b''.join(
+    struct.pack('<I', ioa)[:3] + struct.pack('B', siq)
+    for ioa, siq in zip(range(100, 108), (0x00, 0x01, 0x80, 0x81, 0x40, 0x20, 0x10, 0xf1)))
+
+# M_DP_NA_1, SQ=0, 2 objects
+M_DP_NA_1 = b'\x03\x02\x03\x00\x2d\x32\x07\x00\x00\x02\x08\x00\x00\x81'
+
+# M_ME_NA_1, SQ=0, 2 objects, the second invalid
+M_ME_NA_1 = b'\x09\x02\x03\x00\x2d\x32' + b''.join(
+    struct.pack('<I', ioa)[:3] + struct.pack('<hB', nva, qds)
+    for ioa, nva, qds in ((10, -1234, 0x00), (11, 4321, 0x80)))
+
+
+def decode_bitstring(data):
+    return asdu.ASDU(ConstBitStream(bytes=data))
+
+
+def decode_struct(data):
+    return asdu.ASDU.from_buffer(memoryview(data))
+
+
+def attributes(o_asdu):
+    return (o_asdu.type_id, o_asdu.cot, o_asdu.asdu,
+            [sorted(vars(o).items()) for o in o_asdu.objs])
+
+
+def test_decode_same_attributes():
+    for data in (M_ME_TF_1, M_SP_NA_1, M_DP_NA_1, M_ME_NA_1):
+        assert attributes(decode_struct(data)) == attributes(decode_bitstring(data))
+
+
+def test_decode_m_me_tf_1():
+    o_asdu = decode_struct(M_ME_TF_1)
+    # ASDU=10516 IOA=176843 as decoded by Wireshark
+    assert o_asdu.asdu == 0x2914
+    assert [o.ioa for o in o_asdu.objs] == [0x02b2cb]
+    assert abs(o_asdu.objs[0].val - 0.16875) < 1e-6
+
+
+def test_decode_sequence():
+    data = b'\x0d\x83\x03\x00\x2d\x32\x0a\x00\x00' + b''.join(
+        struct.pack('<fB', value, 0) for value in (1.5, 2.5, 3.5))
+    o_asdu = decode_struct(data)
+    assert [(o.ioa, o.val) for o in o_asdu.objs] == [(10, 1.5), (11, 2.5), (12, 3.5)]
+
+
+def test_decode_packed():
+    # Same byte order as the ASDUs of the server
+    o_asdu = decode_struct(packer.pack(13, [(1000, 1.5, 0), (1001, 2.5, 0)], 3, 1)[0])
+    assert o_asdu.asdu == 1
+    assert [(o.ioa, o.val) for o in o_asdu.objs] == [(1000, 1.5), (1001, 2.5)]
+
+
+def test_decode_truncated():
+    assert len(decode_struct(M_SP_NA_1[:-5]).objs) == 6
+
+
+
+def test_octet_helpers():
+    obj = asdu.cInfoObj()
+    obj.type_id = 13
+    obj.casdu1, obj.casdu2 = 45, 50
+    obj.ioa1, obj.ioa2, obj.ioa3 = 0xcb, 0xb2, 0x02
+    o_asdu = decode_struct(obj.bytes() + struct.pack('<fB', 1.5, 0))
+    assert (asdu.casdu1(o_asdu.asdu), asdu.casdu2(o_asdu.asdu)) == (45, 50)
+    ioa = o_asdu.objs[0].ioa
+    assert (asdu.ioa1(ioa), asdu.ioa2(ioa), asdu.ioa3(ioa)) == (0xcb, 0xb2, 0x02)
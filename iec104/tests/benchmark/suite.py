@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import json
+
+from iec104 import asdu
+from iec104 import benchmark
+
+
+def test_payloads():
+    for name, (data, objects) in benchmark.PAYLOADS.items():
+        assert len(data) + 4 <= 253
+        assert len(asdu.ASDU.from_buffer(memoryview(data)).objs) == objects
+    assert benchmark.PAYLOADS['sequence'][1] == 127
+
+
+def test_cases_run():
+    for name, objects, func in benchmark.cases('timetag'):
+        func()
+    names = [name for name, objects, func in benchmark.cases('asdu')]
+    assert 'asdu.from_buffer/time_tagged' in names
+
+
+def test_results_json(tmpdir):
+    results = benchmark.run('acpi.FrameBuilder.s_frame', repeat=2, duration=0.001)
+    assert list(results['results']) == ['acpi.FrameBuilder.s_frame']
+    path = tmpdir.join('results.json')
+    assert benchmark.main(['-k', 'acpi.s_frame2', '--repeat', '1', '--duration', '0.001',
+                           '--output', str(path)]) == 0
+    stored = json.loads(path.read())
+    assert stored['results']['acpi.s_frame2']['seconds'] > 0
+    assert stored['python']
+
+
+def test_compare():
+    old = {'results': {'a': {'seconds': 1.0}, 'b': {'seconds': 1.0}, 'c': {'seconds': 1.0}}}
+    new = {'results': {'a': {'seconds': 1.05}, 'b': {'seconds': 1.5}, 'd': {'seconds': 1.0}}}
+    assert benchmark.compare(old, new, 0.1) == [('a', 1.05, False), ('b', 1.5, True)]
+
+
+def test_overheads():
+    results = {'results': {'a/x': {'seconds': 1.0}, 'a+metrics/x': {'seconds': 1.5, 'overhead': 0.01},
+                           'b': {'seconds': 1.0}, 'b+metrics': {'seconds': 1.05}}}
+    assert benchmark.overheads(results) == [('a+metrics/x', 0.01, True), ('b+metrics', 1.05 - 1, False)]
+
+
+def test_measure_pair():
+    plain, instrumented, ratio, number = benchmark.measure_pair(lambda: None, lambda: sum(range(1000)), 3, 0.001)
+    assert instrumented > plain and ratio > 1
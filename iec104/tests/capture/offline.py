@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import struct
+
+from iec104 import acpi
+from iec104 import capture
+from iec104 import packer
+
+STATION = (b'\x0a\x00\x00\x01', 2404)
+MASTER = (b'\x0a\x00\x00\x02', 50000)
+
+
+def apdu(data):
+    return b'\x68' + struct.pack('B', len(data)) + data
+
+
+def ethernet(source, destination, sequence, payload, flags=0x18):
+    tcp = struct.pack('>HHIIHHHH', source[1], destination[1], sequence, 0, 5 << 12 | flags, 65535, 0, 0)
+    ip = struct.pack('>BBHHHBBH4s4s', 0x45, 0, 20 + len(tcp) + len(payload), 0, 0, 64, 6, 0, source[0], destination[0])
+    return b'\x00' * 12 + b'\x08\x00' + ip + tcp + payload
+
+
+def segments():
+    """
+    STARTDT, 3 I-frames from the station cut into 4 segments: out of order,
+    with a retransmission and an APDU split over two segments.
+    """
+    asdus = packer.pack(13, [(ioa, float(ioa), 0) for ioa in range(0, 200, 2)], 3, 1)
+    stream = b''.join(apdu(acpi.i_frame2(ssn, 1) + data) for ssn, data in enumerate(asdus))
+    cut = [0, 100, 300, 500, len(stream)]
+    station = [(1000 + 1 + cut[i], stream[cut[i]:cut[i + 1]]) for i in range(4)]
+    return len(asdus), [
+        (1.0, MASTER, STATION, 0, b'', 0x02),
+        (1.0, STATION, MASTER, 1000, b'', 0x12),
+        (1.1, MASTER, STATION, 1, apdu(acpi.STARTDT_ACT)),
+        (1.2, STATION, MASTER, 1001, apdu(acpi.STARTDT_CON)),
+        (2.0, STATION, MASTER, station[0][0] + 6, station[0][1]),
+        (2.1, STATION, MASTER, station[2][0] + 6, station[2][1]),
+        (2.2, STATION, MASTER, station[1][0] + 6, station[1][1]),
+        (2.3, STATION, MASTER, station[1][0] + 6, station[1][1]),
+        (2.4, STATION, MASTER, station[3][0] + 6, station[3][1]),
+        (2.5, MASTER, STATION, 7, apdu(acpi.s_frame2(len(asdus)))),
+    ]
+
+
+def write_pcap(path, packets):
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<IHHiIII', capture.PCAP_MAGIC, 2, 4, 0, 0, 65535, capture.LINKTYPE_ETHERNET))
+        for packet in packets:
+            timestamp, data = packet[0], ethernet(*packet[1:])
+            f.write(struct.pack('<IIII', int(timestamp), int(round(timestamp % 1 * 1e6)), len(data), len(data)) + data)
+
+
+def block(block_type, body):
+    body += b'\x00' * (-len(body) % 4)
+    return struct.pack('<II', block_type, len(body) + 12) + body + struct.pack('<I', len(body) + 12)
+
+
+def write_pcapng(path, packets):
+    with open(path, 'wb') as f:
+        f.write(block(capture.PCAPNG_SHB, struct.pack('<IHHq', capture.PCAPNG_BYTE_ORDER, 1, 0, -1)))
+        # Nanosecond timestamps
+        f.write(block(capture.PCAPNG_IDB, struct.pack('<HHI', capture.LINKTYPE_ETHERNET, 0, 0) +
+                      struct.pack('<HHB3x', capture.PCAPNG_IF_TSRESOL, 1, 9) + struct.pack('<HH', 0, 0)))
+        for packet in packets:
+            timestamp, data = int(round(packet[0] * 1e9)), ethernet(*packet[1:])
+            f.write(block(capture.PCAPNG_EPB, struct.pack('<IIIII', 0, timestamp >> 32, timestamp & 0xFFFFFFFF,
+                                                          len(data), len(data)) + data))
+
+
+def test_decode(tmpdir):
+    count, packets = segments()
+    for write in (write_pcap, write_pcapng):
+        path = str(tmpdir.join(write.__name__))
+        write(path, packets)
+        stats = capture.decode(path)
+        assert (stats.frames['I'], stats.frames['S'], stats.frames['U']) == (count, 1, 2)
+        assert stats.types == {13: count}
+        assert stats.objects == 100
+
+
+def test_decode_short_i_frames(tmpdir):
+    count, packets = segments()
+    # I-frames of 5 and 9 bytes from the station after the S-frame: APCI without complete ASDU header
+    short = apdu(acpi.i_frame2(count, 1) + b'\x0d') + apdu(acpi.i_frame2(count + 1, 1) + b'\x0d\x01\x03\x00\x01')
+    end = max(packet[3] + len(packet[4]) for packet in packets if packet[1] == STATION)
+    packets.append((2.6, STATION, MASTER, end, short))
+    path = str(tmpdir.join('capture.pcap'))
+    write_pcap(path, packets)
+    stats = capture.decode(path)
+    assert (stats.frames['I'], stats.errors) == (count + 2, 2)
+    assert stats.types == {13: count}
+    assert len(capture.monitor_asdus(path)) == count
+
+
+def test_monitor_asdus(tmpdir):
+    packets = segments()[1]
+    path = str(tmpdir.join('capture.pcap'))
+    write_pcap(path, packets)
+    captured = capture.monitor_asdus(path)
+    assert [data for timestamp, data in captured] == packer.pack(13, [(ioa, float(ioa), 0) for ioa in range(0, 200, 2)], 3, 1)
+    # APDUs of 252 bytes: the first is complete once the gap is filled at 2.2
+    assert [round(timestamp, 1) for timestamp, data in captured] == [2.2, 2.4, 2.4, 2.4]
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import socket
+import struct
+import sys
+
+import pytest
+
+if sys.version_info[0] > 2:
+    pytest.skip('client.py runs on Python 2', allow_module_level=True)
+
+import tornado.ioloop
+import tornado.iostream
+from tornado import gen
+
+from iec104 import acpi
+from iec104 import client
+from iec104 import framer
+from iec104 import sinks
+from iec104 import window
+
+M_ME_TF_1 = b'\x24\x01\x03\x00\x14\x29\xcb\xb2\x02\xcd\xcc\x2c\x3e\x00\x94\xdc\x02\x8a\x23\x0a\x0b'
+
+
+def apdu(data):
+    return b'\x68' + struct.pack('B', len(data)) + data
+
+
+def receive(data, **kwargs):
+    """
+    Runs the read loop of a client on data sent by the peer, until the client
+    closes the connection or a second passed.
+    :return: The client.
+    """
+    c = client.IEC104Client(**kwargs)
+    c.window = window.SlidingWindow(c.k, c.w, c.t2)
+    c.framer = framer.APDUFramer()
+    c.recived = 0
+    ours, theirs = socket.socketpair()
+    c.stream = tornado.iostream.IOStream(ours)
+    theirs.sendall(data)
+
+    @gen.coroutine
+    def wait():
+        c.receive()
+        for i in range(100):
+            if c.stream.closed():
+                break
+            yield gen.sleep(0.01)
+    tornado.ioloop.IOLoop.current().run_sync(wait)
+    theirs.close()
+    return c
+
+
+def test_receive():
+    c = receive(apdu(acpi.i_frame2(0, 0) + M_ME_TF_1))
+    assert not c.stream.closed()
+    assert len(c.values) == 1
+    c.close()
+
+
+@pytest.mark.parametrize('asdu', [b'', b'\x0d\x01'])
+def test_short_i_frame_closes_connection(asdu):
+    # In sequence, only the length is wrong
+    c = receive(apdu(acpi.i_frame2(0, 0) + asdu) + apdu(acpi.i_frame2(1, 0) + M_ME_TF_1),
+                pipeline=sinks.Pipeline(), trace_every=1)
+    assert c.stream.closed()
+    assert len(c.values) == 0
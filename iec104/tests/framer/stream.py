@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from iec104 import framer
+
+STARTDT_CON = b'\x68\x04\x0b\x00\x00\x00'
+I_FRAME = b'\x68\x19\x02\x00\x02\x00\x24\x01\x03\x00\x14\x29\xcb\xb2\x02\xcd\xcc\x2c\x3e\x00\x94\xdc\x02\x8a\x23\x0a\x0b'
+
+
+def collect(f, chunks):
+    return [frame.tobytes() for chunk in chunks for frame in f.feed(chunk)]
+
+
+def test_frames_in_one_chunk():
+    f = framer.APDUFramer()
+    assert collect(f, [STARTDT_CON + I_FRAME + STARTDT_CON]) == [STARTDT_CON[2:], I_FRAME[2:], STARTDT_CON[2:]]
+    assert f.start == f.end
+
+
+def test_frames_split_across_chunks():
+    stream = (STARTDT_CON + I_FRAME) * 3
+    for size in (1, 2, 5, 7, 26):
+        f = framer.APDUFramer()
+        chunks = [stream[i:i + size] for i in range(0, len(stream), size)]
+        assert collect(f, chunks) == [STARTDT_CON[2:], I_FRAME[2:]] * 3
+
+
+def test_read_into_small_buffer():
+    f = framer.APDUFramer(255)
+    frames = []
+    stream = I_FRAME * 40
+    while stream:
+        free = f.writable()
+        count = min(len(free), len(stream))
+        free[:count] = stream[:count]
+        f.written(count)
+        stream = stream[count:]
+        frames.extend(frame.tobytes() for frame in f.frames())
+    assert frames == [I_FRAME[2:]] * 40
+
+
+def test_resync_on_garbage():
+    f = framer.APDUFramer()
+    # garbage, a 0x68 with an impossible length and a truncated frame header
+    stream = b'\x00\x01\x02' + b'\x68\x02\x00' + STARTDT_CON + b'\xff\x68\xfe' + I_FRAME
+    assert collect(f, [stream]) == [STARTDT_CON[2:], I_FRAME[2:]]
+    assert f.discarded == 9
+
+
+def test_incomplete_frame_is_kept():
+    f = framer.APDUFramer()
+    assert collect(f, [I_FRAME[:10]]) == []
+    assert collect(f, [I_FRAME[10:]]) == [I_FRAME[2:]]
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import random
+
+from iec104 import acpi
+from iec104 import metrics
+
+M_ME_TF_1 = b'\x24\x01\x03\x00\x14\x29\xcb\xb2\x02\xcd\xcc\x2c\x3e\x00\x94\xdc\x02\x8a\x23\x0a\x0b'
+
+
+def test_histogram_percentiles():
+    histogram = metrics.Histogram(1.0, 1e6)
+    values = [random.uniform(0.0, 0.01) for i in range(10000)]
+    for value in values:
+        histogram.record(value)
+    values.sort()
+    for q in (0.5, 0.9, 0.99):
+        exact = values[int(q * len(values)) - 1]
+        assert abs(histogram.percentile(q) - exact) <= exact / 16 + 1e-6
+    assert histogram.percentile(1.0) == histogram.max == values[-1]
+    assert histogram.count == 10000
+    assert abs(histogram.total - sum(values)) < 1e-6
+
+
+def test_histogram_buckets():
+    histogram = metrics.Histogram(10 ** 6)
+    # Exact below 2 ** bits, contiguous above
+    for units in range(200000):
+        index = histogram.index(units)
+        assert histogram.lowest(index) <= units < histogram.lowest(index + 1)
+    assert [histogram.index(units) for units in (31, 32, 33, 34)] == [31, 32, 32, 33]
+    histogram.record(10 ** 9)
+    assert histogram.counts[-1] == 1
+    assert metrics.Histogram(1.0).percentile(0.5) is None
+
+
+def test_histogram_merge():
+    a, b = metrics.Histogram(100), metrics.Histogram(100)
+    for value in (1, 2, 3):
+        a.record(value)
+    b.record(50)
+    a.merge(b)
+    assert (a.count, a.total, a.min, a.max) == (4, 56, 1, 50)
+    assert a.percentile(0.5) == 2
+
+
+def test_session_counters():
+    m = metrics.SessionMetrics()
+    m.received(acpi.i_frame2(0, 0) + M_ME_TF_1)
+    m.received(acpi.s_frame2(1))
+    m.sent(acpi.i_frame2(0, 1), M_ME_TF_1)
+    m.sent(acpi.TESTFR_ACT)
+    snapshot = m.snapshot()
+    assert snapshot['frames'] == {'in': {'I': 1, 'S': 1, 'U': 0}, 'out': {'I': 1, 'S': 0, 'U': 1}}
+    assert snapshot['bytes'] == {'in': {'I': 27, 'S': 6, 'U': 0}, 'out': {'I': 27, 'S': 0, 'U': 6}}
+    assert snapshot['asdus'] == {'in': {'M_ME_TF_1': 1}, 'out': {'M_ME_TF_1': 1}}
+    assert snapshot['decode']['count'] == 0
+
+
+def test_session_fold():
+    m = metrics.SessionMetrics()
+    m.types_in.extend([36, 36, 1])
+    m.decode_in.append(0.000012)
+    other = metrics.SessionMetrics()
+    other.types_in.append(1)
+    m.merge(other)
+    assert (len(m.types_in), len(m.decode_in), len(other.types_in)) == (0, 0, 0)
+    assert dict(m.asdus(metrics.IN)) == {'M_SP_NA_1': 2, 'M_ME_TF_1': 2}
+    assert m.decode.count == 1
+    m.types_in.append(36)
+    assert m.frames(metrics.IN) == (5, 0, 0)
+
+
+def test_registry_reconnects():
+    registry = metrics.Registry()
+    first = registry.session(('10.0.0.1', 50000), '10.0.0.1')
+    first.received(acpi.STARTDT_ACT)
+    registry.session(('10.0.0.2', 50001), '10.0.0.2')
+    registry.remove(('10.0.0.1', 50000))
+    second = registry.session(('10.0.0.1', 50002), '10.0.0.1')
+    second.received(acpi.TESTFR_ACT)
+    snapshot = registry.snapshot()
+    assert (snapshot['connections'], snapshot['reconnects']) == (3, 1)
+    assert sorted(snapshot['sessions']) == ['10.0.0.1:50002', '10.0.0.2:50001']
+    # Closed sessions stay in the totals
+    assert snapshot['total']['frames']['in']['U'] == 2
+
+
+def test_prometheus():
+    registry = metrics.Registry()
+    m = registry.session('a')
+    m.received(acpi.i_frame2(0, 0) + M_ME_TF_1)
+    m.decode.record(0.000012)
+    m.ack_rtt.record(0.5)
+    text = registry.prometheus()
+    lines = text.splitlines()
+    assert '# TYPE iec104_frames_total counter' in lines
+    assert 'iec104_frames_total{direction="in",kind="I"} 1' in lines
+    assert 'iec104_asdus_total{direction="in",type="M_ME_TF_1"} 1' in lines
+    assert 'iec104_sessions 1' in lines
+    assert 'iec104_decode_seconds_count 1' in lines
+    assert 'iec104_ack_rtt_seconds{quantile="0.5"} 0.5' in lines
+    assert text.endswith('\n')
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from iec104 import acpi
+from iec104 import output
+
+
+def test_frames_go_out_in_one_write():
+    writes = []
+    timers = []
+    buffer = output.OutputBuffer(lambda data: writes.append(data.tobytes()),
+                                 lambda delay, callback: timers.append(callback))
+    buffer.append(acpi.TESTFR_ACT)
+    buffer.append(acpi.i_frame2(0, 0), b'\x01\x02')
+    assert len(timers) == 1
+    assert writes == []
+    timers[0]()
+    assert writes == [b'\x68\x04' + acpi.TESTFR_ACT + b'\x68\x06' + acpi.i_frame2(0, 0) + b'\x01\x02']
+    assert (buffer.flushes, buffer.frames_flushed, buffer.bytes_flushed) == (1, 2, 14)
+    # Nothing left to flush
+    buffer.flush()
+    assert len(writes) == 1
+    buffer.append(acpi.TESTFR_CON)
+    assert len(timers) == 2
+
+
+def test_flush_when_full():
+    writes = []
+    buffer = output.OutputBuffer(lambda data: writes.append(data.tobytes()), size=300)
+    payload = b'\x00' * 140
+    for i in range(3):
+        buffer.append(acpi.i_frame2(i, 0), payload)
+    assert [len(data) for data in writes] == [146 * 2]
+    assert len(buffer) == 146
+    with pytest.raises(ValueError):
+        buffer.append(acpi.i_frame2(0, 0), b'\x00' * 250)
+
+
+def test_append_i_frame():
+    writes = []
+    buffer = output.OutputBuffer(lambda data: writes.append(data.tobytes()), size=270)
+    payload = b'\x00' * 249
+    buffer.append_i_frame(32767, 1, b'\x01\x02')
+    buffer.append(acpi.i_frame2(0, 0), b'\x01\x02')
+    buffer.append_i_frame(1, 2, payload)
+    assert writes == [b'\x68\x06' + acpi.i_frame2(32767, 1) + b'\x01\x02' + b'\x68\x06' + acpi.i_frame2(0, 0) +
+                      b'\x01\x02']
+    buffer.flush()
+    assert writes[1] == b'\x68\xfd' + acpi.i_frame2(1, 2) + payload
+    assert buffer.frames_flushed == 3
+    with pytest.raises(ValueError):
+        buffer.append_i_frame(0, 0, b'\x00' * 250)
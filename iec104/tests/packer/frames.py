@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from iec104 import packer
+from iec104 import typetable
+
+M_ME_NC_1 = typetable.BY_NAME['M_ME_NC_1']
+
+
+def unpack(data):
+    type_id, vsq, cot, orig, ca = packer.ASDU_HEADER.unpack_from(data)
+    info = typetable.get(type_id)
+    assert len(data) + packer.APCI_LENGTH <= packer.APDU_MAX_LENGTH
+    return vsq >> 7, typetable.unpack_objects(info, data, packer.ASDU_HEADER.size, vsq & 0x7F, vsq >> 7)
+
+
+def test_contiguous_sequences():
+    updates = [(1000 + i, float(i), 0) for i in range(100)]
+    asdus = packer.pack(13, updates, 3, 1)
+    # 48 elements fill a SQ=1 APDU: 4 + 6 + 3 + 48 * 5 = 253
+    assert len(asdus) == 3
+    assert len(asdus[0]) + packer.APCI_LENGTH == packer.APDU_MAX_LENGTH
+    decoded = [unpack(data) for data in asdus]
+    assert all(sequence for sequence, objects in decoded)
+    assert sum((objects for sequence, objects in decoded), []) == updates
+
+
+def test_scattered_objects():
+    updates = [(1000 + 2 * i, float(i), 0x80) for i in range(100)]
+    asdus = packer.pack(13, updates, 20, 1)
+    # 30 objects of 8 bytes per SQ=0 ASDU
+    assert len(asdus) == 4
+    decoded = [unpack(data) for data in asdus]
+    assert not any(sequence for sequence, objects in decoded)
+    assert sum((objects for sequence, objects in decoded), []) == updates
+
+
+def test_minimal_frames():
+    # 40 scattered objects around a run of 60: the SQ=0 ASDUs take the ends of the run, 3 ASDUs instead of 5
+    ioas = list(range(0, 40, 2)) + list(range(100, 160)) + list(range(200, 240, 2))
+    chunks = packer.plan(M_ME_NC_1, ioas)
+    assert chunks == [(0, 30, False), (30, 78, True), (78, 100, False)]
+    assert [chunk[0] for chunk in chunks] == [0] + [chunk[1] for chunk in chunks[:-1]]
+    for start, end, sequence in chunks:
+        assert end - start <= packer.capacity(M_ME_NC_1, sequence)
+        if sequence:
+            assert ioas[start:end] == list(range(ioas[start], ioas[start] + end - start))
+
+    # One object per ASDU for commands
+    assert len(packer.pack(45, [(i, 1) for i in range(3)], 6, 1)) == 3
+    assert packer.plan(M_ME_NC_1, []) == []
+
+
+def test_invalid_types():
+    with pytest.raises(ValueError):
+        packer.pack(22, [(1, 0)], 3, 1)
+    with pytest.raises(ValueError):
+        packer.pack(125, [(1, 1, 1, 0, b'')], 13, 1)
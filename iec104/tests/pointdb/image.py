@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from iec104 import packer
+from iec104 import pointdb
+from iec104 import timetag
+from iec104 import typetable
+
+
+def decode(data):
+    type_id, vsq, cot, orig, ca = packer.ASDU_HEADER.unpack_from(data)
+    info = typetable.get(type_id)
+    return type_id, cot, ca, typetable.unpack_objects(info, data, packer.ASDU_HEADER.size, vsq & 0x7F, vsq >> 7)
+
+
+def test_change_detection():
+    points = pointdb.PointDatabase()
+    points.add(1, 100, 13, 10.0, deadband=0.5)
+    points.add(1, 101, 13, 10.0)
+    points.add(2, 5, 1, 0)
+    assert len(points) == 3 and (1, 101) in points
+    assert points.spontaneous() == []
+
+    # Within the deadband: stored but not reported
+    assert not points.set_value(1, 100, 10.4)
+    assert points.get(1, 100)[0] == pytest.approx(10.4)
+    assert points.spontaneous() == []
+    # Relative to the value last reported, not the last value set
+    assert points.set_value(1, 100, 10.6)
+    assert points.set_value(1, 101, 10.0, quality=0x80)
+    assert points.set_value(2, 5, 1)
+    # Dirty points are sent once with their latest value
+    assert points.set_value(2, 5, 0, quality=0x10)
+
+    asdus = [decode(data) for data in points.spontaneous()]
+    assert asdus == [
+        (13, 3, 1, [(100, pytest.approx(10.6), 0), (101, 10.0, 0x80)]),
+        (1, 3, 2, [(5, 0x10)]),
+    ]
+    assert points.spontaneous() == []
+    assert not points.set_value(1, 100, 10.2)
+    assert points.suppressed == 2
+
+
+def test_time_tags():
+    points = pointdb.PointDatabase()
+    points.add(1, 7, 36, 1.5)
+    points.set_value(1, 7, 2.5, timestamp=1500000000.123)
+    (type_id, cot, ca, objects), = [decode(data) for data in points.spontaneous()]
+    assert type_id == 36
+    ioa, value, qds, tag = objects[0]
+    assert timetag.cp56time2a_to_epoch_ms(tag) == 1500000000123
+
+
+def test_interrogation():
+    points = pointdb.PointDatabase()
+    for ioa in range(100):
+        points.add(1, 1000 + ioa, 36, float(ioa))
+    points.add(1, 5000, 30, 1)
+    points.add(2, 1, 13, -1.0)
+
+    asdus = points.interrogation(1)
+    assert not isinstance(asdus, list)
+    asdus = [decode(data) for data in asdus]
+    # Sent without time tag, 48 elements per SQ=1 ASDU
+    assert [(type_id, cot, len(objects)) for type_id, cot, ca, objects in asdus] == [
+        (1, 20, 1), (13, 20, 48), (13, 20, 48), (13, 20, 4)]
+    assert asdus[1][3][:2] == [(1000, 0.0, 0), (1001, 1.0, 0)]
+    assert len(list(points.interrogation())) == 5
+
+    with pytest.raises(ValueError):
+        points.add(1, 1000, 13)
+    with pytest.raises(ValueError):
+        points.add(1, 1, 45)
+
+
+def test_group_interrogation():
+    points = pointdb.PointDatabase()
+    for ioa in range(10):
+        points.add(1, ioa, 13, float(ioa), groups=(1, 16) if ioa % 2 else (2,))
+    asdus = [decode(data) for data in points.interrogation(1, 21, 1)]
+    assert [(cot, [obj[0] for obj in objects]) for type_id, cot, ca, objects in asdus] == [(21, [1, 3, 5, 7, 9])]
+    assert len(decode(next(points.interrogation(1, 36, 16)))[3]) == 5
+    assert list(points.interrogation(1, 23, 3)) == []
+    assert points.common_addresses == set([1])
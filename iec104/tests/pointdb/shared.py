@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import os
+
+import pytest
+
+from iec104 import pointdb
+
+
+def fill(points, count=4):
+    for ioa in range(count):
+        points.add(1, ioa, 13, float(ioa))
+
+
+def test_producer_and_worker():
+    buf = bytearray(pointdb.SharedPointDatabase.size(4))
+    producer = pointdb.SharedPointDatabase(4, buf)
+    fill(producer)
+    worker = pointdb.SharedPointDatabase(4, buf, attach=True)
+    fill(worker)
+    assert worker.get(1, 3)[0] == 3.0
+    worker.sync()
+    assert worker.spontaneous() == []
+
+    producer.set_value(1, 2, 20.0, quality=0x80)
+    assert worker.get(1, 2)[:2] == (20.0, 0x80)
+    assert worker.sync() == 1
+    assert [worker.keys[slot] for slot in worker.changes()] == [(1, 2)]
+    # Seen once only
+    assert worker.sync() == 0
+    assert worker.spontaneous() == []
+
+    # Added with attach=True, the values in the buffer are kept
+    late = pointdb.SharedPointDatabase(4, buf, attach=True)
+    fill(late)
+    assert late.get(1, 2)[:2] == (20.0, 0x80)
+
+
+def test_capacity():
+    points = pointdb.SharedPointDatabase(2)
+    fill(points, 2)
+    with pytest.raises(ValueError):
+        points.add(1, 2, 13)
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_forked_worker():
+    points = pointdb.SharedPointDatabase(4)
+    fill(points)
+    # One pipe per direction, the producer must not read its own go
+    go_read, go_write = os.pipe()
+    result_read, result_write = os.pipe()
+    pid = os.fork()
+    if not pid:
+        # Worker: wait for the producer, then report the changed IOAs
+        try:
+            os.read(go_read, 1)
+            points.sync()
+            os.write(result_write, repr(sorted(points.keys[slot][1] for slot in points.changes())).encode())
+        finally:
+            os._exit(0)
+    points.set_value(1, 1, 11.0)
+    points.set_value(1, 3, 33.0)
+    os.write(go_write, b'x')
+    result = os.read(result_read, 100)
+    os.waitpid(pid, 0)
+    for fd in (go_read, go_write, result_read, result_write):
+        os.close(fd)
+    assert result == b'[1, 3]'
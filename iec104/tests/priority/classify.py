@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+from iec104 import priority
+from iec104 import typetable
+
+
+def asdu(cot):
+    return typetable.HEADER.pack(1, 1, cot, 0, 1) + b'\x00\x00\x00\x01'
+
+
+def test_classify():
+    assert [priority.classify(asdu(cot)) for cot in (3, 5, 7, 7 | 0x40, 10, 44)] == [priority.URGENT] * 6
+    assert [priority.classify(asdu(cot)) for cot in (1, 2, 20, 36, 37, 41)] == [priority.BULK] * 6
+    # Test bit
+    assert priority.classify(asdu(1 | 0x80)) == priority.BULK
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+import sys
+
+import pytest
+
+if sys.version_info[0] > 2:
+    pytest.skip('server.py runs on Python 2', allow_module_level=True)
+
+from iec104 import benchmark
+from iec104 import server
+
+
+@pytest.mark.parametrize('count', [10000, 100000])
+def test_interrogation_frames(count):
+    # Timed as server.interrogation of python -m iec104.benchmark
+    frames, written = benchmark.interrogate(server, benchmark.saturation_points(count))
+    # ACT_CON and ACT_TERM of 16 bytes, 48 elements per SQ=1 ASDU of
+    # 6 + 3 + 48 * 5 bytes, 253 bytes APDU
+    assert frames == 2 + -(-count // 48)
+    assert written == 2 * 16 + (frames - 2) * (2 + 4 + 6 + 3) + count * 5
@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+import logging
+import socket
+import struct
+import sys
+import time
+
+import pytest
+
+if sys.version_info[0] > 2:
+    pytest.skip('server.py runs on Python 2', allow_module_level=True)
+
+import tornado.httpclient
+import tornado.ioloop
+import tornado.iostream
+import tornado.testing
+from tornado import gen
+
+from iec104 import acpi
+from iec104 import benchmark
+from iec104 import framer
+from iec104 import metrics
+from iec104 import pointdb
+from iec104 import priority
+from iec104 import server
+from iec104 import tracing
+from iec104 import typetable
+from iec104 import window
+
+ADDRESS = ('127.0.0.1', 2404)
+M_ME_TF_1 = b'\x24\x01\x03\x00\x14\x29\xcb\xb2\x02\xcd\xcc\x2c\x3e\x00\x94\xdc\x02\x8a\x23\x0a\x0b'
+
+
+class Stream(object):
+    """
+    Collects what a session writes instead of an IOStream.
+    """
+
+    def __init__(self):
+        self.data = bytearray()
+        self.is_closed = False
+
+    def write(self, data):
+        self.data += data
+
+    def closed(self):
+        return self.is_closed
+
+    def close(self):
+        self.is_closed = True
+
+
+def session(**kwargs):
+    srv = server.IEC104Server(**kwargs)
+    srv.ticker.stop()
+    m = None if srv.registry is None else srv.registry.session(ADDRESS, ADDRESS[0])
+    c = server.Session(ADDRESS, Stream(), window.SlidingWindow(srv.k, srv.w, srv.t2), srv, metrics=m)
+    srv.sessions[ADDRESS] = c
+    return srv, c
+
+
+def frames(c):
+    """
+    :return: APDUs written since the last call, without start byte and length.
+    """
+    c.output.flush()
+    data = bytes(c.stream.data)
+    del c.stream.data[:]
+    return [frame.tobytes() for frame in framer.APDUFramer().feed(data)]
+
+
+def asdus(c):
+    """
+    :return: Type id, COT, CA and number of objects of the I-frames written since the last call.
+    """
+    result = []
+    for frame in frames(c):
+        assert ord(frame[0:1]) & 1 == 0
+        type_id, vsq, cot, orig, ca = typetable.HEADER.unpack_from(frame, 4)
+        result.append((type_id, cot, ca, vsq & 0x7F))
+    return result
+
+
+def image(count=3):
+    points = pointdb.PointDatabase()
+    for ioa in range(count):
+        points.add(1, 100 + ioa, 13, float(ioa), groups=(1,) if ioa % 2 else ())
+    points.add(2, 5, 1, 1)
+    return points
+
+
+def test_t1_unacknowledged_i_frames():
+    srv, c = session(t1=0.2, tick=0.05)
+    c.send_asdu(M_ME_TF_1)
+    assert frames(c) == [acpi.i_frame2(0, 0) + M_ME_TF_1]
+    assert (ADDRESS, 't1') in srv.timers
+    # The peer answers TESTFR_ACT, but does not acknowledge the I-frame
+    time.sleep(0.1)
+    c.test_sent = None
+    srv.expire()
+    assert not c.stream.closed()
+    time.sleep(0.2)
+    srv.expire()
+    assert c.stream.closed()
+
+
+def test_t1_acknowledged_i_frames():
+    srv, c = session(t1=0.2, tick=0.05)
+    c.send_asdu(M_ME_TF_1)
+    assert c.acknowledged(1)
+    time.sleep(0.3)
+    srv.expire()
+    assert not c.stream.closed()
+    assert (ADDRESS, 't1') not in srv.timers
+
+
+def test_interrogation():
+    srv, c = session(points=image())
+    c.interrogate(1, server.QOI_STATION, server.ACTIVATION)
+    assert asdus(c) == [(100, server.ACTIVATION_CON, 1, 1), (13, 20, 1, 3), (100, server.ACTIVATION_TERMINATION, 1, 1)]
+    assert c.interrogation is None
+    # Group 1 only has the odd IOAs
+    c.interrogate(1, server.QOI_STATION + 1, server.ACTIVATION)
+    assert asdus(c) == [(100, server.ACTIVATION_CON, 1, 1), (13, 21, 1, 1), (100, server.ACTIVATION_TERMINATION, 1, 1)]
+
+
+def test_interrogation_broadcast():
+    srv, c = session(points=image())
+    c.interrogate(server.BROADCAST, server.QOI_STATION, server.ACTIVATION)
+    assert asdus(c) == [(100, server.ACTIVATION_CON, server.BROADCAST, 1), (13, 20, 1, 3), (1, 20, 2, 1),
+                        (100, server.ACTIVATION_TERMINATION, server.BROADCAST, 1)]
+
+
+def test_interrogation_negative():
+    srv, c = session(points=image(), k=2, w=2)
+    c.interrogate(1, server.QOI_STATION, 5)
+    c.interrogate(9, server.QOI_STATION, server.ACTIVATION)
+    assert asdus(c) == [(100, server.UNKNOWN_CAUSE | server.NEGATIVE, 1, 1),
+                        (100, server.UNKNOWN_COMMON_ADDRESS | server.NEGATIVE, 9, 1)]
+    assert c.acknowledged(2)
+    c.interrogate(1, server.QOI_STATION + 17, server.ACTIVATION)
+    assert asdus(c) == [(100, server.ACTIVATION_CON | server.NEGATIVE, 1, 1)]
+    # Another interrogation while one is running
+    c.interrogate(1, server.QOI_STATION, server.ACTIVATION)
+    c.interrogate(1, server.QOI_STATION, server.ACTIVATION)
+    assert asdus(c) == [(100, server.ACTIVATION_CON, 1, 1)]
+    # Queued ASDUs go before the image
+    assert c.acknowledged(4)
+    assert asdus(c) == [(100, server.ACTIVATION_CON | server.NEGATIVE, 1, 1), (13, 20, 1, 3)]
+    assert c.acknowledged(6)
+    assert asdus(c) == [(100, server.ACTIVATION_TERMINATION, 1, 1)]
+
+
+def test_interrogation_follows_window():
+    # Every second IOA: SQ=0 ASDUs of 30 objects, generated as the window opens
+    points = pointdb.PointDatabase()
+    for ioa in range(0, 600, 2):
+        points.add(1, ioa, 13, float(ioa))
+    srv, c = session(points=points, k=4, w=4)
+    c.interrogate(1, server.QOI_STATION, server.ACTIVATION)
+    assert len(asdus(c)) == 4
+    assert c.interrogation is not None
+    received = 4
+    while True:
+        assert c.acknowledged(received)
+        sent = len(asdus(c))
+        if not sent:
+            break
+        assert sent <= 4
+        received += sent
+    # ACT_CON, 300 / 30 ASDUs, ACT_TERM
+    assert received == 12
+    assert c.interrogation is None
+
+
+def test_broadcast():
+    srv, c = session()
+    # The window of the second session holds one I-frame
+    c2 = server.Session(('127.0.0.1', 2405), Stream(), window.SlidingWindow(1, 1, srv.t2), srv)
+    srv.sessions[('127.0.0.1', 2405)] = c2
+    assert srv.broadcast([M_ME_TF_1, bytearray(M_ME_TF_1[:6])]) == 2
+    assert frames(c) == [acpi.i_frame2(0, 0) + M_ME_TF_1, acpi.i_frame2(1, 0) + M_ME_TF_1[:6]]
+    assert frames(c2) == [acpi.i_frame2(0, 0) + M_ME_TF_1]
+    # Queued as immutable copy
+    assert [data for queued, data in c2.queues[priority.URGENT]] == [M_ME_TF_1[:6]]
+    assert isinstance(c2.queues[priority.URGENT][0][1], bytes)
+    assert c2.acknowledged(1)
+    assert frames(c2) == [acpi.i_frame2(1, 0) + M_ME_TF_1[:6]]
+    assert srv.broadcast([M_ME_TF_1], [c]) == 1
+    assert (len(frames(c)), len(frames(c2))) == (1, 0)
+
+
+def test_publish():
+    points = image()
+    srv, c = session(points=points)
+    points.sync()
+    points.changes()
+    assert srv.publish() == 0
+    points.set_value(1, 100, 5.0)
+    points.set_value(2, 5, 0)
+    assert srv.publish() == 2
+    assert asdus(c) == [(13, 3, 1, 1), (1, 3, 2, 1)]
+    srv.remove(ADDRESS)
+
+
+def test_publish_subscriptions():
+    points = image()
+    srv, c = session(points=points)
+    owners = {}
+    for port, subscription in ((2405, (1, 101, 199)), (2406, (2, 0, 10))):
+        address = ('127.0.0.1', port)
+        owners[port] = srv.sessions[address] = server.Session(
+            address, Stream(), window.SlidingWindow(srv.k, srv.w, srv.t2), srv)
+        srv.subscribe(address, *subscription)
+    points.changes()
+    for ca, ioa, value in ((1, 100, 5.0), (1, 101, 6.0), (2, 5, 0)):
+        points.set_value(ca, ioa, value)
+    # All points, IOA 101 and the point of CA 2
+    assert srv.publish() == 4
+    assert asdus(c) == [(13, 3, 1, 2), (1, 3, 2, 1)]
+    assert asdus(owners[2405]) == [(13, 3, 1, 1)]
+    assert asdus(owners[2406]) == [(1, 3, 2, 1)]
+    srv.unsubscribe(('127.0.0.1', 2405))
+    srv.remove(('127.0.0.1', 2406))
+    points.set_value(2, 5, 1)
+    assert srv.publish() == 1
+    assert asdus(c) == asdus(owners[2405]) == [(1, 3, 2, 1)]
+    assert asdus(owners[2406]) == []
+
+
+def test_priority():
+    srv, c = session(points=image(), k=2, w=1)
+    cyclic = M_ME_TF_1[:2] + b'\x01' + M_ME_TF_1[3:]
+    ca = typetable.HEADER.unpack_from(M_ME_TF_1)[4]
+    c.send_asdus([cyclic] * 3)
+    c.interrogate(1, server.QOI_STATION, server.ACTIVATION)
+    assert asdus(c) == [(36, 1, ca, 1)] * 2
+    # Confirmation and event overtake the cyclic data and the interrogation
+    c.send_asdu(M_ME_TF_1)
+    assert c.acknowledged(2)
+    assert asdus(c) == [(100, 7, 1, 1), (36, 3, ca, 1)]
+    assert c.acknowledged(4)
+    assert asdus(c) == [(36, 1, ca, 1), (13, 20, 1, 3)]
+    assert c.acknowledged(6)
+    assert asdus(c) == [(100, 10, 1, 1)]
+    queued = srv.registry.snapshot()['sessions']['127.0.0.1:2404']['queued']
+    # Once per ASDU sent from the queue
+    assert (queued['urgent']['count'], queued['bulk']['count']) == (2, 3)
+
+
+def test_saturation():
+    points = benchmark.saturation_points(1000)
+    urgent, m = benchmark.saturate(server, points, events=10, cyclic=100)
+    assert urgent == [0] * 10
+    assert m.queued[priority.URGENT].count >= 10
+    fifo, m = benchmark.saturate(server, points, priority.BULK, events=10, cyclic=100)
+    # Behind the cyclic data queued first
+    assert max(fifo) >= 100
+
+
+@pytest.mark.parametrize('asdu', [b'', b'\x0d\x01'])
+def test_short_i_frame_closes_connection(asdu):
+    srv, c = session()
+    ours, theirs = socket.socketpair()
+    c.stream = tornado.iostream.IOStream(ours)
+    # In sequence, only the length is wrong
+    for data in (acpi.i_frame2(0, 0) + asdu, acpi.TESTFR_ACT):
+        theirs.sendall(b'\x68' + struct.pack('B', len(data)) + data)
+
+    @gen.coroutine
+    def wait():
+        c.receive()
+        for i in range(100):
+            if c.stream.closed():
+                break
+            yield gen.sleep(0.01)
+    tornado.ioloop.IOLoop.current().run_sync(wait)
+    theirs.close()
+    assert c.stream.closed()
+    assert c.window.frames_received == 0
+
+
+def test_protocol_error_dumps_trace(caplog):
+    srv, c = session()
+    c.trace = tracing.FrameTrace(size=8, every=2)
+    for rsn in range(3):
+        c.send(acpi.s_frame2(rsn))
+    with caplog.at_level(logging.DEBUG):
+        # Nothing was sent that N(R) 5 could acknowledge
+        assert not c.acknowledged(5)
+    assert c.stream.closed()
+    assert [(r.levelno, r.getMessage()) for r in caplog.records[-2:-1]] == [
+        (logging.WARNING, 'N(R) 5 acknowledges unsent I-frames')]
+    assert caplog.records[-1].getMessage().splitlines()[0] == 'Frames of 127.0.0.1:2404: 2 of 3 frames kept'
+    assert [frame for timestamp, direction, frame in c.trace.records()] == [acpi.s_frame2(0), acpi.s_frame2(2)]
+
+
+def test_metrics():
+    srv, c = session(points=image())
+    c.interrogate(1, server.QOI_STATION, server.ACTIVATION)
+    c.send(acpi.TESTFR_ACT)
+    assert c.acknowledged(3)
+    snapshot = srv.registry.snapshot()['sessions']['127.0.0.1:2404']
+    assert snapshot['frames']['out'] == {'I': 3, 'S': 0, 'U': 1}
+    assert snapshot['asdus']['out'] == {'C_IC_NA_1': 2, 'M_ME_NC_1': 1}
+    written = frames(c)
+    assert snapshot['bytes']['out'] == {'I': sum(len(frame) + 2 for frame in written[:3]), 'S': 0, 'U': 6}
+    # Window occupancy once per flush: ACT_CON, then the image and ACT_TERM
+    assert (snapshot['ack_rtt']['count'], snapshot['window']['count'], snapshot['window']['max']) == (3, 2, 3)
+    srv.remove(ADDRESS)
+    assert srv.registry.snapshot()['sessions'] == {}
+    assert srv.registry.total().frames(metrics.OUT) == (3, 0, 1)
+
+
+def test_listen_metrics():
+    srv, c = session()
+    sock, port = tornado.testing.bind_unused_port()
+    sock.close()
+    http = srv.listen_metrics(port, '127.0.0.1')
+    try:
+        response = tornado.ioloop.IOLoop.current().run_sync(
+            lambda: tornado.httpclient.AsyncHTTPClient().fetch('http://127.0.0.1:{}/metrics'.format(port)))
+    finally:
+        http.stop()
+    assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+    assert b'iec104_sessions 1\n' in response.body
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import csv
+import os
+import sqlite3
+
+from iec104 import packer
+from iec104 import sinks
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+def asdu(count, start=0):
+    return packer.pack(13, [(start + i, float(i), 0) for i in range(count)], 3, 1)[0]
+
+
+def test_batches():
+    batches = []
+    pipeline = sinks.Pipeline(batch_size=4)
+    pipeline.add(sinks.CallbackSink(batches.append))
+    assert pipeline.put_asdu(asdu(10), received=5.0) == 10
+    # Full batches right away, the rest on flush
+    assert [len(batch) for batch in batches] == [4, 4]
+    assert batches[0][1] == (5.0, 1, 1, 13, 3, 1.0, 0, 5.0)
+    pipeline.flush()
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+    assert (pipeline.rows, pipeline.batches) == (10, 3)
+    # Commands are not points
+    assert pipeline.put_asdu(packer.pack(100, [(0, 20)], 6, 1)[0]) == 0
+
+
+def test_large_extend():
+    batches = []
+    pipeline = sinks.Pipeline(batch_size=3)
+    pipeline.add(sinks.CallbackSink(batches.append))
+    pipeline.extend(range(100000))
+    assert (len(batches), pipeline.batch) == (33333, [99999])
+    assert batches[0] == [0, 1, 2] and batches[-1] == [99996, 99997, 99998]
+    pipeline.flush()
+    assert batches[-1] == [99999] and pipeline.batch == []
+
+
+def test_time_window():
+    scheduled = []
+    batches = []
+    pipeline = sinks.Pipeline(batch_size=100, delay=0.5, schedule=lambda delay, callback: scheduled.append(callback))
+    pipeline.add(sinks.CallbackSink(batches.append))
+    pipeline.put_asdu(asdu(2))
+    pipeline.put_asdu(asdu(2, 2))
+    assert len(scheduled) == 1 and batches == []
+    scheduled.pop()()
+    assert [len(batch) for batch in batches] == [4]
+
+
+def test_queue_backpressure():
+    q = queue.Queue(1)
+    pipeline = sinks.Pipeline(batch_size=2)
+    pipeline.add(sinks.QueueSink(q))
+    pipeline.put_asdu(asdu(2))
+    assert not pipeline.full()
+    pipeline.put_asdu(asdu(4, 2))
+    # Two batches wait in the backlog until the consumer takes the first one
+    assert pipeline.full()
+    assert [row[2] for row in q.get_nowait()] == [0, 1]
+    assert pipeline.full()
+    assert [row[2] for row in q.get_nowait()] == [2, 3]
+    assert not pipeline.full()
+    assert [row[2] for row in q.get_nowait()] == [4, 5]
+
+
+def test_csv_rotation(tmpdir):
+    path = str(tmpdir.join('points.csv'))
+    pipeline = sinks.Pipeline(batch_size=10)
+    pipeline.add(sinks.CSVSink(path, max_bytes=1000, backups=2))
+    for i in range(10):
+        pipeline.put_asdu(asdu(10, i * 10), received=1.0)
+    pipeline.close()
+    assert sorted(os.listdir(str(tmpdir))) == ['points.csv', 'points.csv.1', 'points.csv.2']
+    with open(path) as f:
+        rows = list(csv.reader(f))
+    assert tuple(rows[0]) == sinks.FIELDS
+    assert rows[-1][:3] == ['1.0', '1', '99']
+
+
+def test_sqlite_in_thread(tmpdir):
+    path = str(tmpdir.join('points.db'))
+    pipeline = sinks.Pipeline(batch_size=48)
+    sink = pipeline.add(sinks.ThreadSink(sinks.SQLiteSink(path), maxsize=2))
+    for i in range(10):
+        pipeline.put_asdu(asdu(48, i * 48))
+    assert sink.queue.maxsize == 2
+    pipeline.close()
+    connection = sqlite3.connect(path)
+    assert connection.execute('SELECT COUNT(*), MAX(ioa) FROM points').fetchone() == (480, 479)
+    connection.close()
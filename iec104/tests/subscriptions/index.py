@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from iec104 import asdu
+from iec104 import subscriptions
+from iec104 import typetable
+
+
+def test_match_ranges():
+    index = subscriptions.SubscriptionIndex()
+    index.subscribe('a', 1, 100, 199)
+    index.subscribe('b', 1, 150, 299)
+    index.subscribe('a', 1, 250, 250)
+    assert [sorted(index.match(1, ioa)) for ioa in (0, 99, 100, 149, 150, 199, 200, 250, 251, 299, 300)] == [
+        [], [], ['a'], ['a'], ['a', 'b'], ['a', 'b'], ['b'], ['a', 'b'], ['b'], ['b'], []]
+    # Only common address 1
+    assert index.match(2, 150) == subscriptions.NOBODY
+    # Equal subscribers share one frozenset
+    assert index.match(1, 160) is index.match(1, 250)
+
+
+def test_all_common_addresses():
+    index = subscriptions.SubscriptionIndex()
+    index.subscribe('all', None)
+    index.subscribe('low', None, 0, 9)
+    index.subscribe('ca', 0x102, 5, 5)
+    assert sorted(index.match(7, 3)) == ['all', 'low']
+    assert sorted(index.match(0x102, 5)) == ['all', 'ca', 'low']
+    assert sorted(index.match(0x102, subscriptions.MAX_IOA)) == ['all']
+
+
+def test_casdu_of_header():
+    header = asdu.cASDU()
+    header.casdu1, header.casdu2 = 45, 50
+    ca = typetable.HEADER.unpack_from(header.bytes())[-1]
+    assert subscriptions.casdu(header.casdu1, header.casdu2) == ca
+    index = subscriptions.SubscriptionIndex()
+    index.subscribe('station', subscriptions.casdu(header.casdu1, header.casdu2))
+    assert index.match(ca, 1) == {'station'}
+
+
+def test_unsubscribe():
+    index = subscriptions.SubscriptionIndex()
+    index.subscribe('a', 1, 0, 10)
+    index.subscribe('b', 1, 5, 10)
+    assert len(index) == 2 and 'a' in index
+    assert sorted(index.match(1, 7)) == ['a', 'b']
+    index.unsubscribe('a')
+    index.unsubscribe('missing')
+    assert 'a' not in index
+    assert sorted(index.match(1, 7)) == ['b']
+    assert index.match(1, 3) == subscriptions.NOBODY
+    with pytest.raises(ValueError):
+        index.subscribe('a', 1, 10, 5)
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from iec104 import timerwheel
+
+
+def test_expire_in_order():
+    wheel = timerwheel.TimerWheel(1.0, 8, now=100)
+    wheel.schedule('a', 100, 3)
+    wheel.schedule('b', 100, 1.5)
+    wheel.schedule('c', 100, 20)
+    assert wheel.advance(101) == []
+    assert wheel.advance(102) == ['b']
+    assert wheel.advance(103) == ['a']
+    assert len(wheel) == 1
+    # 'c' shares a slot with earlier rounds but must not fire before its deadline
+    assert wheel.advance(115) == []
+    assert wheel.advance(120) == ['c']
+    assert len(wheel) == 0
+
+
+def test_reschedule_and_cancel():
+    wheel = timerwheel.TimerWheel(1.0, 8, now=0)
+    wheel.schedule('a', 0, 2)
+    wheel.schedule('a', 1, 5)
+    wheel.schedule('b', 0, 2)
+    wheel.cancel('b')
+    wheel.cancel('missing')
+    assert 'b' not in wheel
+    assert wheel.advance(3) == []
+    assert wheel.advance(6) == ['a']
+
+
+def test_advance_after_long_pause():
+    wheel = timerwheel.TimerWheel(0.5, 4, now=0)
+    for i in range(10):
+        wheel.schedule(i, 0, i)
+    assert sorted(wheel.advance(1000)) == list(range(10))
+    wheel.schedule('next', 1000, 0)
+    assert wheel.advance(1000.5) == ['next']
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import calendar
+import struct
+
+import pytest
+
+from iec104 import timetag
+
+CP56TIME2A = b'\x39\x30\x0a\x83\x84\x08\x10'
+EPOCH_MS = calendar.timegm((2016, 8, 4, 3, 10, 12)) * 1000 + 345
+
+
+def test_cp56time2a():
+    assert timetag.unpack_cp56time2a(CP56TIME2A) == (2016, 8, 4, 3, 10, 12345, 4, False, True)
+    assert timetag.pack_cp56time2a(2016, 8, 4, 3, 10, 12345, 4, su=True) == CP56TIME2A
+    assert timetag.cp56time2a_to_epoch_ms(b'\x00' + CP56TIME2A, 1) == EPOCH_MS
+    assert timetag.epoch_ms_to_cp56time2a(EPOCH_MS, su=True) == CP56TIME2A
+
+
+def test_civil_days():
+    for year, month, day in ((1970, 1, 1), (2000, 2, 29), (2024, 12, 31), (2099, 3, 1)):
+        days = timetag.days_from_civil(year, month, day)
+        assert days == calendar.timegm((year, month, day, 0, 0, 0)) // 86400
+        assert timetag.civil_from_days(days) == (year, month, day)
+
+
+def test_cp24time2a():
+    assert timetag.unpack_cp24time2a(timetag.pack_cp24time2a(59, 59999, iv=True)) == (59, 59999, True)
+
+
+def elements(count):
+    # M_ME_TF_1 sequence elements: value, QDS, time tag; every 10th time tag invalid
+    epoch_ms = [EPOCH_MS + i * 1001 for i in range(count)]
+    data = b''.join(struct.pack('<fB', i, 0) + timetag.epoch_ms_to_cp56time2a(ms, iv=i % 10 == 0)
+                    for i, ms in enumerate(epoch_ms))
+    return epoch_ms, data
+
+
+@pytest.mark.parametrize('vectorized', [True, False])
+def test_epoch_ms_array(monkeypatch, vectorized):
+    if not vectorized:
+        monkeypatch.setattr(timetag, 'numpy', None)
+    elif timetag.numpy is None:
+        pytest.skip('NumPy is not installed')
+    epoch_ms, data = elements(100)
+    values, invalid = timetag.cp56time2a_to_epoch_ms_array(data, 100, 5, 12)
+    assert [int(ms) for ms in values] == epoch_ms
+    assert [bool(iv) for iv in invalid] == [i % 10 == 0 for i in range(100)]
+    if vectorized:
+        assert str(values.view('datetime64[ms]')[0]) == '2016-08-04T03:10:12.345'
+
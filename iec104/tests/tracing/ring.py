@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from iec104 import acpi
+from iec104 import asdu
+from iec104 import tracing
+
+from bitstring import ConstBitStream
+
+M_ME_TF_1 = b'\x24\x01\x03\x00\x14\x29\xcb\xb2\x02\xcd\xcc\x2c\x3e\x00\x94\xdc\x02\x8a\x23\x0a\x0b'
+
+
+class Counted(object):
+    """
+    Counts how often it is formatted.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __str__(self):
+        self.count += 1
+        return 'counted'
+
+
+def test_sampling():
+    trace = tracing.FrameTrace(size=4, every=3)
+    for ssn in range(9):
+        trace.record(tracing.IN, memoryview(acpi.i_frame2(ssn, 0)), None, float(ssn))
+    # The first frame and every third after it
+    assert [(timestamp, frame) for timestamp, direction, frame in trace.records()] == [
+        (0.0, acpi.i_frame2(0, 0)), (3.0, acpi.i_frame2(3, 0)), (6.0, acpi.i_frame2(6, 0))]
+    assert (trace.seen, trace.kept) == (9, 3)
+
+
+def test_ring_keeps_newest():
+    trace = tracing.FrameTrace(size=3)
+    for rsn in range(5):
+        trace.record(tracing.OUT, acpi.s_frame2(rsn), None, float(rsn))
+    trace.record(tracing.OUT, acpi.i_frame2(5, 0), M_ME_TF_1, 5.0)
+    assert trace.records() == [(3.0, tracing.OUT, acpi.s_frame2(3)), (4.0, tracing.OUT, acpi.s_frame2(4)),
+                               (5.0, tracing.OUT, acpi.i_frame2(5, 0) + M_ME_TF_1)]
+
+
+def test_dump(caplog):
+    trace = tracing.FrameTrace(size=2)
+    trace.record(tracing.IN, acpi.TESTFR_ACT, None, 1.5)
+    trace.record(tracing.OUT, acpi.TESTFR_CON, None, 2.0)
+    with caplog.at_level(logging.WARNING):
+        trace.dump(logging.getLogger(), reason='Frames')
+    assert caplog.records[-1].getMessage().splitlines() == [
+        'Frames: 2 of 2 frames kept', '1.500000 in  43000000', '2.000000 out 83000000']
+
+
+def test_not_formatted_above_level(caplog):
+    counted = Counted()
+    log = logging.getLogger()
+    with caplog.at_level(logging.INFO):
+        log.debug('%s', tracing.Lazy(str, counted))
+        assert counted.count == 0
+        log.info('%s %s', tracing.Lazy(str, counted), tracing.Hex(memoryview(b'\x68\x04')))
+    assert counted.count
+    assert caplog.records[-1].getMessage() == 'counted 6804'
+
+
+def test_decode_without_hex_dump(caplog, monkeypatch):
+    def hex_dump(data):
+        raise AssertionError('hex dump made below DEBUG')
+    monkeypatch.setattr(tracing, 'Hex', hex_dump)
+    with caplog.at_level(logging.INFO):
+        o_asdu = asdu.ASDU(ConstBitStream(bytes=M_ME_TF_1))
+    assert abs(o_asdu.objs[0].val - 0.16875) < 1e-6
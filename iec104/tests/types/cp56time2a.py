@@ -1,5 +1,26 @@
 # -*- coding: utf-8 -*-
+from datetime import datetime
+
+from iec104 import asdu
+from iec104 import types
+
+# 2016-08-04 03:10:12.345, thursday, summer time
+CP56TIME2A = b'\x39\x30\x0a\x83\x84\x08\x10'
 
 
 def test_cp56time2a():
-    pass
+    assert types.cp56time2a_to_time(CP56TIME2A) == datetime(2016, 8, 4, 3, 10, 12, 345000)
+    assert types.time_to_cp56time2a(datetime(2016, 8, 4, 3, 10, 12, 345000), su=True) == CP56TIME2A
+
+
+def test_cCP56Time2a_bytes():
+    time = asdu.cCP56Time2a()
+    time.milis = 12345
+    time.minute = 10
+    time.hour = 3
+    time.su = True
+    time.dow = 4
+    time.dom = 4
+    time.month = 8
+    time.year = 16
+    assert time.bytes() == CP56TIME2A
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+import struct
+
+from iec104 import asdu
+from iec104 import typetable
+
+
+def test_table():
+    assert len([info for info in typetable.TYPES if info]) == 67
+    for info in typetable.TYPES:
+        if info is None:
+            continue
+        assert typetable.BY_NAME[info.name] is info
+        assert info.time == 0 or info.layout.endswith('{}s'.format(info.time))
+        # Commands carry one object and are never sent as sequence
+        assert not (info.single and info.sequence)
+    assert typetable.get(36).size == 12
+    assert typetable.get(-1) is None
+    assert typetable.get(22) is None
+
+
+def test_pack_unpack_objects():
+    info = typetable.BY_NAME['M_ME_TE_1']
+    objects = [(100, -5, 0x80, b'\x01\x02\x03\x04\x05\x06\x07'), (101, 7, 0, b'\x07\x06\x05\x04\x03\x02\x01')]
+    for sequence in (0, 1):
+        data = typetable.pack_objects(info, objects, sequence)
+        assert len(data) == 3 + 2 * info.size + (0 if sequence else 3)
+        assert typetable.unpack_objects(info, data, 0, 2, sequence) == objects
+
+    segment = typetable.BY_NAME['F_SG_NA_1']
+    data = typetable.pack_objects(segment, [(1, 2, 3, 4, b'abcd')], 0)
+    assert typetable.unpack_objects(segment, data, 0, 1, 0) == [(1, 2, 3, 4, b'abcd')]
+
+
+def test_asdu_decodes_table_types():
+    # M_ME_NB_1 has no decoder of its own in asdu, SQ=1 with two elements
+    data = struct.pack('<BBBBH', 11, 0x82, 3, 0, 1) + b'\x0A\x00\x00' + struct.pack('<hBhB', -2, 0, 3, 0x80)
+    o_asdu = asdu.ASDU.from_buffer(data)
+    assert [(o.ioa, o.values) for o in o_asdu.objs] == [(10, (-2, 0)), (11, (3, 0x80))]
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from iec104 import packer
+from iec104 import pointdb
+from iec104 import timetag
+from iec104 import valuestore
+
+
+def test_latest_values():
+    store = valuestore.ValueStore(capacity=2)
+    changed = []
+    store.subscribe(changed.append)
+    asdu, = packer.pack(13, [(100 + i, float(i), 0) for i in range(3)], 3, 1)
+    assert store.update(asdu, received=10.0) == 3
+    assert changed == [[(1, 100), (1, 101), (1, 102)]]
+    assert store.get(1, 101) == (1.0, 0, 10.0)
+    assert store.get(2, 101) is None
+
+    # Only points whose value or quality changed are passed to subscribers
+    asdu, = packer.pack(13, [(100, 0.0, 0), (101, 1.0, 0x80), (102, 5.0, 0)], 3, 1)
+    store.update(asdu, received=11.0)
+    assert changed[1] == [(1, 101), (1, 102)]
+    assert store.get(1, 100) == (0.0, 0, 11.0)
+    assert (store.updates, store.changes) == (6, 5)
+
+    # Commands and system information are not stored
+    assert store.update(packer.pack(100, [(0, 20)], 6, 1)[0]) == 0
+    store.unsubscribe(changed.append)
+
+
+def test_types_and_time_tags():
+    store = valuestore.ValueStore()
+    points = pointdb.PointDatabase()
+    points.add(1, 1, 31, 2, quality=0x80)  # M_DP_TB_1
+    points.add(1, 2, 21, -7)  # M_ME_ND_1
+    points.add(1, 3, 36, 2.5, timestamp=1500000000.125)  # M_ME_TF_1
+    for asdu in points.interrogation():
+        store.update(asdu, received=1.0)
+    assert store.get(1, 1) == (2, 0x80, 1.0)
+    assert store.get(1, 2) == (-7, 0, 1.0)
+    points.set_value(1, 3, 3.5, timestamp=1500000000.125)
+    for asdu in points.spontaneous():
+        store.update(asdu, received=2.0)
+    assert store.get(1, 3) == (3.5, 0, 1500000000.125)
+    assert store.type_ids[store.index[(1, 3)]] == 36
+
+
+def test_snapshot_views():
+    if valuestore.numpy is None:
+        pytest.skip('NumPy is not installed')
+    store = valuestore.ValueStore(capacity=4)
+    asdu, = packer.pack(13, [(i, float(i), 0) for i in range(4)], 3, 1)
+    store.update(asdu)
+    keys, type_ids, values, qualities, timestamps = store.snapshot()
+    assert keys == [(1, i) for i in range(4)]
+    assert list(values) == [0.0, 1.0, 2.0, 3.0]
+    with pytest.raises(ValueError):
+        values[0] = 1.0
+    # Views follow updates in place
+    asdu, = packer.pack(13, [(0, 10.0, 0)], 3, 1)
+    store.update(asdu)
+    assert values[0] == 10.0
+    # Not after the store grew, they have to be taken again
+    asdu, = packer.pack(13, [(4, 4.0, 0)], 3, 1)
+    store.update(asdu)
+    asdu, = packer.pack(13, [(0, 20.0, 0)], 3, 1)
+    store.update(asdu)
+    assert list(values) == [10.0, 1.0, 2.0, 3.0]
+    assert list(store.snapshot()[2]) == [20.0, 1.0, 2.0, 3.0, 4.0]
+
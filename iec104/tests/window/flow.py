@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from iec104 import window
+
+
+def test_send_blocks_at_k():
+    w = window.SlidingWindow(k=3, w=2)
+    assert [w.send(0.0)[0] for i in range(3)] == [0, 1, 2]
+    assert w.outstanding == 3
+    assert not w.can_send()
+    with pytest.raises(ValueError):
+        w.send(0.0)
+    assert w.acknowledged(2, 0.5)
+    assert w.outstanding == 1
+    assert w.can_send()
+    assert w.ack_count == 2
+    assert w.ack_latency_max == 0.5
+    # N(R) beyond V(S)
+    assert not w.acknowledged(5, 1.0)
+    assert w.stats()['max_outstanding'] == 3
+
+
+def test_acknowledge_every_w_or_t2():
+    w = window.SlidingWindow(k=12, w=3, t2=10)
+    for ssn in range(2):
+        assert w.received(ssn, 1.0)
+        assert not w.ack_due(1.0)
+    assert w.deadline == 11.0
+    assert w.ack_due(11.0)
+    assert w.received(2, 2.0)
+    assert w.ack_due(2.0)
+    assert w.acknowledge() == 3
+    assert w.deadline is None
+    assert not w.received(5, 3.0)
+    # An I-frame carries N(R) and acknowledges as well
+    assert w.received(3, 3.0)
+    assert w.send(3.0) == (0, 4)
+    assert w.unacknowledged == 0
+
+
+def test_sequence_wraps():
+    w = window.SlidingWindow()
+    w.vs = w.ack = w.vr = window.MODULO - 1
+    assert w.send(0.0)[0] == window.MODULO - 1
+    assert w.send(0.0)[0] == 0
+    assert w.acknowledged(1, 0.0)
+    assert w.outstanding == 0
+    assert w.received(window.MODULO - 1, 0.0)
+    assert w.received(0, 0.0)
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+
+class TimerWheel(object):
+    """
+    Hashed timing wheel. Scheduling and cancelling a timer are O(1), advance()
+    only looks at the slots of the ticks that passed instead of at every timer.
+
+    Timers are identified by a hashable key, scheduling a key again moves it.
+    """
+
+    def __init__(self, tick=1.0, slots=64, now=0):
+        self.tick = tick
+        self.slots = [set() for i in range(slots)]
+        self.current = int(now / tick)
+        self.deadlines = {}
+
+    def __len__(self):
+        return len(self.deadlines)
+
+    def __contains__(self, key):
+        return key in self.deadlines
+
+    def schedule(self, key, now, delay):
+        self.cancel(key)
+        # Round up, a timer never fires early
+        deadline = max(-int(-(now + delay) // self.tick), self.current + 1)
+        self.deadlines[key] = deadline
+        self.slots[deadline % len(self.slots)].add(key)
+
+    def cancel(self, key):
+        deadline = self.deadlines.pop(key, None)
+        if deadline is not None:
+            self.slots[deadline % len(self.slots)].discard(key)
+
+    def advance(self, now):
+        """
+        Moves the wheel to now.
+        :return: List of the keys that expired.
+        """
+        target = int(now // self.tick)
+        expired = []
+        # Each slot has to be visited at most once, even after a long pause
+        for current in range(max(self.current + 1, target - len(self.slots) + 1), target + 1):
+            slot = self.slots[current % len(self.slots)]
+            for key in [key for key in slot if self.deadlines[key] <= target]:
+                slot.discard(key)
+                del self.deadlines[key]
+                expired.append(key)
+        self.current = max(self.current, target)
+        return expired
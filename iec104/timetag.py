@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+CP56Time2a and CP24Time2a time tags.
+
+CP56Time2a: milliseconds (0..59999, including seconds), IV|minute, SU|hour,
+day of week|day of month, month, year (0..99, 2000 based).
+CP24Time2a: milliseconds, IV|minute.
+
+Epoch milliseconds treat the time tag as UTC, the standard leaves the time zone
+to the configuration of the station.
+"""
+import struct
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+CP56 = struct.Struct('<HBBBBB')
+CP24 = struct.Struct('<HB')
+
+MS_PER_MINUTE = 60000
+MS_PER_HOUR = 3600000
+MS_PER_DAY = 86400000
+
+
+def days_from_civil(year, month, day):
+    """
+    Days since 1970-01-01 of a proleptic Gregorian date.
+    """
+    year -= month <= 2
+    era = year // 400
+    yoe = year - era * 400
+    doy = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def civil_from_days(days):
+    """
+    :return: year, month, day of the date days after 1970-01-01.
+    """
+    days += 719468
+    era = days // 146097
+    doe = days - era * 146097
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    day = doy - (153 * mp + 2) // 5 + 1
+    month = mp + (3 if mp < 10 else -9)
+    return yoe + era * 400 + (month <= 2), month, day
+
+
+def unpack_cp56time2a(buf, offset=0):
+    """
+    :return: year, month, day, hour, minute, millisecond (of the minute), day of week, invalid, summer time.
+    """
+    milliseconds, minute, hour, day, month, year = CP56.unpack_from(buf, offset)
+    return ((year & 0x7F) + 2000, month & 0x0F, day & 0x1F, hour & 0x1F, minute & 0x3F, milliseconds,
+            day >> 5, bool(minute & 0x80), bool(hour & 0x80))
+
+
+def pack_cp56time2a(year, month, day, hour, minute, milliseconds, dow=0, iv=False, su=False):
+    return CP56.pack(milliseconds, (iv & 1) << 7 | (minute & 0x3F), (su & 1) << 7 | (hour & 0x1F),
+                     (dow & 0x07) << 5 | (day & 0x1F), month & 0x0F, (year - 2000) & 0x7F)
+
+
+def cp56time2a_to_epoch_ms(buf, offset=0):
+    milliseconds, minute, hour, day, month, year = CP56.unpack_from(buf, offset)
+    days = days_from_civil((year & 0x7F) + 2000, month & 0x0F, day & 0x1F)
+    return days * MS_PER_DAY + (hour & 0x1F) * MS_PER_HOUR + (minute & 0x3F) * MS_PER_MINUTE + milliseconds
+
+
+def epoch_ms_to_cp56time2a(epoch_ms, iv=False, su=False):
+    days, milliseconds = divmod(epoch_ms, MS_PER_DAY)
+    year, month, day = civil_from_days(days)
+    hour, milliseconds = divmod(milliseconds, MS_PER_HOUR)
+    minute, milliseconds = divmod(milliseconds, MS_PER_MINUTE)
+    # 1970-01-01 was a thursday, day of week 1 is monday
+    return pack_cp56time2a(year, month, day, hour, minute, milliseconds, (days + 3) % 7 + 1, iv, su)
+
+
+def unpack_cp24time2a(buf, offset=0):
+    """
+    :return: minute, millisecond (of the minute), invalid.
+    """
+    milliseconds, minute = CP24.unpack_from(buf, offset)
+    return minute & 0x3F, milliseconds, bool(minute & 0x80)
+
+
+def pack_cp24time2a(minute, milliseconds, iv=False):
+    return CP24.pack(milliseconds, (iv & 1) << 7 | (minute & 0x3F))
+
+
+def cp56time2a_to_epoch_ms_array(buf, count, offset=0, stride=7):
+    """
+    Converts count CP56Time2a time tags at once, without an object per time tag.
+    Time tags inside information elements are read in place with stride, e.g. a
+    M_ME_TF_1 sequence (SQ=1) has a time tag every 12 bytes, starting 5 bytes
+    after the information object address.
+    :return: int64 array of epoch milliseconds (view it as datetime64[ms] with
+    .view('datetime64[ms]')) and bool array of the invalid bits. Lists without NumPy.
+    """
+    if numpy is None:
+        offsets = range(offset, offset + count * stride, stride)
+        return ([cp56time2a_to_epoch_ms(buf, i) for i in offsets], [unpack_cp56time2a(buf, i)[7] for i in offsets])
+    data = numpy.frombuffer(buf, numpy.uint8, count * stride - stride + 7 if count else 0, offset)
+    tags = numpy.lib.stride_tricks.as_strided(data, (count, 7), (stride, 1)).astype(numpy.int64)
+    months = (tags[:, 6] & 0x7F) * 12 + (tags[:, 5] & 0x0F) - 1 + (2000 - 1970) * 12
+    days = months.astype('datetime64[M]').astype('datetime64[D]').astype(numpy.int64) + (tags[:, 4] & 0x1F) - 1
+    epoch_ms = (days * MS_PER_DAY + (tags[:, 3] & 0x1F) * MS_PER_HOUR + (tags[:, 2] & 0x3F) * MS_PER_MINUTE +
+                (tags[:, 0] | tags[:, 1] << 8))
+    return epoch_ms, (tags[:, 2] & 0x80).astype(bool)
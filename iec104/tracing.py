@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Level-gated tracing of the decode paths.
+
+The hot paths pass the arguments of their log messages to the logger
+("%s" style) instead of formatting them, so nothing is formatted unless a
+handler emits the record. Values that are costly to compute, like hex dumps,
+are wrapped in Hex or Lazy, which compute their text only in __str__. Loops
+over frames ask enabled() once per read instead of calling the logger for
+every frame.
+
+FrameTrace keeps 1 in every N APDUs in a ring buffer of fixed size, so the
+last frames of a connection can be dumped after a protocol error without
+logging every frame.
+"""
+import binascii
+import logging
+import time
+
+# Directions, as in metrics
+IN = 0
+OUT = 1
+DIRECTIONS = ('in', 'out')
+
+
+def enabled(logger, level=logging.DEBUG):
+    """
+    :return: True if logger emits messages of level, to skip tracing a whole loop.
+    """
+    return logger.isEnabledFor(level)
+
+
+class Hex(object):
+    """
+    Hex dump of data, made when the message is formatted.
+    """
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data
+
+    def __str__(self):
+        data = self.data
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return binascii.hexlify(data).decode('ascii')
+
+
+class Lazy(object):
+    """
+    Result of func(*args), computed when the message is formatted.
+    """
+    __slots__ = ('func', 'args')
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+    def __str__(self):
+        return str(self.func(*self.args))
+
+
+class FrameTrace(object):
+    """
+    Ring buffer of sampled APDUs: every N-th frame is kept as (timestamp,
+    direction, APDU without start byte and length) until size newer frames
+    replace it. Frames that are not sampled cost one decrement.
+    :param every: Keeps 1 in every frames, 1 keeps all.
+    """
+
+    def __init__(self, size=1024, every=1):
+        self.every = every
+        # Frames until the next one is kept
+        self.countdown = 1
+        self.entries = [None] * size
+        self.position = 0
+        self.seen = 0
+        self.kept = 0
+
+    def record(self, direction, frame, asdu=None, timestamp=None):
+        """
+        :param frame: APDU or APCI (bytes or memoryview), copied if kept.
+        :param asdu: ASDU following the APCI frame, if sent separately.
+        """
+        self.seen += 1
+        self.countdown -= 1
+        if self.countdown:
+            return
+        self.countdown = self.every
+        if isinstance(frame, memoryview):
+            frame = frame.tobytes()
+        if asdu:
+            frame += asdu.tobytes() if isinstance(asdu, memoryview) else asdu
+        self.entries[self.position] = (time.time() if timestamp is None else timestamp, direction, frame)
+        self.position = (self.position + 1) % len(self.entries)
+        self.kept += 1
+
+    def records(self):
+        """
+        :return: Kept (timestamp, direction, frame) tuples, oldest first.
+        """
+        return [entry for entry in self.entries[self.position:] + self.entries[:self.position]
+                if entry is not None]
+
+    def text(self):
+        """
+        :return: One line per kept frame: timestamp, direction and hex dump.
+        """
+        return '\n'.join('{:.6f} {:<3} {}'.format(timestamp, DIRECTIONS[direction], Hex(frame))
+                         for timestamp, direction, frame in self.records())
+
+    def dump(self, logger, level=logging.WARNING, reason='Frame trace'):
+        """
+        Logs the kept frames as one message.
+        """
+        logger.log(level, '%s: %d of %d frames kept\n%s', reason, min(self.kept, len(self.entries)), self.seen,
+                   Lazy(self.text))
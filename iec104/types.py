@@ -1,19 +1,22 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime
 
+try:
+    from . import timetag
+except (ImportError, ValueError):
+    import timetag
+
 
 def cp56timebcd(buf):
     pass
 
 
-def cp56time2a_to_time(buf):
-    microsecond = (buf[1] & 0xFF) << 8 | (buf[0] & 0xFF)
-    microsecond %= 1000
-    second = int(microsecond)
-    minute = buf[2] & 0x3F
-    hour = buf[3] & 0x1F
-    day = buf[4] & 0x1F
-    month = (buf[5] & 0x0F) - 1
-    year = (buf[6] & 0x7F) + 2000
+def cp56time2a_to_time(buf, offset=0):
+    year, month, day, hour, minute, milliseconds = timetag.unpack_cp56time2a(buf, offset)[:6]
+    second, milliseconds = divmod(milliseconds, 1000)
+    return datetime(year, month, day, hour, minute, second, milliseconds * 1000)
+
 
-    return datetime(year, month, day, minute, hour, second, microsecond)
+def time_to_cp56time2a(time, iv=False, su=False):
+    return timetag.pack_cp56time2a(time.year, time.month, time.day, time.hour, time.minute,
+                                   time.second * 1000 + time.microsecond // 1000, time.isoweekday(), iv, su)
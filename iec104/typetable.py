@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Type identification table of IEC 60870-5-101/104.
+
+One entry per type id with the struct layout of the information element that
+follows the information object address (little-endian, time tags as raw bytes:
+'3s' CP24Time2a, '7s' CP56Time2a). Decoders and encoders of asdu, wrapper and
+unwrapper are compiled from it, lookups are an index into TYPES.
+"""
+import struct
+
+IOA = struct.Struct('<3B')
+# Data unit identifier: type id, VSQ, COT, originator address, common address
+HEADER = struct.Struct('<BBBBH')
+
+
+class TypeInfo(object):
+    """
+    :param type_id: Type identification.
+    :param name: Type name, e.g. M_ME_NC_1.
+    :param layout: struct format of one information element (without IOA).
+    :param time: Length of the time tag at the end of the element: 0, 3 (CP24Time2a) or 7 (CP56Time2a).
+    :param sequence: True if the type may be sent as sequence of elements (SQ=1).
+    :param single: True if an ASDU of the type carries exactly one information object.
+    :param variable: True if the last element field is the length of trailing data (segments).
+    """
+    __slots__ = ('type_id', 'name', 'layout', 'time', 'sequence', 'single', 'variable', 'description',
+                 'element', 'object', 'size')
+
+    def __init__(self, type_id, name, layout, time, sequence, single, description, variable=False):
+        self.type_id = type_id
+        self.name = name
+        self.layout = layout
+        self.time = time
+        self.sequence = sequence
+        self.single = single
+        self.variable = variable
+        self.description = description
+        self.element = struct.Struct('<' + layout)
+        self.object = struct.Struct('<3B' + layout)
+        self.size = self.element.size
+
+    def __repr__(self):
+        return '<TypeInfo {} {}>'.format(self.type_id, self.name)
+
+
+# Element layouts
+SIQ = 'B'
+DIQ = 'B'
+VTI_QDS = 'BB'
+BSI_QDS = 'IB'
+NVA_QDS = 'hB'
+SVA_QDS = 'hB'
+R32_QDS = 'fB'
+BCR = 'iB'
+CP24 = '3s'
+CP56 = '7s'
+
+# type id, name, layout, time tag, SQ=1 allowed, single object, description
+DEFINITIONS = (
+    # Process information in monitor direction
+    (1, 'M_SP_NA_1', SIQ, 0, True, False, 'Single-point information without time tag'),
+    (2, 'M_SP_TA_1', SIQ + CP24, 3, True, False, 'Single-point information with time tag'),
+    (3, 'M_DP_NA_1', DIQ, 0, True, False, 'Double-point information without time tag'),
+    (4, 'M_DP_TA_1', DIQ + CP24, 3, True, False, 'Double-point information with time tag'),
+    (5, 'M_ST_NA_1', VTI_QDS, 0, True, False, 'Step position information'),
+    (6, 'M_ST_TA_1', VTI_QDS + CP24, 3, True, False, 'Step position information with time tag'),
+    (7, 'M_BO_NA_1', BSI_QDS, 0, True, False, 'Bitstring of 32 bit'),
+    (8, 'M_BO_TA_1', BSI_QDS + CP24, 3, True, False, 'Bitstring of 32 bit with time tag'),
+    (9, 'M_ME_NA_1', NVA_QDS, 0, True, False, 'Measured value, normalized value'),
+    (10, 'M_ME_TA_1', NVA_QDS + CP24, 3, True, False, 'Measured value, normalized value with time tag'),
+    (11, 'M_ME_NB_1', SVA_QDS, 0, True, False, 'Measured value, scaled value'),
+    (12, 'M_ME_TB_1', SVA_QDS + CP24, 3, True, False, 'Measured value, scaled value with time tag'),
+    (13, 'M_ME_NC_1', R32_QDS, 0, True, False, 'Measured value, short floating point number'),
+    (14, 'M_ME_TC_1', R32_QDS + CP24, 3, True, False,
+     'Measured value, short floating point number with time tag'),
+    (15, 'M_IT_NA_1', BCR, 0, True, False, 'Integrated totals'),
+    (16, 'M_IT_TA_1', BCR + CP24, 3, True, False, 'Integrated totals with time tag'),
+    (17, 'M_EP_TA_1', 'BH' + CP24, 3, True, False, 'Event of protection equipment with time tag'),
+    (18, 'M_EP_TB_1', 'BBH' + CP24, 3, True, False,
+     'Packed start events of protection equipment with time tag'),
+    (19, 'M_EP_TC_1', 'BBH' + CP24, 3, True, False,
+     'Packed output circuit information of protection equipment with time tag'),
+    (20, 'M_PS_NA_1', 'IB', 0, True, False, 'Packed single-point information with status change detection'),
+    (21, 'M_ME_ND_1', 'h', 0, True, False, 'Measured value, normalized value without quality descriptor'),
+    (30, 'M_SP_TB_1', SIQ + CP56, 7, True, False, 'Single-point information with time tag CP56Time2a'),
+    (31, 'M_DP_TB_1', DIQ + CP56, 7, True, False, 'Double-point information with time tag CP56Time2a'),
+    (32, 'M_ST_TB_1', VTI_QDS + CP56, 7, True, False, 'Step position information with time tag CP56Time2a'),
+    (33, 'M_BO_TB_1', BSI_QDS + CP56, 7, True, False, 'Bitstring of 32 bit with time tag CP56Time2a'),
+    (34, 'M_ME_TD_1', NVA_QDS + CP56, 7, True, False,
+     'Measured value, normalized value with time tag CP56Time2a'),
+    (35, 'M_ME_TE_1', SVA_QDS + CP56, 7, True, False, 'Measured value, scaled value with time tag CP56Time2a'),
+    (36, 'M_ME_TF_1', R32_QDS + CP56, 7, True, False,
+     'Measured value, short floating point number with time tag CP56Time2a'),
+    (37, 'M_IT_TB_1', BCR + CP56, 7, True, False, 'Integrated totals with time tag CP56Time2a'),
+    (38, 'M_EP_TD_1', 'BH' + CP56, 7, True, False, 'Event of protection equipment with time tag CP56Time2a'),
+    (39, 'M_EP_TE_1', 'BBH' + CP56, 7, True, False,
+     'Packed start events of protection equipment with time tag CP56Time2a'),
+    (40, 'M_EP_TF_1', 'BBH' + CP56, 7, True, False,
+     'Packed output circuit information of protection equipment with time tag CP56Time2a'),
+    # Process information in control direction
+    (45, 'C_SC_NA_1', 'B', 0, False, True, 'Single command'),
+    (46, 'C_DC_NA_1', 'B', 0, False, True, 'Double command'),
+    (47, 'C_RC_NA_1', 'B', 0, False, True, 'Regulating step command'),
+    (48, 'C_SE_NA_1', 'hB', 0, False, True, 'Set-point command, normalized value'),
+    (49, 'C_SE_NB_1', 'hB', 0, False, True, 'Set-point command, scaled value'),
+    (50, 'C_SE_NC_1', 'fB', 0, False, True, 'Set-point command, short floating point number'),
+    (51, 'C_BO_NA_1', 'I', 0, False, True, 'Bitstring of 32 bit'),
+    (58, 'C_SC_TA_1', 'B' + CP56, 7, False, True, 'Single command with time tag CP56Time2a'),
+    (59, 'C_DC_TA_1', 'B' + CP56, 7, False, True, 'Double command with time tag CP56Time2a'),
+    (60, 'C_RC_TA_1', 'B' + CP56, 7, False, True, 'Regulating step command with time tag CP56Time2a'),
+    (61, 'C_SE_TA_1', 'hB' + CP56, 7, False, True,
+     'Set-point command, normalized value with time tag CP56Time2a'),
+    (62, 'C_SE_TB_1', 'hB' + CP56, 7, False, True, 'Set-point command, scaled value with time tag CP56Time2a'),
+    (63, 'C_SE_TC_1', 'fB' + CP56, 7, False, True,
+     'Set-point command, short floating point number with time tag CP56Time2a'),
+    (64, 'C_BO_TA_1', 'I' + CP56, 7, False, True, 'Bitstring of 32 bit with time tag CP56Time2a'),
+    # System information in monitor direction
+    (70, 'M_EI_NA_1', 'B', 0, False, True, 'End of initialization'),
+    # System information in control direction
+    (100, 'C_IC_NA_1', 'B', 0, False, True, 'Interrogation command'),
+    (101, 'C_CI_NA_1', 'B', 0, False, True, 'Counter interrogation command'),
+    (102, 'C_RD_NA_1', '', 0, False, True, 'Read command'),
+    (103, 'C_CS_NA_1', CP56, 7, False, True, 'Clock synchronization command'),
+    (104, 'C_TS_NA_1', 'H', 0, False, True, 'Test command'),
+    (105, 'C_RP_NA_1', 'B', 0, False, True, 'Reset process command'),
+    (106, 'C_CD_NA_1', 'H', 0, False, True, 'Delay acquisition command'),
+    (107, 'C_TS_TA_1', 'H' + CP56, 7, False, True, 'Test command with time tag CP56Time2a'),
+    # Parameter in control direction
+    (110, 'P_ME_NA_1', 'hB', 0, False, False, 'Parameter of measured values, normalized value'),
+    (111, 'P_ME_NB_1', 'hB', 0, False, False, 'Parameter of measured values, scaled value'),
+    (112, 'P_ME_NC_1', 'fB', 0, False, False, 'Parameter of measured values, short floating point number'),
+    (113, 'P_AC_NA_1', 'B', 0, False, False, 'Parameter activation'),
+    # File transfer (LOF, the length of file or section, is 3 bytes)
+    (120, 'F_FR_NA_1', 'H3sB', 0, False, True, 'File ready'),
+    (121, 'F_SR_NA_1', 'HB3sB', 0, False, True, 'Section ready'),
+    (122, 'F_SC_NA_1', 'HBB', 0, False, True, 'Call directory, select file, call file, call section'),
+    (123, 'F_LS_NA_1', 'HBBB', 0, False, True, 'Last section, last segment'),
+    (124, 'F_AF_NA_1', 'HBB', 0, False, True, 'ACK file, ACK section'),
+    (126, 'F_DR_TA_1', 'H3sB' + CP56, 7, True, False, 'Directory'),
+    # Start and stop time of the requested range, no time tag of the object itself
+    (127, 'F_SC_NB_1', 'H' + CP56 + CP56, 0, False, True, 'Query log, request archive file'),
+)
+
+TYPES = [None] * 256
+BY_NAME = {}
+
+for definition in DEFINITIONS:
+    info = TypeInfo(*definition)
+    TYPES[info.type_id] = BY_NAME[info.name] = info
+
+# Segment: NOF, NOS and LOS, followed by LOS bytes of the segment
+TYPES[125] = BY_NAME['F_SG_NA_1'] = TypeInfo(125, 'F_SG_NA_1', 'HBB', 0, False, True, 'Segment', variable=True)
+
+
+def get(type_id):
+    """
+    :return: TypeInfo of type_id, None if the type id is not assigned.
+    """
+    if 0 <= type_id < 256:
+        return TYPES[type_id]
+    return None
+
+
+def unpack_objects(info, buf, offset, count, sequence):
+    """
+    Decodes count information objects into tuples of IOA and element fields.
+    :param sequence: SQ bit, elements follow a single IOA and get consecutive addresses.
+    :return: List of (ioa, field, ...) tuples.
+    """
+    result = []
+    if sequence:
+        b0, b1, b2 = IOA.unpack_from(buf, offset)
+        ioa = b0 | b1 << 8 | b2 << 16
+        offset += 3
+        unpack = info.element.unpack_from
+        size = info.size
+        for i in range(count):
+            result.append((ioa + i,) + unpack(buf, offset))
+            offset += size
+    else:
+        unpack = info.object.unpack_from
+        size = info.object.size
+        for i in range(count):
+            values = unpack(buf, offset)
+            result.append((values[0] | values[1] << 8 | values[2] << 16,) + values[3:])
+            offset += size
+            if info.variable:
+                result[-1] += (bytes(bytearray(buf[offset:offset + values[-1]])),)
+                offset += values[-1]
+    return result
+
+
+def pack_objects(info, objects, sequence):
+    """
+    Encodes information objects given as tuples of IOA and element fields.
+    :param sequence: SQ bit, only the IOA of the first object is sent.
+    :return: Information objects as a bytestring.
+    """
+    if sequence:
+        ioa = objects[0][0]
+        pack = info.element.pack
+        return IOA.pack(ioa & 0xFF, (ioa >> 8) & 0xFF, (ioa >> 16) & 0xFF) + b''.join(
+            pack(*obj[1:]) for obj in objects)
+    pack = info.object.pack
+    result = []
+    for obj in objects:
+        ioa = obj[0]
+        if info.variable:
+            result.append(pack(ioa & 0xFF, (ioa >> 8) & 0xFF, (ioa >> 16) & 0xFF, *obj[1:-1]) + obj[-1])
+        else:
+            result.append(pack(ioa & 0xFF, (ioa >> 8) & 0xFF, (ioa >> 16) & 0xFF, *obj[1:]))
+    return b''.join(result)
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Latest values received by a controlling station.
+
+Points are keyed by (common address, IOA) and live in one slot of typed arrays
+(value, quality, time, type id), the counterpart of pointdb on the monitoring
+side. update() decodes the information objects of an ASDU straight into the
+slots, snapshot() returns the arrays as read-only NumPy views, so polling many
+points does not parse frames or create objects. Subscribers are called once
+per ASDU with the points whose value or quality changed.
+"""
+import time
+from array import array
+
+try:
+    from . import pointdb, timetag, typetable
+except (ImportError, ValueError):
+    import pointdb
+    import timetag
+    import typetable
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def point(info, fields, received):
+    """
+    Inverse of pointdb.element.
+    :param fields: Information element fields as unpacked by typetable.unpack_objects (without IOA).
+    :param received: Seconds since the epoch, used if the type has no time tag or only CP24Time2a.
+    :return: value, quality, time of the point.
+    """
+    bits = pointdb.STATE_BITS.get(info.type_id)
+    if bits is not None:
+        value, quality = fields[0] & bits, fields[0] & 0xF0
+    elif info.type_id == 21:
+        value, quality = fields[0], 0
+    else:
+        value, quality = fields[0], fields[1]
+    if info.time == 7:
+        received = timetag.cp56time2a_to_epoch_ms(fields[-1]) / 1000.0
+    return value, quality, received
+
+
+class ValueStore(object):
+    """
+    Latest value, quality and time of all points received.
+
+    The arrays are preallocated for capacity points and grow by doubling.
+    Views taken by snapshot() follow later updates in place until the store
+    grows: the points move to new arrays, the old views keep the values they
+    had and snapshot() has to be called again. A capacity for all points
+    expected keeps the views current.
+    """
+
+    def __init__(self, capacity=1024):
+        self.index = {}  # (ca, ioa) -> slot
+        self.keys = []  # slot -> (ca, ioa)
+        self.capacity = 0
+        self.type_ids = array('B')
+        self.values = array('d')
+        self.qualities = array('B')
+        self.timestamps = array('d')
+        self.subscribers = []
+        self.grow(max(capacity, 1))
+
+        # Counters
+        self.asdus = 0
+        self.updates = 0
+        self.changes = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def grow(self, capacity):
+        count = len(self.keys)
+        for name, typecode, default in (('type_ids', 'B', 0), ('values', 'd', 0.0),
+                                        ('qualities', 'B', 0), ('timestamps', 'd', 0.0)):
+            # New arrays instead of extending: views of the old ones stay readable
+            grown = array(typecode, [default]) * capacity
+            grown[:count] = getattr(self, name)[:count]
+            setattr(self, name, grown)
+        self.capacity = capacity
+
+    def get(self, ca, ioa):
+        """
+        :return: value, quality, time of the point, None if nothing was received for it.
+        """
+        slot = self.index.get((ca, ioa))
+        if slot is None:
+            return None
+        return self.values[slot], self.qualities[slot], self.timestamps[slot]
+
+    def update(self, buf, offset=0, received=None):
+        """
+        Stores the points of a monitored ASDU, other ASDUs are ignored.
+        :param buf: Buffer holding the ASDU.
+        :param offset: Offset of the ASDU within buf.
+        :param received: Time of reception (seconds since the epoch), now by default.
+        :return: Number of points stored.
+        """
+        type_id, vsq, cot, orig, ca = typetable.HEADER.unpack_from(buf, offset)
+        if type_id not in pointdb.POINT_TYPES:
+            return 0
+        info = typetable.TYPES[type_id]
+        objects = typetable.unpack_objects(info, buf, offset + typetable.HEADER.size, vsq & 0x7F, vsq >> 7)
+        if received is None:
+            received = time.time()
+        index, values, qualities = self.index, self.values, self.qualities
+        changed = []
+        for obj in objects:
+            value, quality, timestamp = point(info, obj[1:], received)
+            key = (ca, obj[0])
+            slot = index.get(key)
+            if slot is None:
+                slot = self.add(key)
+                values, qualities = self.values, self.qualities
+            elif values[slot] == value and qualities[slot] == quality:
+                self.timestamps[slot] = timestamp
+                continue
+            self.type_ids[slot] = type_id
+            values[slot] = value
+            qualities[slot] = quality
+            self.timestamps[slot] = timestamp
+            changed.append(key)
+        self.asdus += 1
+        self.updates += len(objects)
+        self.changes += len(changed)
+        if changed:
+            for callback in self.subscribers:
+                callback(changed)
+        return len(objects)
+
+    def add(self, key):
+        slot = len(self.keys)
+        if slot == self.capacity:
+            self.grow(2 * self.capacity)
+        self.index[key] = slot
+        self.keys.append(key)
+        return slot
+
+    def subscribe(self, callback):
+        """
+        :param callback: Called with the list of (ca, ioa) whose value or quality changed, once per ASDU.
+        """
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self.subscribers.remove(callback)
+
+    def snapshot(self):
+        """
+        :return: keys (slot -> (ca, ioa)), type ids, values, qualities and times
+        of all points, as read-only NumPy views without copying, valid until
+        the store grows. Copies as array.array without NumPy.
+        """
+        count = len(self.keys)
+        columns = (self.type_ids, self.values, self.qualities, self.timestamps)
+        if numpy is None:
+            return (list(self.keys),) + tuple(column[:count] for column in columns)
+        result = [list(self.keys)]
+        for column in columns:
+            view = numpy.frombuffer(column, numpy.uint8 if column.typecode == 'B' else numpy.float64, count)
+            view.flags.writeable = False
+            result.append(view)
+        return tuple(result)
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+import collections
+
+# Sequence numbers are 15 bit
+MODULO = 0x8000
+
+# Standard parameters: k I-frames may be outstanding, every w received I-frames
+# are acknowledged at the latest, t2 seconds after the first unacknowledged one
+K = 12
+W = 8
+T2 = 10
+
+
+class SlidingWindow(object):
+    """
+    k/w flow control of one connection.
+
+    Send side: send() hands out N(S) until k I-frames are unacknowledged,
+    acknowledged() slides the window with the N(R) of received I- and S-frames and
+    measures how long the peer took to acknowledge.
+
+    Receive side: received() checks N(S) of incoming I-frames, ack_due() tells when
+    an S-frame has to be sent (w frames or t2 seconds), acknowledge() returns its
+    N(R). Sending an I-frame acknowledges as well, as it carries N(R).
+    """
+
+    def __init__(self, k=K, w=W, t2=T2):
+        if not 0 < w <= k < MODULO:
+            raise ValueError('0 < w <= k < {} required'.format(MODULO))
+        self.k = k
+        self.w = w
+        self.t2 = t2
+        self.vs = 0  # V(S): sequence number of the next I-frame sent
+        self.ack = 0  # oldest of our I-frames not acknowledged by the peer
+        self.vr = 0  # V(R): sequence number of the next I-frame expected
+        self.unacknowledged = 0  # received I-frames not acknowledged yet
+        self.pending_since = None  # time of the oldest of them
+        self.sent_times = collections.deque()
+        # Histogram every acknowledgement latency is recorded in, e.g. of metrics.SessionMetrics
+        self.latency = None
+
+        # Counters
+        self.frames_sent = 0
+        self.frames_received = 0
+        self.s_frames_sent = 0
+        self.max_outstanding = 0
+        self.ack_count = 0
+        self.ack_latency_last = 0.0
+        self.ack_latency_max = 0.0
+        self.ack_latency_total = 0.0
+
+    @property
+    def outstanding(self):
+        """
+        Number of our I-frames the peer has not acknowledged.
+        """
+        return (self.vs - self.ack) % MODULO
+
+    @property
+    def ack_latency_mean(self):
+        if not self.ack_count:
+            return 0.0
+        return self.ack_latency_total / self.ack_count
+
+    @property
+    def deadline(self):
+        """
+        Time at which t2 forces an S-frame, None if nothing is to acknowledge.
+        """
+        if self.pending_since is None:
+            return None
+        return self.pending_since + self.t2
+
+    @property
+    def oldest_sent(self):
+        """
+        Send time of the oldest unacknowledged I-frame (for t1), None if there is none.
+        """
+        return self.sent_times[0] if self.sent_times else None
+
+    def can_send(self):
+        return self.outstanding < self.k
+
+    def send(self, now):
+        """
+        Claims the sequence numbers of the next I-frame.
+        :return: N(S), N(R)
+        """
+        if not self.can_send():
+            raise ValueError('{} I-frames are not acknowledged'.format(self.k))
+        ssn = self.vs
+        self.vs = (ssn + 1) % MODULO
+        self.sent_times.append(now)
+        self.frames_sent += 1
+        self.max_outstanding = max(self.max_outstanding, self.outstanding)
+        self.unacknowledged = 0
+        self.pending_since = None
+        return ssn, self.vr
+
+    def acknowledged(self, rsn, now):
+        """
+        Slides the send window to N(R) of a received frame.
+        :return: False if N(R) acknowledges frames that were never sent.
+        """
+        count = (rsn - self.ack) % MODULO
+        if count > self.outstanding:
+            return False
+        for i in range(count):
+            latency = now - self.sent_times.popleft()
+            self.ack_count += 1
+            self.ack_latency_last = latency
+            self.ack_latency_total += latency
+            if latency > self.ack_latency_max:
+                self.ack_latency_max = latency
+            if self.latency is not None:
+                self.latency.record(latency)
+        self.ack = rsn
+        return True
+
+    def received(self, ssn, now):
+        """
+        Accepts N(S) of a received I-frame.
+        :return: False on a sequence error.
+        """
+        if ssn != self.vr:
+            return False
+        self.vr = (ssn + 1) % MODULO
+        self.frames_received += 1
+        self.unacknowledged += 1
+        if self.pending_since is None:
+            self.pending_since = now
+        return True
+
+    def ack_due(self, now):
+        return self.unacknowledged >= self.w or (
+            self.pending_since is not None and now >= self.pending_since + self.t2)
+
+    def acknowledge(self):
+        """
+        Marks all received I-frames as acknowledged.
+        :return: N(R) for the S-frame.
+        """
+        self.unacknowledged = 0
+        self.pending_since = None
+        self.s_frames_sent += 1
+        return self.vr
+
+    def stats(self):
+        return {
+            'outstanding': self.outstanding,
+            'max_outstanding': self.max_outstanding,
+            'unacknowledged': self.unacknowledged,
+            'frames_sent': self.frames_sent,
+            'frames_received': self.frames_received,
+            's_frames_sent': self.s_frames_sent,
+            'ack_count': self.ack_count,
+            'ack_latency_last': self.ack_latency_last,
+            'ack_latency_mean': self.ack_latency_mean,
+            'ack_latency_max': self.ack_latency_max,
+        }